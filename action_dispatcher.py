@@ -0,0 +1,214 @@
+"""
+Background HTTP dispatcher for routed actions (POST /crm/escalate, /risk_alert, ...).
+route_action only commits the actions to the durable ActionQueue; a pool of sender
+threads leases due actions, batches them per endpoint and POSTs them over pooled
+keep-alive requests.Sessions. Failed batches are rescheduled with exponential backoff
+and full jitter (without blocking a sender) and dead-lettered after DISPATCH_MAX_RETRIES
+attempts. Document processing never waits on delivery, and actions queued by a process
+that died are delivered by the next dispatcher that runs (at least once).
+
+Set ACTION_DISPATCH_URL (e.g. http://localhost:8081) to send for real; without it
+actions stay simulated. ACTION_ENDPOINTS is an optional JSON object overriding the
+URL of individual endpoints, e.g. {"/crm/escalate": "https://crm.internal/escalate"}.
+Each delivered action carries its idempotency `key` so receivers can drop duplicates.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from action_queue import ActionQueue
+from metrics import percentile
+from retry_utils import backoff_delay
+
+ACTION_DISPATCH_URL = os.environ.get("ACTION_DISPATCH_URL", "")
+ACTION_ENDPOINTS: Dict[str, str] = json.loads(os.environ.get("ACTION_ENDPOINTS", "{}"))
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", "2"))
+DISPATCH_BATCH_SIZE = int(os.environ.get("DISPATCH_BATCH_SIZE", "50"))
+DISPATCH_MAX_RETRIES = int(os.environ.get("DISPATCH_MAX_RETRIES", "5"))
+DISPATCH_BACKOFF_BASE = float(os.environ.get("DISPATCH_BACKOFF_BASE", "0.5"))
+DISPATCH_BACKOFF_CAP = float(os.environ.get("DISPATCH_BACKOFF_CAP", "30"))
+DISPATCH_TIMEOUT = float(os.environ.get("DISPATCH_TIMEOUT", "5"))
+# How long a leased batch stays invisible to other senders (must exceed a delivery attempt)
+DISPATCH_LEASE = float(os.environ.get("DISPATCH_LEASE", "30"))
+# Idle senders re-check the queue this often for retries that became due
+DISPATCH_POLL_INTERVAL = 0.5
+
+# Recent delivery latencies (queued -> acknowledged) kept for percentiles
+LATENCY_SAMPLES = 1000
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def idempotency_key(event_id: Optional[str], endpoint: str, action: str) -> str:
+    """Stable key for one action of one routed event; without an event id every call is distinct."""
+    if event_id is None:
+        return uuid.uuid4().hex
+    return hashlib.sha256(f"{event_id}|{endpoint}|{action}".encode('utf-8')).hexdigest()
+
+
+class ActionDispatcher:
+    def __init__(self, base_url: str, endpoints: Optional[Dict[str, str]] = None,
+                 action_queue: Optional[ActionQueue] = None, workers: int = DISPATCH_WORKERS,
+                 batch_size: int = DISPATCH_BATCH_SIZE, max_retries: int = DISPATCH_MAX_RETRIES,
+                 backoff_base: float = DISPATCH_BACKOFF_BASE, backoff_cap: float = DISPATCH_BACKOFF_CAP,
+                 timeout: float = DISPATCH_TIMEOUT, lease: float = DISPATCH_LEASE):
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = dict(endpoints or {})
+        self.queue = action_queue or ActionQueue()
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.lease = lease
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.last_error: Optional[str] = None
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._threads = [threading.Thread(target=self._run, name=f'action-dispatcher-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def url_for(self, endpoint: str) -> str:
+        return self.endpoints.get(endpoint) or self.base_url + endpoint
+
+    def submit_many(self, items: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Durably queue (key, endpoint, payload) items; returns how many were new (known keys are skipped)."""
+        if not items:
+            return 0
+        added = self.queue.put_many(items)
+        with self._lock:
+            self.stats['queued'] += added
+            self.stats['duplicates'] += len(items) - added
+        self._wakeup.set()
+        return added
+
+    def submit(self, endpoint: str, payload: Dict[str, Any], key: Optional[str] = None) -> bool:
+        return self.submit_many([(key or uuid.uuid4().hex, endpoint, payload)]) == 1
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def _run(self):
+        failures = 0
+        while not self._closed.is_set():
+            try:
+                leased = self.queue.lease(self.batch_size, self.lease)
+                failures = 0
+                if not leased:
+                    self._wakeup.wait(DISPATCH_POLL_INTERVAL)
+                    self._wakeup.clear()
+                    continue
+                batches: Dict[str, List[Dict[str, Any]]] = {}
+                for action in leased:
+                    batches.setdefault(action['endpoint'], []).append(action)
+                for endpoint, batch in batches.items():
+                    self._send(endpoint, batch)
+            except Exception as e:
+                # Typically the queue database staying locked past its busy timeout: keep the
+                # sender alive and back off. Actions of a batch that was not acked are leased
+                # again once their lease expires
+                failures += 1
+                with self._lock:
+                    self.stats['queue_errors'] += 1
+                    self.last_error = f"queue: {type(e).__name__}: {e}"
+                self._closed.wait(max(DISPATCH_POLL_INTERVAL,
+                                      backoff_delay(failures, self.backoff_base, self.backoff_cap)))
+
+    def _send(self, endpoint: str, batch: List[Dict[str, Any]]):
+        ids = [action['id'] for action in batch]
+        body = {'actions': [{'key': action['key'], **action['payload']} for action in batch]}
+        try:
+            response = self._session().post(self.url_for(endpoint), json=body, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            # Attempt numbers are per action; the batch backs off by its least-tried member
+            attempt = min(action['attempts'] for action in batch) + 1
+            dead = self.queue.retry(ids, backoff_delay(attempt, self.backoff_base, self.backoff_cap),
+                                    f"{type(e).__name__}: {e}", self.max_retries)
+            with self._lock:
+                self.stats['errors'] += 1
+                self.stats['retries'] += len(ids) - dead
+                self.stats['dead_lettered'] += dead
+                self.last_error = f"{endpoint}: {e}"
+            return
+        self.queue.ack(ids)
+        now = time.time()
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['delivered'] += len(ids)
+            self._latencies.extend(now - action['created_at'] for action in batch)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no action is pending (all delivered or dead-lettered); False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.counts()['pending']:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the senders; actions still pending stay in the queue for the next dispatcher."""
+        self._closed.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {key: self.stats[key] for key in ('queued', 'duplicates', 'delivered', 'dead_lettered',
+                                                      'batches', 'retries', 'errors', 'queue_errors')}
+            latencies = list(self._latencies)
+            last_error = self.last_error
+        stats['queue'] = self.queue.counts()
+        stats['latency_ms'] = {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        } if latencies else None
+        if last_error:
+            stats['last_error'] = last_error
+        return stats
+
+
+def get_dispatcher() -> Optional[ActionDispatcher]:
+    """Process-wide dispatcher, or None when ACTION_DISPATCH_URL is unset (simulated routing)."""
+    global _dispatcher
+    if not ACTION_DISPATCH_URL:
+        return None
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = ActionDispatcher(ACTION_DISPATCH_URL, ACTION_ENDPOINTS)
+                atexit.register(_shutdown)
+    return _dispatcher
+
+
+def _shutdown():
+    # Give queued actions a bounded chance to go out; whatever is left is delivered by the next run
+    if _dispatcher is not None:
+        _dispatcher.flush(timeout=DISPATCH_TIMEOUT)
+        _dispatcher.close(timeout=1)
@@ -0,0 +1,169 @@
+"""
+Durable outbound action queue (SQLite, WAL mode) for at-least-once delivery.
+Every routed action is committed with an idempotency key before routing returns.
+Dispatcher workers lease batches of due actions, so an action leased by a process
+that died becomes due again once its lease expires. Failed deliveries are rescheduled
+with backoff, and actions that exhaust their attempts move to a dead-letter state
+from which they can be replayed.
+
+    python action_queue.py --stats
+    python action_queue.py --replay [--endpoint /crm/escalate]
+    python action_queue.py --purge 86400
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+ACTION_QUEUE_FILE = os.environ.get("ACTION_QUEUE_FILE", "action_queue.db")
+
+PENDING, DONE, DEAD = 'pending', 'done', 'dead'
+
+
+class ActionQueue:
+    """Connections are per thread; SQLite serialises concurrent writers across threads and processes."""
+
+    def __init__(self, path: str = ACTION_QUEUE_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS actions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL UNIQUE,
+                    endpoint TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    delivered_at REAL,
+                    last_error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_actions_due ON actions(status, next_attempt_at);
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    def put_many(self, items: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        Durably enqueue (key, endpoint, payload) items in one transaction; returns how many were new.
+        Keys already in the queue (any state) are ignored, so re-routing the same event is harmless.
+        """
+        now = time.time()
+        conn = self._conn()
+        before = conn.total_changes
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT OR IGNORE INTO actions (key, endpoint, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)',
+                [(key, endpoint, json.dumps(payload, default=str), now, now) for key, endpoint, payload in items],
+            )
+        return conn.total_changes - before
+
+    def lease(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Claim up to `limit` due actions (oldest first) for `lease_seconds`."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                'SELECT id, key, endpoint, payload, attempts, created_at FROM actions '
+                'WHERE status = ? AND next_attempt_at <= ? AND leased_until <= ? ORDER BY id LIMIT ?',
+                (PENDING, now, now, limit),
+            ).fetchall()
+            conn.executemany('UPDATE actions SET leased_until = ? WHERE id = ?',
+                             [(now + lease_seconds, row[0]) for row in rows])
+        return [{'id': id_, 'key': key, 'endpoint': endpoint, 'payload': json.loads(payload),
+                 'attempts': attempts, 'created_at': created_at}
+                for id_, key, endpoint, payload, attempts, created_at in rows]
+
+    def ack(self, ids: List[int]):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('UPDATE actions SET status = ?, delivered_at = ?, leased_until = 0 WHERE id = ?',
+                             [(DONE, now, id_) for id_ in ids])
+
+    def retry(self, ids: List[int], delay: float, error: str, max_attempts: int) -> int:
+        """Reschedule failed actions `delay` seconds from now; those out of attempts are dead-lettered. Returns how many died."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'UPDATE actions SET attempts = attempts + 1, leased_until = 0, next_attempt_at = ?, last_error = ?, '
+                'status = CASE WHEN attempts + 1 >= ? THEN ? ELSE status END WHERE id = ?',
+                [(now + delay, error, max_attempts, DEAD, id_) for id_ in ids],
+            )
+            placeholders = ','.join('?' * len(ids))
+            dead = conn.execute(f'SELECT COUNT(*) FROM actions WHERE status = ? AND id IN ({placeholders})',
+                                (DEAD, *ids)).fetchone()[0]
+        return dead
+
+    def replay(self, endpoint: Optional[str] = None) -> int:
+        """Move dead-lettered actions (optionally for one endpoint) back to pending with fresh attempts."""
+        query = 'UPDATE actions SET status = ?, attempts = 0, next_attempt_at = ?, leased_until = 0 WHERE status = ?'
+        params: list = [PENDING, time.time(), DEAD]
+        if endpoint:
+            query += ' AND endpoint = ?'
+            params.append(endpoint)
+        with self._conn() as conn:
+            return conn.execute(query, params).rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Delete delivered actions older than `older_than` seconds (their keys stop deduplicating)."""
+        with self._conn() as conn:
+            return conn.execute('DELETE FROM actions WHERE status = ? AND delivered_at < ?',
+                                (DONE, time.time() - older_than)).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute('SELECT status, COUNT(*) FROM actions GROUP BY status').fetchall()
+        counts = {PENDING: 0, DONE: 0, DEAD: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            'SELECT key, endpoint, attempts, last_error FROM actions WHERE status = ? ORDER BY id LIMIT ?', (DEAD, limit)
+        ).fetchall()
+        return [{'key': key, 'endpoint': endpoint, 'attempts': attempts, 'last_error': error}
+                for key, endpoint, attempts, error in rows]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect and maintain the durable action queue")
+    parser.add_argument('--path', default=ACTION_QUEUE_FILE)
+    parser.add_argument('--stats', action='store_true', help='Print action counts per state and the first dead letters')
+    parser.add_argument('--replay', action='store_true', help='Requeue dead-lettered actions')
+    parser.add_argument('--endpoint', type=str, default=None, help='Restrict --replay to one endpoint')
+    parser.add_argument('--purge', type=float, default=None, metavar='SECONDS', help='Delete actions delivered more than SECONDS ago')
+    args = parser.parse_args()
+    action_queue = ActionQueue(args.path)
+    if args.replay:
+        print(f"Requeued {action_queue.replay(args.endpoint)} dead-lettered actions")
+    if args.purge is not None:
+        print(f"Purged {action_queue.purge(args.purge)} delivered actions")
+    if args.stats or not (args.replay or args.purge is not None):
+        print(f"Actions: {action_queue.counts()}")
+        for letter in action_queue.dead_letters(10):
+            print(f"DEAD {letter['endpoint']} {letter['key']} after {letter['attempts']} attempts: {letter['last_error']}")
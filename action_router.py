@@ -1,35 +1,178 @@
-import requests
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-def route_action(routing_metadata, agent_actions):
+from action_dispatcher import get_dispatcher, idempotency_key
+from format_detector import INVOICE_TOTAL_LIMIT
+from metrics import timed
+
+
+@dataclass
+class Action:
+    """Typed follow-up action emitted by an agent; `message` is the human-readable form."""
+    kind: str
+    message: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def __str__(self):
+        return self.message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Trigger POST `endpoint` when the routing metadata matches: `format` and `intent` (if set)
+    must be equal, and every (field, op, value) condition in `when` must hold.
+    """
+    name: str
+    endpoint: str
+    format: Optional[str] = None
+    intent: Optional[str] = None
+    when: Tuple[Tuple[str, str, Any], ...] = ()
+
+
+OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    'eq': lambda actual, expected: actual == expected,
+    'ne': lambda actual, expected: actual != expected,
+    'in': lambda actual, expected: actual in expected,
+    'gt': lambda actual, expected: actual is not None and actual > expected,
+    'lt': lambda actual, expected: actual is not None and actual < expected,
+    'icontains': lambda actual, expected: actual is not None and expected in str(actual).lower(),
+    'nonempty': lambda actual, expected: bool(actual),
+}
+
+# Routing rule table, in priority order; several rules may share an endpoint, which is posted once
+ROUTING_RULES = [
+    Rule('email_urgent', '/crm/escalate', format='Email', when=(('urgency', 'eq', 'escalate'),)),
+    Rule('email_escalation_tone', '/crm/escalate', format='Email', when=(('tone', 'in', ('escalation', 'threatening')),)),
+    Rule('angry_complaint_sender', '/crm/escalate', format='Email', intent='Complaint', when=(('sender', 'icontains', 'angry'),)),
+    Rule('angry_complaint_issue', '/crm/escalate', format='Email', intent='Complaint', when=(('issue', 'icontains', 'angry'),)),
+    Rule('invoice_over_limit', '/risk_alert', format='PDF', when=(('total', 'gt', INVOICE_TOTAL_LIMIT),)),
+    Rule('policy_mentions', '/compliance_flag', format='PDF', when=(('policy_mentions', 'nonempty', None),)),
+    Rule('json_anomalies', '/json_alert', format='JSON', when=(('anomalies', 'nonempty', None),)),
+]
+
+
+def _compile_conditions(when: Tuple[Tuple[str, str, Any], ...]) -> Callable[[Dict[str, Any]], bool]:
+    checks = [(name, OPS[op], value) for name, op, value in when]
+    return lambda facts: all(check(facts.get(name), value) for name, check, value in checks)
+
+
+def _index_key(when: Tuple[Tuple[str, str, Any], ...]) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    """The first eq/in condition as (field, values it accepts), or None when no condition can be hashed."""
+    for name, op, value in when:
+        # 'in' against a string is a substring test, which a hash lookup cannot answer
+        values = (value,) if op == 'eq' else tuple(value) if op == 'in' and isinstance(value, (tuple, list, set, frozenset)) else None
+        if values is None:
+            continue
+        try:
+            for v in values:
+                hash(v)
+        except TypeError:
+            continue
+        return name, values
+    return None
+
+
+# A compiled rule: (table position, rule, condition check)
+Candidate = Tuple[int, Rule, Callable]
+
+
+class RuleIndex:
+    """
+    Rules compiled once and indexed by (format, intent), then by the value of their first eq/in
+    condition, so routing a document only evaluates the rules that can apply to its format and
+    intent and whose equality condition its facts satisfy, however large the table grows.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = list(rules)
+        # (format, intent) -> (rules without an indexable condition, {field: {value: rules}})
+        self._index: Dict[Tuple[Optional[str], Optional[str]], Tuple[List[Candidate], Dict[str, Dict[Any, List[Candidate]]]]] = {}
+        for position, rule in enumerate(self.rules):
+            scanned, keyed = self._index.setdefault((rule.format, rule.intent), ([], {}))
+            candidate = (position, rule, _compile_conditions(rule.when))
+            key = _index_key(rule.when)
+            if key is None:
+                scanned.append(candidate)
+                continue
+            by_value = keyed.setdefault(key[0], {})
+            for value in dict.fromkeys(key[1]):
+                by_value.setdefault(value, []).append(candidate)
+        # Per (format, intent) seen: the exact and wildcard buckets merged, scanned rules in table order
+        self._merged: Dict[Tuple[Any, Any], Tuple[List[Candidate], Dict[str, Dict[Any, List[Candidate]]]]] = {}
+
+    def _bucket(self, fmt: Any, intent: Any) -> Tuple[List[Candidate], Dict[str, Dict[Any, List[Candidate]]]]:
+        merged = self._merged.get((fmt, intent))
+        if merged is None:
+            scanned: List[Candidate] = []
+            keyed: Dict[str, Dict[Any, List[Candidate]]] = {}
+            for key in {(fmt, intent), (fmt, None), (None, intent), (None, None)}:
+                bucket_scanned, bucket_keyed = self._index.get(key, ((), {}))
+                scanned.extend(bucket_scanned)
+                for name, by_value in bucket_keyed.items():
+                    merged_values = keyed.setdefault(name, {})
+                    for value, candidates in by_value.items():
+                        merged_values.setdefault(value, []).extend(candidates)
+            scanned.sort(key=lambda candidate: candidate[0])
+            merged = self._merged[(fmt, intent)] = (scanned, keyed)
+        return merged
+
+    def candidates(self, facts: Dict[str, Any]) -> List[Candidate]:
+        """The rules worth evaluating against `facts`, in table order."""
+        scanned, keyed = self._bucket(facts.get('format'), facts.get('intent'))
+        hits: List[Candidate] = []
+        for name, by_value in keyed.items():
+            try:
+                hits.extend(by_value.get(facts.get(name), ()))
+            except TypeError:  # an unhashable fact equals none of the indexed values
+                continue
+        if not hits:
+            return scanned
+        hits.extend(scanned)
+        hits.sort(key=lambda candidate: candidate[0])
+        return hits
+
+    def match(self, facts: Dict[str, Any]) -> List[Rule]:
+        """Matching rules in table order, keeping the first rule per endpoint."""
+        matched, endpoints = [], set()
+        for _, rule, check in self.candidates(facts):
+            if rule.endpoint not in endpoints and check(facts):
+                endpoints.add(rule.endpoint)
+                matched.append(rule)
+        return matched
+
+
+_rule_index = RuleIndex(ROUTING_RULES)
+
+
+@timed('route_action')
+def route_action(routing_metadata, agent_actions, verbose=True, event_id=None, rules=None):
     """
-    Simulate routing follow-up actions based on agent outputs.
-    Triggers REST calls (simulated) for CRM, risk, compliance, etc.
+    Route follow-up actions to the CRM, risk, compliance, etc. endpoints by evaluating the
+    routing rule table (or the given RuleIndex) against the structured routing metadata.
+    With ACTION_DISPATCH_URL set, the REST calls are committed to the durable action queue and
+    delivered in the background; otherwise they are simulated. `event_id` identifies the routed
+    event, so routing it again (e.g. on retry) does not queue its actions twice.
+    With verbose=False nothing is printed; the triggered calls are only returned.
     """
+    log = print if verbose else (lambda *args: None)
+    dispatcher = get_dispatcher()
+    mode = 'queued' if dispatcher else 'simulated'
+    matched = (rules or _rule_index).match(routing_metadata)
+    if not matched:
+        log('[ROUTER] No external action needed')
+    actions = [action.to_dict() if isinstance(action, Action) else {'kind': None, 'message': str(action)}
+               for action in agent_actions]
     actions_triggered = []
-    
-    if routing_metadata['format'] == 'Email':
-        for action in agent_actions:
-            if 'Escalated' in action or (routing_metadata.get('intent') == 'Complaint' and 'angry' in action.lower()):
-            
-                print('[ROUTER] POST /crm/escalate (simulated)')
-                actions_triggered.append('POST /crm/escalate')
-            elif 'Routine' in action:
-                print('[ROUTER] No external action needed (routine)')
-
-    # PDF: flag risk or compliance
-    if routing_metadata['format'] == 'PDF':
-        for action in agent_actions:
-            if 'exceeds 10,000' in action:
-                print('[ROUTER] POST /risk_alert (simulated)')
-                actions_triggered.append('POST /risk_alert')
-            if 'Policy mentions' in action:
-                print('[ROUTER] POST /compliance_flag (simulated)')
-                actions_triggered.append('POST /compliance_flag')
-
-    # JSON: alert for anomalies
-    if routing_metadata['format'] == 'JSON':
-        for action in agent_actions:
-            if 'Alert:' in action:
-                print('[ROUTER] POST /json_alert (simulated)')
-                actions_triggered.append('POST /json_alert')
+    outbound = []
+    for rule in matched:
+        log(f'[ROUTER] POST {rule.endpoint} ({mode})')
+        actions_triggered.append(f'POST {rule.endpoint}')
+        payload = {'routing': routing_metadata, 'rule': rule.name, 'actions': actions}
+        outbound.append((idempotency_key(event_id, rule.endpoint, rule.name), rule.endpoint, payload))
+    if dispatcher:
+        dispatcher.submit_many(outbound)
     return actions_triggered
@@ -1,110 +1,225 @@
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import Counter
+from functools import partial
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
 import uvicorn
 import os
-import shutil
-from main import detect_format, extract_text
-from classifier import classify_intent
-from email_parser import parse_email, extract_email_fields, detect_tone, trigger_action
-from format_detector import validate_json_schema, log_json_alert, extract_pdf_invoice_fields, extract_pdf_policy_mentions, flag_pdf_alerts
-from shared_memory import load_memory
+import json
+from action_dispatcher import DISPATCH_TIMEOUT, get_dispatcher
 from action_router import route_action
+from format_detector import UnsupportedFormatError, is_json_stream
+from metrics import registry
+from pipeline import process_document, process_json_stream, record_metrics, record_rollups, store_upload, PERSIST_UPLOADS
+from rollups import DIMENSIONS, get_rollups
+from shared_memory import get_latest, get_page, iter_results
 
-app = FastAPI()
+# PDF extraction and classification run off the event loop in this pool ('process' or 'thread')
+CLASSIFY_EXECUTOR = os.environ.get("CLASSIFY_EXECUTOR", "process")
+CLASSIFY_WORKERS = int(os.environ.get("CLASSIFY_WORKERS", os.cpu_count() or 4))
+# Requests accepted at once (queued or running); beyond this /classify answers 429
+CLASSIFY_MAX_INFLIGHT = int(os.environ.get("CLASSIFY_MAX_INFLIGHT", CLASSIFY_WORKERS * 4))
+# Invalid events listed individually in the response to an NDJSON / JSON array upload
+STREAM_RESPONSE_ANOMALIES = 100
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+executor = None
+inflight = 0
+# Result cache outcomes of /classify, counted here since lookups may happen in worker processes
+cache_counters = Counter()
+
+@asynccontextmanager
+async def lifespan(app):
+    global executor
+    pool = ProcessPoolExecutor if CLASSIFY_EXECUTOR == 'process' else ThreadPoolExecutor
+    executor = pool(max_workers=CLASSIFY_WORKERS)
+    yield
+    executor.shutdown(wait=True)
+    dispatcher = get_dispatcher()
+    if dispatcher:
+        dispatcher.flush(timeout=DISPATCH_TIMEOUT)
+
+app = FastAPI(lifespan=lifespan)
 
 @app.post("/classify")
 async def classify_file(file: UploadFile = File(...)):
-    
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    fmt = detect_format(file_path)
-    input_text = extract_text(file_path, fmt)
-    result = {"format": fmt}
-    actions = []
-    routing_metadata = {}
-    if fmt == 'Email':
-        parsed_text = parse_email(input_text)
-        email_fields = extract_email_fields(input_text)
-        tone = detect_tone(input_text)
-        action_result = trigger_action(email_fields, tone)
-        intent, confidence = classify_intent(parsed_text)
-        actions = [action_result]
-        routing_metadata = {
-            'format': fmt,
-            'intent': intent,
-            'confidence': confidence,
-            'file': file.filename
-        }
-        
-        # Route action
-        triggered = route_action(routing_metadata, actions)
-        result.update({
-            "intent": intent,
-            "confidence": confidence,
-            "fields": email_fields,
-            "tone": tone,
-            "action": action_result,
-            "router": triggered
-        })
-    elif fmt == 'JSON':
-        import json
-        data = json.loads(input_text)
-        required_fields = {'event': str, 'timestamp': str, 'payload': dict}
-        is_valid, anomalies = validate_json_schema(data, required_fields)
-        intent, confidence = classify_intent(input_text)
-        actions = []
-        if not is_valid:
-            actions.append(f"Alert: {anomalies}")
+    global inflight
+    if inflight >= CLASSIFY_MAX_INFLIGHT:
+        return JSONResponse({"detail": "Too many documents in flight, retry later"}, status_code=429,
+                            headers={"Retry-After": "1"})
+    inflight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        if CLASSIFY_EXECUTOR == 'process':
+            # Worker processes need a picklable document: read the spool into memory once
+            document = await file.read()
         else:
-            actions.append("Schema valid")
-        routing_metadata = {
-            'format': fmt,
-            'intent': intent,
-            'confidence': confidence,
-            'file': file.filename
-        }
-        triggered = route_action(routing_metadata, actions)
-        result.update({
-            "intent": intent,
-            "confidence": confidence,
-            "fields": data,
-            "anomalies": anomalies,
-            "schema_valid": is_valid,
-            "router": triggered
+            # Threads parse straight from the upload's spooled file
+            document = file.file
+        if PERSIST_UPLOADS:
+            data = document if isinstance(document, bytes) else await file.read()
+            await loop.run_in_executor(None, store_upload, data, file.filename)
+            await file.seek(0)
+        if is_json_stream(document, file.filename):
+            # NDJSON files and JSON arrays are event streams: every event is validated, routed and
+            # logged on its own. process_json_stream routes through this process's dispatcher itself
+            try:
+                response = await loop.run_in_executor(None, classify_stream, document, file.filename)
+            except ValueError as e:
+                return JSONResponse({"detail": f"Malformed JSON event stream: {e}"}, status_code=400)
+            return JSONResponse(response)
+        # Route and record metrics here rather than in the worker so every action goes through
+        # this process's dispatcher, every document shows up in this process's /metrics and
+        # the rollups count the actions actually routed
+        classify = partial(process_document, document, None, file.filename, route=False, record=False)
+        result = await loop.run_in_executor(executor, classify)
+    except UnsupportedFormatError as e:
+        return JSONResponse({"detail": str(e)}, status_code=415)
+    finally:
+        inflight -= 1
+    # Routing commits to the durable action queue and the rollups are a SQLite upsert: both can
+    # wait on a database lock, so they run in a thread rather than on the event loop
+    await loop.run_in_executor(None, route_and_record, result)
+    record_metrics(result)
+    cache_counters[result.cache_hit or 'miss'] += 1
+    return JSONResponse(classify_response(result))
+
+def route_and_record(result):
+    """Route a classified Result's actions and count it in the rollups."""
+    result.triggered = route_action(result.routing_metadata, result.actions, verbose=False, event_id=result.event_id())
+    record_rollups([result])
+
+def classify_stream(document, name):
+    """Classify every event of an NDJSON document or JSON array; returns the /classify response."""
+    intents, routed = Counter(), Counter()
+    events, invalid, anomalies = 0, 0, []
+    for result in process_json_stream(document, name):
+        intents[result.intent] += 1
+        routed.update(result.triggered)
+        if not result.details['schema_valid']:
+            invalid += 1
+            if len(anomalies) < STREAM_RESPONSE_ANOMALIES:
+                anomalies.append({"event": events, "anomalies": result.details['anomalies']})
+        events += 1
+    return {
+        "format": "JSON",
+        "stream": True,
+        "events": events,
+        "invalid": invalid,
+        "by_intent": dict(intents),
+        "anomalies": anomalies,
+        "router": dict(routed),
+    }
+
+def classify_response(result):
+    """Shape a pipeline Result into the /classify response for its format."""
+    response = {
+        "format": result.format,
+        "intent": result.intent,
+        "confidence": result.confidence,
+    }
+    details = result.details
+    if result.format == 'Email':
+        response.update({
+            "fields": details['email_fields'],
+            "tone": details['tone'],
+            "action": str(result.actions[0]),
+        })
+    elif result.format == 'JSON':
+        response.update({
+            "fields": details['data'],
+            "anomalies": details['anomalies'],
+            "schema_valid": details['schema_valid'],
         })
-    elif fmt == 'PDF':
-        pdf_fields = extract_pdf_invoice_fields(input_text)
-        policy_mentions = extract_pdf_policy_mentions(input_text)
-        intent, confidence = classify_intent(input_text)
-        actions = []
-        if pdf_fields.get('total') and pdf_fields['total'] > 10000:
-            actions.append(f"Invoice total exceeds 10,000: {pdf_fields['total']}")
-        if policy_mentions:
-            actions.append(f"Policy mentions: {policy_mentions}")
-        routing_metadata = {
-            'format': fmt,
-            'intent': intent,
-            'confidence': confidence,
-            'file': file.filename
-        }
-        triggered = route_action(routing_metadata, actions)
-        result.update({
-            "intent": intent,
-            "confidence": confidence,
-            "fields": pdf_fields,
-            "policy_mentions": policy_mentions,
-            "router": triggered
+    elif result.format == 'PDF':
+        response.update({
+            "fields": details['pdf_fields'],
+            "policy_mentions": details['policy_mentions'],
+            "policy_counts": details['policy_counts'],
+            "policy_offsets": details['policy_offsets'],
         })
-    return JSONResponse(result)
+    response["router"] = result.triggered
+    return response
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    lookups = sum(cache_counters.values())
+    hits = lookups - cache_counters['miss']
+    return JSONResponse({
+        "memory_hits": cache_counters['memory'],
+        "store_hits": cache_counters['store'],
+        "misses": cache_counters['miss'],
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+    })
+
+@app.get("/metrics")
+def get_metrics():
+    """Per-stage latency histograms, document sizes, page counts and cache outcomes (Prometheus text format)."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+def get_stats(
+    period: str = Query('day', pattern='^(hour|day)$'),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    """
+    Document counts by agent, format, intent, tone and routed action: all-time totals plus
+    one entry per hour or day bucket between `since` and `until` (ISO timestamps). Served
+    from the precomputed rollups, so the cost does not depend on the size of the history.
+    """
+    rollups = get_rollups()
+    if rollups is None:
+        return JSONResponse({"enabled": False})
+    buckets = {}
+    for dimension in ('documents', *DIMENSIONS):
+        for bucket, counts in rollups.series(period, dimension, since, until).items():
+            buckets.setdefault(bucket, {})[dimension] = counts
+    return JSONResponse({"enabled": True, "totals": rollups.totals(), "period": period, "buckets": buckets})
+
+@app.get("/dispatch/stats")
+def get_dispatch_stats():
+    dispatcher = get_dispatcher()
+    if dispatcher is None:
+        return JSONResponse({"enabled": False})
+    return JSONResponse({"enabled": True, **dispatcher.metrics()})
+
+MEMORY_PAGE_SIZE = 100
+MEMORY_MAX_PAGE_SIZE = 1000
 
 @app.get("/memory")
-def get_memory():
-    memory = load_memory()
-    return JSONResponse(memory)
+def get_memory(
+    limit: int = Query(MEMORY_PAGE_SIZE, ge=1, le=MEMORY_MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    agent: Optional[str] = None,
+    format: Optional[str] = None,
+    intent: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    stream: bool = False,
+):
+    """
+    Page through logged results, oldest first. Pass the returned `next_cursor`
+    as `cursor` to fetch the next page. With `stream=true` every matching result
+    after `cursor` is streamed as NDJSON instead (one result per line).
+    """
+    filters = {'agent': agent, 'format': format, 'intent': intent, 'since': since, 'until': until}
+    if stream:
+        def ndjson():
+            for _, entry in iter_results(after=cursor, **filters):
+                yield json.dumps(entry, default=str) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    results, next_cursor = get_page(limit=limit, cursor=cursor, **filters)
+    return JSONResponse({"results": results, "next_cursor": next_cursor})
+
+@app.get("/memory/{source:path}")
+def get_memory_for_source(source: str):
+    entry = get_latest(source)
+    if entry is None:
+        return JSONResponse({"detail": f"No result found for source: {source}"}, status_code=404)
+    return JSONResponse(entry)
 
 if __name__ == "__main__":
     uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
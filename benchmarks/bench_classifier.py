@@ -0,0 +1,56 @@
+"""
+Micro-benchmark: precompiled IntentEngine vs the previous per-call re.search loop.
+
+    python benchmarks/bench_classifier.py
+"""
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifier import FEW_SHOT_EXAMPLES, INTENT_PATTERNS, classify_intent, classify_many
+from corpus import filler_text, generate_documents
+
+
+def legacy_classify_intent(email_text):
+    patterns = {intent: list(pats) for intent, pats in INTENT_PATTERNS.items()}
+    text = email_text.lower()
+    for intent, pats in patterns.items():
+        for pat in pats:
+            if re.search(pat, text):
+                return intent, 0.95
+    for example, ex_intent in FEW_SHOT_EXAMPLES:
+        if example.lower() in text:
+            return ex_intent, 0.90
+    return 'Unknown', 0.5
+
+
+def bench(name, texts, number):
+    legacy = timeit.timeit(lambda: [legacy_classify_intent(t) for t in texts], number=number)
+    engine = timeit.timeit(lambda: classify_many(texts), number=number)
+    print(f"{name:<28} legacy {legacy / number * 1000:9.2f} ms  engine {engine / number * 1000:9.2f} ms  "
+          f"speedup x{legacy / engine:.1f}")
+
+
+def main():
+    docs = generate_documents('email', 2000)
+    emails = [doc.data.decode('utf-8') for doc in docs if doc.expected['intent'] != 'Unknown']
+    emails_plain = [doc.data.decode('utf-8') for doc in docs if doc.expected['intent'] == 'Unknown']
+    rng = random.Random(42)
+    pdf_plain = filler_text(rng, 400000)
+    pdf_rfq = pdf_plain + ' quotation'
+
+    for text in emails + emails_plain + [pdf_rfq, pdf_plain]:
+        assert classify_intent(text) == legacy_classify_intent(text)
+
+    bench("emails (keywords)", emails, 5)
+    bench("emails (no keywords)", emails_plain, 5)
+    bench("large PDF text, late RFQ", [pdf_rfq], 20)
+    bench("large PDF text, no match", [pdf_plain], 20)
+
+
+if __name__ == "__main__":
+    main()
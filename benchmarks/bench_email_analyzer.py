@@ -0,0 +1,64 @@
+"""
+Check EmailAnalyzer against extract_email_fields + detect_tone + classify_intent on a golden
+corpus (the repo samples plus the benchmark corpus emails and .eml messages) and report
+docs/sec for both paths.
+
+    python benchmarks/bench_email_analyzer.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classifier import classify_intent
+from corpus import generate_documents
+from email_parser import EmailAnalyzer, detect_tone, extract_email_fields, parse_email
+
+# Inputs the generated messages never produce
+EDGE_CASES = ['', '   ', 'From:', 'From:\n\nsomeone', 'subject:\nissue here',
+              'SUBJECT: Help\n\nDéjà vu: the café order failed again, this is a PROBLEM.']
+
+
+def reference(text):
+    fields = extract_email_fields(text)
+    intent, confidence = classify_intent(parse_email(text))
+    return {**fields, 'tone': detect_tone(text), 'intent': intent, 'confidence': confidence}
+
+
+def golden_corpus(n=1000):
+    emails = [doc.data.decode('utf-8') for doc in generate_documents('email', n)]
+    # Every fourth message again with Windows line endings
+    corpus = emails + [text.replace('\n', '\r\n') for text in emails[::4]]
+    corpus.extend(doc.data.decode('utf-8') for doc in generate_documents('eml', n // 10))
+    with open(os.path.join(ROOT, 'sample_email.txt'), encoding='utf-8') as f:
+        corpus.append(f.read())
+    with open(os.path.join(ROOT, 'Last chance_ These prices end in few days!.eml'), encoding='utf-8') as f:
+        corpus.append(f.read())
+    corpus.extend(EDGE_CASES)
+    return corpus
+
+
+def main():
+    corpus = golden_corpus()
+    analyzer = EmailAnalyzer()
+    mismatches = [text for text in corpus if analyzer.analyze(text) != reference(text)]
+    print(f"golden corpus: {len(corpus)} messages, {len(mismatches)} mismatches")
+    if mismatches:
+        raise SystemExit(f"first mismatch: {mismatches[0][:200]!r}")
+
+    large = corpus * 4
+    start = time.perf_counter()
+    for text in large:
+        reference(text)
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    analyzer.analyze_many(large)
+    fused = time.perf_counter() - start
+    print(f"separate functions {len(large) / legacy:10.0f} docs/sec")
+    print(f"EmailAnalyzer      {len(large) / fused:10.0f} docs/sec  (x{legacy / fused:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Invoice extraction on adversarial text: the previous MULTILINE line-item regex backtracks
+quadratically on long whitespace-heavy lines, while extract_invoice tokenizes each line once.
+Prints the legacy regex's time on growing single lines, then extract_invoice's time per MB on
+several adversarial shapes at growing sizes (bounded time per MB means linear cost), and
+checks both agree on well-formed invoices.
+
+    python benchmarks/bench_invoice_extractor.py --mb 1 4 16
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_extractor import extract_invoice
+
+LEGACY_TOTAL_RE = re.compile(r'Total\s*[:\-]?\s*\$?([\d,]+\.?\d*)', re.IGNORECASE)
+LEGACY_LINE_ITEM_RE = re.compile(r'^(\d+)\s+([\w\s]+)\s+\$?([\d,]+\.?\d*)$', re.MULTILINE)
+
+# Legacy cost grows cubically with line length; stop doubling once one run exceeds this many seconds
+LEGACY_BUDGET = 2.0
+
+
+def legacy_extract(text):
+    total_match = LEGACY_TOTAL_RE.search(text)
+    return {'total': float(total_match.group(1).replace(',', '')) if total_match else None,
+            'line_items': [{'qty': int(q), 'desc': d.strip(), 'price': float(p.replace(',', ''))}
+                           for q, d, p in LEGACY_LINE_ITEM_RE.findall(text)]}
+
+
+def adversarial(shape, size, rng):
+    """About `size` characters of one adversarial shape."""
+    if shape == 'whitespace line':
+        return '1' + ' ' * size + 'x'
+    if shape == 'word/space line':
+        return '1 ' + ' '.join('item' for _ in range(size // 5)) + ' x'
+    if shape == 'digit/comma line':
+        return '1 a ' + '1,' * (size // 2) + 'x'
+    if shape == 'summary words':
+        return '\n'.join('Total tax due ' * 8 + '%' for _ in range(size // 113))
+    if shape == 'table rows':
+        rows = [f"{rng.randint(1, 99)}   Part {rng.randint(1, 9999)}  {' ' * rng.randint(0, 60)}"
+                f"${rng.randint(1, 9999):,}.{rng.randint(0, 99):02d}" for _ in range(size // 60)]
+        return '\n'.join(rows)
+    raise ValueError(shape)
+
+
+SHAPES = ['whitespace line', 'word/space line', 'digit/comma line', 'summary words', 'table rows']
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+# Prose comparing a total with a threshold, as in the repo's sample PDF: never an invoice total
+PROSE_LINES = ["", "Invoice total > 10,000\n", "Orders with a total over 50,000 need sign-off\n",
+               "Approval required when the total exceeds 25,000.00\n", "Total < 100 ships free\n"]
+
+
+def well_formed(rng, n):
+    for _ in range(n):
+        rows = [f"{rng.randint(1, 50)} Widget {rng.choice('ABCDEF')} {rng.randint(1, 5000)}.{rng.randint(0, 99):02d}"
+                for _ in range(rng.randint(1, 30))]
+        yield 'Invoice\n' + rng.choice(PROSE_LINES) + '\n'.join(rows) + f"\nTotal: ${rng.randint(1, 99999):,}.00\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=float, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+    rng = random.Random(20)
+
+    for text in well_formed(rng, 500):
+        assert extract_invoice(text) == legacy_extract(text), text
+    for prose in PROSE_LINES[1:]:
+        assert extract_invoice(prose)['total'] is None and legacy_extract(prose)['total'] is None, prose
+
+    print("legacy LINE_ITEM_RE on one whitespace-heavy line")
+    size = 100
+    while True:
+        text = adversarial('whitespace line', size, rng)
+        elapsed = timed(legacy_extract, text)
+        print(f"  {size:>6} chars  legacy {elapsed * 1000:10.1f} ms   extract_invoice {timed(extract_invoice, text) * 1000:6.3f} ms")
+        if elapsed > LEGACY_BUDGET:
+            break
+        size *= 2
+
+    print("\nextract_invoice, ms per MB")
+    print(f"  {'shape':<18}" + ''.join(f"{mb:>8g} MB" for mb in args.mb))
+    for shape in SHAPES:
+        cells = []
+        for mb in args.mb:
+            text = adversarial(shape, int(mb * 1e6), rng)
+            cells.append(timed(extract_invoice, text) * 1000 / (len(text) / 1e6))
+        print(f"  {shape:<18}" + ''.join(f"{ms:>11.1f}" for ms in cells))
+
+
+if __name__ == "__main__":
+    main()
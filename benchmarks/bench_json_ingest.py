@@ -0,0 +1,82 @@
+"""
+JSON ingestion: the previous parse -> dumps -> parse path against a single parse with the
+compiled validator, and peak memory of streaming a large event array versus loading it.
+
+    python benchmarks/bench_json_ingest.py --events 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from corpus import generate_documents
+from format_detector import iter_json_events, json_text, load_json, validate_json_schema
+from pipeline import REQUIRED_JSON_FIELDS
+
+
+def legacy_validate(data, required_fields):
+    anomalies = []
+    for field, ftype in required_fields.items():
+        if field not in data:
+            anomalies.append(f"Missing field: {field}")
+        elif not isinstance(data[field], ftype):
+            anomalies.append(f"Type error: {field} should be {ftype.__name__}, got {type(data[field]).__name__}")
+    return (len(anomalies) == 0, anomalies)
+
+
+def legacy_ingest(data_bytes):
+    data = json.loads(data_bytes)
+    for key in ['body', 'text', 'content', 'message']:
+        if key in data:
+            text = str(data[key])
+            break
+    else:
+        text = json.dumps(data)
+    data = json.loads(text)
+    return legacy_validate(data, REQUIRED_JSON_FIELDS), text
+
+
+def ingest(data_bytes):
+    data, raw = load_json(data_bytes)
+    return validate_json_schema(data, REQUIRED_JSON_FIELDS), json_text(data, raw)
+
+
+def peak_mb(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=20000)
+    args = parser.parse_args()
+    # Corpus events: valid and schema-invalid, pretty-printed and compact
+    documents = [doc.data for doc in generate_documents('json', args.events)]
+    events = [json.loads(document) for document in documents]
+
+    for label, func in (('parse/dumps/parse', legacy_ingest), ('single parse', ingest)):
+        start = time.perf_counter()
+        for document in documents:
+            func(document)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<18} {len(documents) / elapsed:10.0f} docs/sec")
+    assert all(legacy_ingest(d)[0] == ingest(d)[0] for d in documents[:2000])
+
+    array = json.dumps(events).encode()
+    del events, documents
+    count = sum(1 for _ in iter_json_events(array))
+    print(f"\narray of {count} events, {len(array) / 1e6:.1f} MB")
+    print(f"json.loads whole array   peak {peak_mb(lambda: json.loads(array)):8.1f} MB")
+    print(f"iter_json_events stream  peak {peak_mb(lambda: sum(1 for _ in iter_json_events(array))):8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
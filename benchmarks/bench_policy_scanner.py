@@ -0,0 +1,74 @@
+"""
+Benchmark the compiled PolicyScanner (all mentions, counts and offsets) against the
+previous per-keyword regex loop (which only finds which keywords occur)
+on large synthetic PDF text, for the default keywords and for a large keyword list.
+Also checks that the pipeline reports (page, offset) positions for a real multi-page PDF.
+
+    python benchmarks/bench_policy_scanner.py
+"""
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import pdf_document, policy_page
+from pipeline import process_document
+from policy_scanner import DEFAULT_POLICY_KEYWORDS, PolicyScanner
+
+
+def legacy_policy_mentions(text, keywords):
+    return [kw for kw in keywords if re.search(rf'\b{kw}\b', text, re.IGNORECASE)]
+
+
+def make_pages(rng, pages, keywords, rate):
+    """Page texts of corpus contract filler; each line names a keyword with probability `rate`."""
+    return ['\n'.join(policy_page(rng, keywords, rate)) for _ in range(pages)]
+
+
+def make_keywords(rng, n):
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    terms = set(DEFAULT_POLICY_KEYWORDS)
+    while len(terms) < n:
+        terms.add(''.join(rng.choice(alphabet) for _ in range(rng.randint(3, 8))))
+    return sorted(terms)
+
+
+def bench(name, pages, keywords, number=3):
+    text = '\n'.join(pages)
+    scanner = PolicyScanner(keywords)
+    assert scanner.scan(pages)['mentions'] == legacy_policy_mentions(text, keywords)
+    legacy = timeit.timeit(lambda: legacy_policy_mentions(text, keywords), number=number) / number
+    mentions = timeit.timeit(lambda: scanner.scan(pages, stop_when_complete=True), number=number) / number
+    full = timeit.timeit(lambda: scanner.scan(pages), number=number) / number
+    mb = len(text.encode()) / 1e6
+    print(f"{name:<34} {mb:4.1f} MB  legacy {legacy * 1000:8.1f} ms  scanner mentions {mentions * 1000:7.1f} ms "
+          f"(x{legacy / mentions:.1f})  full scan {full * 1000:7.1f} ms (x{legacy / full:.1f})")
+
+
+def check_pipeline_offsets():
+    """The PDF agent scans page by page, so offsets name the page each mention is on."""
+    pages = [['Quarterly supplier review'], ['Data handled under GDPR terms'], ['Nothing here'], ['HIPAA and GDPR apply']]
+    result = process_document(pdf_document(pages), name='offsets.pdf', log=False, route=False, use_cache=False, record=False)
+    offsets = result.details['policy_offsets']
+    assert [page for page, _ in offsets['GDPR']] == [1, 3] and [page for page, _ in offsets['HIPAA']] == [3], offsets
+    print(f"Pipeline policy offsets: {offsets}")
+
+
+def main():
+    check_pipeline_offsets()
+    rng = random.Random(3)
+    no_hits = make_pages(rng, 300, DEFAULT_POLICY_KEYWORDS, 0.0)
+    bench("300 pages, 5 keywords, none found", no_hits, DEFAULT_POLICY_KEYWORDS)
+    bench("300 pages, 5 keywords, on last page", no_hits[:-1] + [no_hits[-1] + ' ' + ' '.join(DEFAULT_POLICY_KEYWORDS)],
+          DEFAULT_POLICY_KEYWORDS)
+    bench("300 pages, 5 keywords, frequent", make_pages(rng, 300, DEFAULT_POLICY_KEYWORDS, 0.01),
+          DEFAULT_POLICY_KEYWORDS)
+    keywords = make_keywords(rng, 1000)
+    bench("300 pages, 1000 keywords", make_pages(rng, 300, keywords, 0.1), keywords, number=1)
+
+
+if __name__ == "__main__":
+    main()
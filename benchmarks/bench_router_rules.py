@@ -0,0 +1,77 @@
+"""
+Routing cost as the rule table grows: the RuleIndex (by format and intent, then by the value
+of each rule's first eq/in condition) against a linear scan over every rule, for synthetic
+tables spread across formats, intents and customers. Indexed cost follows the number of
+candidate rules evaluated per document.
+
+    python benchmarks/bench_router_rules.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from action_router import OPS, ROUTING_RULES, Rule, RuleIndex
+
+FORMATS = ['Email', 'JSON', 'PDF']
+INTENTS = ['RFQ', 'Complaint', 'Invoice', 'Regulation', 'Fraud Risk', 'Unknown']
+CUSTOMERS = [f'customer-{i}' for i in range(500)]
+
+
+def synthetic_rules(n, rng):
+    """Mostly per-customer rules (eq/in on the customer), plus some threshold-only rules."""
+    rules = list(ROUTING_RULES)
+    while len(rules) < n:
+        i = len(rules)
+        threshold = ('confidence', 'gt', rng.random())
+        kind = rng.random()
+        if kind < 0.6:
+            when = (threshold, ('customer', 'eq', rng.choice(CUSTOMERS)))
+        elif kind < 0.9:
+            when = (('customer', 'in', tuple(rng.sample(CUSTOMERS, 3))), threshold)
+        else:
+            when = (threshold,)
+        rules.append(Rule(f'rule_{i}', f'/hook/{i}', format=rng.choice(FORMATS),
+                          intent=rng.choice(INTENTS + [None]), when=when))
+    return rules
+
+
+def linear_match(rules, facts):
+    matched, endpoints = [], set()
+    for rule in rules:
+        if rule.format not in (None, facts.get('format')) or rule.intent not in (None, facts.get('intent')):
+            continue
+        if rule.endpoint not in endpoints and all(OPS[op](facts.get(name), value) for name, op, value in rule.when):
+            endpoints.add(rule.endpoint)
+            matched.append(rule)
+    return matched
+
+
+def main():
+    rng = random.Random(5)
+    facts = [{'format': rng.choice(FORMATS), 'intent': rng.choice(INTENTS), 'confidence': rng.random(),
+              'customer': rng.choice(CUSTOMERS),
+              'urgency': rng.choice(['routine', 'escalate']), 'tone': 'neutral', 'total': rng.choice([None, 500, 20000]),
+              'policy_mentions': [], 'anomalies': []} for _ in range(2000)]
+    print(f"{'rules':>7} {'candidates/doc':>15} {'linear us/doc':>14} {'indexed us/doc':>15}")
+    for n in (10, 100, 1000, 10000):
+        rules = synthetic_rules(n, rng)
+        index = RuleIndex(rules)
+        assert all(index.match(f) == linear_match(rules, f) for f in facts)
+        start = time.perf_counter()
+        for f in facts:
+            linear_match(rules, f)
+        linear = time.perf_counter() - start
+        start = time.perf_counter()
+        for f in facts:
+            index.match(f)
+        indexed = time.perf_counter() - start
+        candidates = sum(len(index.candidates(f)) for f in facts) / len(facts)
+        print(f"{n:>7} {candidates:>15.0f} {linear / len(facts) * 1e6:>14.1f} {indexed / len(facts) * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Deterministic synthetic corpus for the benchmark suite: plain-text emails of varying tone,
+intent and size, raw MIME (.eml) messages, valid and schema-invalid JSON events, and
+multi-page invoice and policy PDFs (written directly, no PDF library needed). The same seed
+and scale always produce byte-identical documents, so runs on different commits measure
+the same input. Each document carries the labels it was generated with.
+
+    python benchmarks/corpus.py --out /tmp/corpus --seed 0 --scale 1
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Dict, List
+
+# Documents per kind at scale 1
+COUNTS = {'email': 300, 'eml': 100, 'json': 300, 'pdf_invoice': 20, 'pdf_policy': 20}
+
+# Target body sizes of generated emails, in bytes
+EMAIL_SIZES = (400, 4000, 40000)
+
+BASE_TIME = datetime(2025, 1, 1)
+
+SENDERS = ['alice', 'bob', 'carol', 'dave', 'erin', 'frank', 'grace', 'heidi']
+DOMAINS = ['example.com', 'acme.test', 'supplier.example', 'bank.example']
+
+TONE_SENTENCES = {
+    'escalation': ["This is not acceptable and we will escalate this.",
+                   "We are extremely dissatisfied and considering a lawsuit."],
+    'urgent': ["This is urgent, we need a response ASAP.", "Treat this as a priority, we need it today."],
+    'polite': ["Thank you for your help, we appreciate it.", "Could you kindly take a look when you have time?"],
+    'neutral': ["Following up on our call last week.", "See the details below."],
+}
+
+INTENT_SENTENCES = {
+    'Complaint': "We are not satisfied with the last delivery and want to complain about the problem.",
+    'Invoice': "Please find attached the invoice for your recent purchase; payment due in 30 days.",
+    'Regulation': "As per the new regulation, you must update your compliance policy.",
+    'Fraud Risk': "We detected a suspicious transaction that may indicate fraud.",
+    'RFQ': "This is a request for quotation (RFQ) for 500 units of your services.",
+    'Unknown': "Looking forward to catching up at the conference next month.",
+}
+
+FILLER = ("The team reviewed the schedule and the shipping details for the next quarter. "
+          "Attached notes summarize the meeting and the open questions from the warehouse. ").split()
+
+# In the order of the default policy keyword config
+POLICY_TERMS = ['GDPR', 'FDA', 'HIPAA', 'SOX', 'PCI']
+POLICY_FILLER = ("the supplier shall process personal data under the agreement and retain records for audit "
+                 "purposes subject to applicable law and regulatory guidance issued by the authority").split()
+
+PRODUCTS = ['Widget', 'Gadget', 'Bracket', 'Sensor', 'Cable', 'Adapter', 'Valve', 'Panel']
+
+# Lines per generated PDF page
+PDF_LINES_PER_PAGE = 55
+
+
+@dataclass
+class Document:
+    name: str
+    kind: str
+    data: bytes
+    # Generation labels: format, tone, intent, total, schema_valid, pages, ...
+    expected: Dict[str, Any] = field(default_factory=dict)
+
+
+def filler_text(rng: random.Random, size: int) -> str:
+    """About `size` bytes of email filler that matches no intent keyword."""
+    words, length = [], 0
+    while length < size:
+        word = rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+    # Wrap into lines of about 12 words, as mail clients do
+    return '\n'.join(' '.join(words[i:i + 12]) for i in range(0, len(words), 12))
+
+
+def _sender(rng: random.Random) -> str:
+    return f"{rng.choice(SENDERS)}{rng.randint(1, 99)}@{rng.choice(DOMAINS)}"
+
+
+def _email_body(rng: random.Random, tone: str, intent: str, size: int) -> str:
+    lines = [INTENT_SENTENCES[intent], rng.choice(TONE_SENTENCES[tone])]
+    return '\n'.join(lines) + '\n\n' + filler_text(rng, size) + '\n\nRegards'
+
+
+def make_email(rng: random.Random, i: int) -> Document:
+    tone, intent, size = rng.choice(list(TONE_SENTENCES)), rng.choice(list(INTENT_SENTENCES)), rng.choice(EMAIL_SIZES)
+    text = f"From: {_sender(rng)}\nSubject: Order {1000 + i}\n\n{_email_body(rng, tone, intent, size)}\n"
+    return Document(f"email_{i:05d}.txt", 'email', text.encode('utf-8'),
+                    {'format': 'Email', 'tone': tone, 'intent': intent})
+
+
+def make_eml(rng: random.Random, i: int) -> Document:
+    tone, intent, size = rng.choice(list(TONE_SENTENCES)), rng.choice(list(INTENT_SENTENCES)), rng.choice(EMAIL_SIZES)
+    message = EmailMessage()
+    message['From'] = _sender(rng)
+    message['To'] = 'support@example.com'
+    message['Subject'] = f"Ticket {2000 + i}"
+    message['Date'] = (BASE_TIME + timedelta(minutes=i)).strftime('%a, %d %b %Y %H:%M:%S +0000')
+    message['Message-ID'] = f"<{i}.bench@example.com>"
+    body = _email_body(rng, tone, intent, size)
+    message.set_content(body)
+    message.add_alternative('<html><body>' + ''.join(f'<p>{line}</p>' for line in body.splitlines()) + '</body></html>',
+                            subtype='html')
+    if rng.random() < 0.3:
+        message.add_attachment(bytes(rng.getrandbits(8) for _ in range(rng.choice((2000, 20000)))),
+                               maintype='application', subtype='octet-stream', filename='scan.bin')
+    # Fixed boundaries keep the bytes identical across runs
+    for n, part in enumerate(message.walk()):
+        if part.is_multipart():
+            part.set_boundary(f"=====bench{i}_{n}=====")
+    return Document(f"message_{i:05d}.eml", 'eml', message.as_bytes(),
+                    {'format': 'Email', 'tone': tone, 'intent': intent})
+
+
+def make_json_event(rng: random.Random, i: int) -> Document:
+    event = {
+        'event': rng.choice(['order', 'refund', 'login', 'transfer']),
+        'timestamp': (BASE_TIME + timedelta(seconds=i * 37)).isoformat(),
+        'payload': {'id': i, 'amount': round(rng.uniform(1, 5000), 2),
+                    'items': [rng.randint(1, 999) for _ in range(rng.choice((5, 50, 500)))]},
+    }
+    valid = rng.random() < 0.7
+    if not valid:
+        fault = rng.choice(['missing', 'type'])
+        if fault == 'missing':
+            del event[rng.choice(['event', 'timestamp', 'payload'])]
+        else:
+            event['payload'] = [event['payload']]
+    indent = 2 if rng.random() < 0.5 else None
+    return Document(f"event_{i:05d}.json", 'json', json.dumps(event, indent=indent).encode('utf-8'),
+                    {'format': 'JSON', 'schema_valid': valid})
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def pdf_document(pages: List[List[str]]) -> bytes:
+    """A minimal PDF 1.4 file with one Helvetica text page per list of lines."""
+    kids = [4 + 2 * i for i in range(len(pages))]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(pages)} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for kid, lines in zip(kids, pages):
+        content = ['BT', '/F1 10 Tf', '13 TL', '50 800 Td'] + [f"({_pdf_escape(line)}) Tj T*" for line in lines] + ['ET']
+        stream = '\n'.join(content).encode('latin-1')
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {kid + 1} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_invoice_pdf(rng: random.Random, i: int) -> Document:
+    """A multi-page invoice: item rows with per-page totals, then subtotal, tax and total due."""
+    rows = []
+    subtotal = 0.0
+    for _ in range(rng.choice((20, 120, 400))):
+        qty, unit = rng.randint(1, 40), rng.randint(100, 99999) / 100
+        amount = round(qty * unit, 2)
+        subtotal += amount
+        rows.append((f"{qty}  {rng.choice(PRODUCTS)} {rng.choice('ABCDEFGH')}{rng.randint(1, 99)}  "
+                     f"${unit:,.2f}  ${amount:,.2f}", amount))
+    pages, page, page_total = [], [f"INVOICE No {5000 + i}", "Bill to: Example Corp", "Qty  Description  Unit  Amount"], 0.0
+    for line, amount in rows:
+        if len(page) >= PDF_LINES_PER_PAGE - 2:
+            page.append(f"Page total ${page_total:,.2f}")
+            pages.append(page)
+            page, page_total = ["Qty  Description  Unit  Amount"], 0.0
+        page.append(line)
+        page_total += amount
+    subtotal = round(subtotal, 2)
+    tax = round(subtotal * 0.08, 2)
+    total = round(subtotal + tax, 2)
+    page += [f"Subtotal: ${subtotal:,.2f}", f"Tax (8%): ${tax:,.2f}", f"Total Due: ${total:,.2f}"]
+    pages.append(page)
+    return Document(f"invoice_{i:04d}.pdf", 'pdf_invoice', pdf_document(pages),
+                    {'format': 'PDF', 'total': total, 'line_items': len(rows), 'pages': len(pages)})
+
+
+def policy_page(rng: random.Random, terms: List[str], rate: float) -> List[str]:
+    """Lines of one page of contract text; each line names one of `terms` with probability `rate`."""
+    lines = []
+    for _ in range(PDF_LINES_PER_PAGE):
+        words = [rng.choice(POLICY_FILLER) for _ in range(12)]
+        if terms and rng.random() < rate:
+            words[rng.randrange(12)] = rng.choice(terms)
+        lines.append(' '.join(words))
+    return lines
+
+
+def make_policy_pdf(rng: random.Random, i: int) -> Document:
+    mentioned = sorted(rng.sample(POLICY_TERMS, rng.randint(0, 3)), key=POLICY_TERMS.index)
+    pages = [policy_page(rng, mentioned, 0.05) for _ in range(rng.choice((2, 8, 30)))]
+    # Every selected term appears at least once
+    for n, term in enumerate(mentioned):
+        pages[-1][n] = f"This agreement is subject to {term} requirements."
+    return Document(f"policy_{i:04d}.pdf", 'pdf_policy', pdf_document(pages),
+                    {'format': 'PDF', 'policy_mentions': mentioned, 'pages': len(pages)})
+
+
+GENERATORS = {
+    'email': make_email,
+    'eml': make_eml,
+    'json': make_json_event,
+    'pdf_invoice': make_invoice_pdf,
+    'pdf_policy': make_policy_pdf,
+}
+
+
+def generate_documents(kind: str, count: int, seed: int = 0) -> List[Document]:
+    """The first `count` documents of one kind; the same ones generate_corpus makes for `seed`."""
+    rng = random.Random(f"{seed}:{kind}")
+    return [GENERATORS[kind](rng, i) for i in range(count)]
+
+
+def generate_corpus(seed: int = 0, scale: float = 1.0) -> List[Document]:
+    """All documents for `seed` and `scale`; each kind draws from its own seeded generator."""
+    docs = []
+    for kind in GENERATORS:
+        docs.extend(generate_documents(kind, max(1, round(COUNTS[kind] * scale)), seed))
+    return docs
+
+
+def corpus_digest(docs: List[Document]) -> str:
+    """SHA-256 over names and bytes, recorded with each run so results are only compared on the same corpus."""
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(doc.name.encode('utf-8'))
+        digest.update(hashlib.sha256(doc.data).digest())
+    return digest.hexdigest()
+
+
+def write_corpus(docs: List[Document], directory: str):
+    """Write the documents plus a labels.json manifest, e.g. as input for `main.py --input_dir`."""
+    os.makedirs(directory, exist_ok=True)
+    for doc in docs:
+        with open(os.path.join(directory, doc.name), 'wb') as f:
+            f.write(doc.data)
+    with open(os.path.join(directory, 'labels.json'), 'w', encoding='utf-8') as f:
+        json.dump({doc.name: {'kind': doc.kind, **doc.expected} for doc in docs}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=float, default=1.0)
+    args = parser.parse_args()
+    docs = generate_corpus(args.seed, args.scale)
+    write_corpus(docs, args.out)
+    print(f"Wrote {len(docs)} documents ({sum(len(d.data) for d in docs) / 1e6:.1f} MB) to {args.out}")
+    print(f"Corpus digest: {corpus_digest(docs)}")
+
+
+if __name__ == "__main__":
+    main()
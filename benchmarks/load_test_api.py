@@ -0,0 +1,81 @@
+"""
+Load test for POST /classify under mixed email/PDF traffic.
+Start the API first (python api.py), then:
+
+    python benchmarks/load_test_api.py --requests 500 --concurrency 32 --pdf_ratio 0.3
+
+Reports p50/p99 latency per document kind and how many requests were shed with 429.
+Every request uploads distinct bytes (a numbered trailer on the email or PDF), so the result
+cache does not turn the run into hits; --repeat sends identical payloads to measure cache hits.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from metrics import percentile
+
+DEFAULT_EMAIL = os.path.join(ROOT, 'sample_email.txt')
+DEFAULT_PDF = os.path.join(ROOT, 'Gmail - Follow up to application for the role of AI Agent Development Internship!.pdf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test POST /classify")
+    parser.add_argument('--url', default='http://localhost:8000/classify')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--pdf_ratio', type=float, default=0.3, help='Share of requests that upload the PDF')
+    parser.add_argument('--email', default=DEFAULT_EMAIL)
+    parser.add_argument('--pdf', default=DEFAULT_PDF)
+    parser.add_argument('--repeat', action='store_true', help='Send identical payloads (served from the result cache)')
+    args = parser.parse_args()
+
+    payloads = {
+        'email': ('sample_email.txt', open(args.email, 'rb').read(), 'text/plain'),
+        'pdf': ('sample.pdf', open(args.pdf, 'rb').read(), 'application/pdf'),
+    }
+    # Appended after the email body / the PDF's %%EOF: changes the content hash, not the classification
+    trailers = {'email': b'\n\nRef: load-test-%d\n', 'pdf': b'\n%% load-test-%d\n'}
+    rng = random.Random(0)
+    kinds = ['pdf' if rng.random() < args.pdf_ratio else 'email' for _ in range(args.requests)]
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+
+    def send(numbered):
+        i, kind = numbered
+        name, data, content_type = payloads[kind]
+        if not args.repeat:
+            data += trailers[kind] % i
+        start = time.perf_counter()
+        response = session.post(args.url, files={'file': (name, data, content_type)})
+        return kind, response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(send, enumerate(kinds)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f} req/s)")
+    for kind in ('email', 'pdf'):
+        latencies = [t * 1000 for k, status, t in outcomes if k == kind and status == 200]
+        shed = sum(1 for k, status, _ in outcomes if k == kind and status == 429)
+        errors = sum(1 for k, status, _ in outcomes if k == kind and status not in (200, 429))
+        nan = float('nan')
+        mean = statistics.mean(latencies) if latencies else nan
+        p50, p99 = (percentile(latencies, 50), percentile(latencies, 99)) if latencies else (nan, nan)
+        print(f"{kind:<6} ok={len(latencies):<5} 429={shed:<4} errors={errors:<4} "
+              f"p50={p50:8.1f} ms  p99={p99:8.1f} ms  mean={mean:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Reproducible benchmark suite over the synthetic corpus (benchmarks/corpus.py): intent
+classification, the email_parser functions, format detection and the format_detector
+extractors, shared_memory writes and the full pipeline end to end. Each benchmark runs in
+a fresh process (so peak RSS is its own) inside a scratch directory (so shared memory and
+caches start empty), and reports items/sec, p50/p99/max latency per item and peak RSS as
+JSON. Runs record the commit and corpus digest so they can be compared across commits.
+
+    python benchmarks/run_suite.py --output base.json
+    python benchmarks/run_suite.py --output new.json --compare base.json
+    python benchmarks/run_suite.py --only classify_intent,pipeline --scale 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import Document, corpus_digest, generate_corpus
+from metrics import percentile
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is not reported
+    resource = None
+
+SUITE_VERSION = 1
+
+# Environment of every benchmark process: empty scratch shared memory, simulated routing, no result cache
+BASE_ENV = {'SHARED_MEMORY_BACKEND': 'jsonl', 'ACTION_DISPATCH_URL': '', 'RESULT_CACHE': '0'}
+
+BENCHMARKS: Dict[str, Tuple[Callable[[List[Document]], Tuple[List[float], Dict[str, Any]]], Dict[str, str]]] = {}
+
+
+def benchmark(name: str, **env):
+    """Register a benchmark: a function of the corpus returning (per-item seconds, extra fields)."""
+    def register(func):
+        BENCHMARKS[name] = (func, env)
+        return func
+    return register
+
+
+def timed_items(items, func) -> List[float]:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _texts(docs: List[Document], kinds=('email',)) -> List[Tuple[Document, str]]:
+    return [(doc, doc.data.decode('utf-8')) for doc in docs if doc.kind in kinds]
+
+
+def _accuracy(pairs) -> float:
+    pairs = list(pairs)
+    return round(sum(got == expected for got, expected in pairs) / len(pairs), 4) if pairs else None
+
+
+@benchmark('classify_intent')
+def bench_classify_intent(docs):
+    from classifier import classify_intent
+    texts = _texts(docs, ('email', 'json'))
+    intents = {}
+    latencies = timed_items(texts, lambda item: intents.__setitem__(item[0].name, classify_intent(item[1])[0]))
+    return latencies, {'intent_accuracy': _accuracy((intents[doc.name], doc.expected['intent'])
+                                                    for doc, _ in texts if 'intent' in doc.expected)}
+
+
+@benchmark('email_analyzer')
+def bench_email_analyzer(docs):
+    from email_parser import EmailAnalyzer
+    analyzer = EmailAnalyzer()
+    return timed_items(_texts(docs), lambda item: analyzer.analyze(item[1])), {}
+
+
+@benchmark('email_fields_tone')
+def bench_email_fields_tone(docs):
+    from email_parser import detect_tone, extract_email_fields
+    return timed_items(_texts(docs), lambda item: (extract_email_fields(item[1]), detect_tone(item[1]))), {}
+
+
+@benchmark('parse_eml')
+def bench_parse_eml(docs):
+    from email_parser import EML_CHUNK_SIZE, parse_eml
+    messages = [doc.data for doc in docs if doc.kind == 'eml']
+    return timed_items(messages, lambda data: parse_eml(data[i:i + EML_CHUNK_SIZE]
+                                                        for i in range(0, len(data), EML_CHUNK_SIZE))), {}
+
+
+@benchmark('detect_format')
+def bench_detect_format(docs):
+    from format_detector import detect_format
+    formats = {}
+    latencies = timed_items(docs, lambda doc: formats.__setitem__(doc.name, detect_format(doc.data)))
+    return latencies, {'format_accuracy': _accuracy((formats[doc.name], doc.expected['format']) for doc in docs)}
+
+
+@benchmark('extract_pdf_text')
+def bench_extract_pdf_text(docs):
+    from format_detector import extract_text
+    pdfs = [doc for doc in docs if doc.expected['format'] == 'PDF']
+    start = time.perf_counter()
+    latencies = timed_items(pdfs, lambda doc: extract_text(doc.data, 'PDF'))
+    pages = sum(doc.expected['pages'] for doc in pdfs)
+    return latencies, {'pages': pages, 'pages_per_sec': round(pages / (time.perf_counter() - start), 1)}
+
+
+@benchmark('pdf_fields')
+def bench_pdf_fields(docs):
+    from format_detector import extract_pdf_invoice_fields, extract_text, scan_pdf_policy_mentions
+    texts = [(doc, extract_text(doc.data, 'PDF')) for doc in docs if doc.expected['format'] == 'PDF']
+    found = {}
+
+    def run(item):
+        doc, text = item
+        found[doc.name] = (extract_pdf_invoice_fields(text), scan_pdf_policy_mentions(text)['mentions'])
+
+    latencies = timed_items(texts, run)
+    return latencies, {
+        'invoice_total_accuracy': _accuracy((found[doc.name][0]['total'], doc.expected['total'])
+                                            for doc, _ in texts if doc.kind == 'pdf_invoice'),
+        'policy_mentions_accuracy': _accuracy((found[doc.name][1], doc.expected['policy_mentions'])
+                                              for doc, _ in texts if doc.kind == 'pdf_policy'),
+    }
+
+
+@benchmark('json_validate')
+def bench_json_validate(docs):
+    from format_detector import load_json, validate_json_schema
+    from pipeline import REQUIRED_JSON_FIELDS
+    events = [doc for doc in docs if doc.kind == 'json']
+    valid = {}
+    latencies = timed_items(events, lambda doc: valid.__setitem__(
+        doc.name, validate_json_schema(load_json(doc.data)[0], REQUIRED_JSON_FIELDS)[0]))
+    return latencies, {'schema_accuracy': _accuracy((valid[doc.name], doc.expected['schema_valid']) for doc in events)}
+
+
+def _memory_entries(docs):
+    from shared_memory import make_result
+    return [make_result('BenchAgent', {'source': doc.name, 'timestamp': None, 'format': doc.expected['format']},
+                        {'kind': doc.kind, **doc.expected}, ['[ACTION] Routine'], f"Benchmark entry for {doc.name}")
+            for doc in docs]
+
+
+def _bench_memory_writes(docs, backend_name, path):
+    from shared_memory import BACKENDS
+    entries = _memory_entries(docs)
+    backend = BACKENDS[backend_name](path)
+    latencies = timed_items(entries, lambda entry: backend.append('results', entry))
+    batched = BACKENDS[backend_name](path + '.batched')
+    start = time.perf_counter()
+    for i in range(0, len(entries), 500):
+        batched.append_many('results', entries[i:i + 500])
+    return latencies, {'batched_entries_per_sec': round(len(entries) / (time.perf_counter() - start), 1)}
+
+
+@benchmark('memory_write_jsonl')
+def bench_memory_write_jsonl(docs):
+    return _bench_memory_writes(docs, 'jsonl', 'bench_memory.jsonl')
+
+
+@benchmark('memory_write_sqlite')
+def bench_memory_write_sqlite(docs):
+    return _bench_memory_writes(docs, 'sqlite', 'bench_memory.db')
+
+
+def _bench_pipeline(docs, passes):
+    from pipeline import process_document
+    results = {}
+
+    def run(doc):
+        results[doc.name] = process_document(doc.data, name=doc.name)
+
+    for _ in range(passes - 1):
+        timed_items(docs, run)
+    latencies = timed_items(docs, run)
+    by_format: Dict[str, List[float]] = {}
+    for doc, seconds in zip(docs, latencies):
+        by_format.setdefault(doc.expected['format'], []).append(seconds)
+    return latencies, {
+        'format_accuracy': _accuracy((results[doc.name].format, doc.expected['format']) for doc in docs),
+        'cache_hits': sum(result.cache_hit is not None for result in results.values()),
+        'by_format': {fmt: {'items': len(values), **_latency_ms(values)} for fmt, values in sorted(by_format.items())},
+    }
+
+
+@benchmark('pipeline')
+def bench_pipeline(docs):
+    return _bench_pipeline(docs, passes=1)
+
+
+@benchmark('pipeline_cached', RESULT_CACHE='1')
+def bench_pipeline_cached(docs):
+    # Second pass over the same documents: every agent output comes from the result cache
+    return _bench_pipeline(docs, passes=2)
+
+
+def _latency_ms(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {'p50': None, 'p99': None, 'max': None}
+    return {'p50': round(percentile(latencies, 50) * 1000, 4),
+            'p99': round(percentile(latencies, 99) * 1000, 4),
+            'max': round(max(latencies) * 1000, 4)}
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_benchmark(name: str, seed: int, scale: float) -> Dict[str, Any]:
+    """Run one benchmark; called in a fresh process whose working directory is a scratch directory."""
+    func, env = BENCHMARKS[name]
+    os.environ.update({**BASE_ENV, **env})
+    with tempfile.TemporaryDirectory(prefix=f'bench_{name}_') as workdir:
+        os.chdir(workdir)
+        docs = generate_corpus(seed, scale)
+        baseline = peak_rss_mb()
+        latencies, extra = func(docs)
+        os.chdir(ROOT)
+    # Throughput over the timed items only (warm-up passes and setup are excluded)
+    elapsed = sum(latencies)
+    return {
+        'items': len(latencies),
+        'seconds': round(elapsed, 4),
+        'items_per_sec': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        'latency_ms': _latency_ms(latencies),
+        'peak_rss_mb': peak_rss_mb(),
+        'baseline_rss_mb': baseline,
+        **extra,
+    }
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def run_meta(docs: List[Document], seed: int, scale: float) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for doc in docs:
+        counts[doc.kind] = counts.get(doc.kind, 0) + 1
+    return {
+        'suite_version': SUITE_VERSION,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git('rev-parse', 'HEAD') or None,
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'scale': scale,
+        'corpus_digest': corpus_digest(docs),
+        'corpus_documents': counts,
+        'corpus_bytes': sum(len(doc.data) for doc in docs),
+    }
+
+
+def print_report(report: Dict[str, Any], base: Dict[str, Any] = None):
+    print(f"{'Benchmark':<20} {'Items':>6} {'Items/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Peak RSS MB':>12}"
+          + (f" {'vs base items/s':>16} {'vs base p99':>12}" if base else ''))
+    for name, result in report['results'].items():
+        latency = result['latency_ms']
+        line = (f"{name:<20} {result['items']:>6} {result['items_per_sec'] or 0:>10.1f} {latency['p50'] or 0:>9.3f} "
+                f"{latency['p99'] or 0:>9.3f} {result['peak_rss_mb'] or 0:>12.1f}")
+        before = (base or {}).get('results', {}).get(name)
+        if before and before.get('items_per_sec') and result.get('items_per_sec'):
+            throughput = result['items_per_sec'] / before['items_per_sec'] - 1
+            p99 = latency['p99'] / before['latency_ms']['p99'] - 1 if before['latency_ms']['p99'] else 0.0
+            line += f" {throughput:>+15.1%} {p99:>+12.1%}"
+        print(line)
+    if base and base['meta'].get('corpus_digest') != report['meta']['corpus_digest']:
+        print("Warning: the base run used a different corpus (seed/scale or generator changed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='Write the JSON report here (default: print it)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=float, default=1.0, help='Corpus size relative to corpus.COUNTS')
+    parser.add_argument('--only', help=f"Comma-separated benchmarks to run, from: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--compare', help='A previous JSON report to compare throughput and p99 against')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    report = {'meta': run_meta(generate_corpus(args.seed, args.scale), args.seed, args.scale), 'results': {}}
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        print(f"Running {name} ...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            report['results'][name] = executor.submit(run_benchmark, name, args.seed, args.scale).result()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    base = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    print_report(report, base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Local stub for the action endpoints (/crm/escalate, /risk_alert, /compliance_flag, /json_alert).
+Accepts the dispatcher's {"actions": [...]} batches over keep-alive HTTP/1.1, can inject
+latency and failures, and reports what it received on GET /stats.
+
+    python benchmarks/stub_action_server.py --port 8081 --fail_rate 0.1
+    ACTION_DISPATCH_URL=http://localhost:8081 python main.py --input_file sample_email.txt
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubActionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fail_rate=0.0, latency=0.0, seed=None):
+        super().__init__(address, _Handler)
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.received = Counter()
+        self.requests = Counter()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a daemon thread (for benchmarks that run the stub in-process)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without this, Nagle + delayed ACK add ~40 ms per keep-alive request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._reply(404, {'detail': 'not found'})
+        with self.server.lock:
+            self._reply(200, {'received': dict(self.server.received), 'requests': dict(self.server.requests)})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+            failed = self.server.random.random() < self.server.fail_rate
+            if not failed:
+                self.server.received[self.path] += len(json.loads(body).get('actions', []))
+        if failed:
+            return self._reply(503, {'detail': 'injected failure'})
+        self._reply(200, {'accepted': True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub server for routed actions")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fail_rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    args = parser.parse_args()
+    server = StubActionServer((args.host, args.port), args.fail_rate, args.latency)
+    print(f"Stub action server on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
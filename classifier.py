@@ -1,5 +1,6 @@
+import os
 import re
-from typing import Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 FEW_SHOT_EXAMPLES = [
     ("We are not satisfied with the product and want to complain.", "Complaint"),
@@ -9,26 +10,139 @@ FEW_SHOT_EXAMPLES = [
     ("We detected a suspicious transaction that may indicate fraud.", "Fraud Risk"),
 ]
 
+# Bump when classification output can change, so cached results are recomputed
+CLASSIFIER_VERSION = "2"
+
+# 'regex' (keyword patterns) or 'ml' (intent_model, falling back to regex when unavailable or unsure)
+INTENT_BACKEND = os.environ.get("INTENT_BACKEND", "regex")
+ML_MIN_CONFIDENCE = float(os.environ.get("INTENT_ML_MIN_CONFIDENCE", "0.6"))
+
+# Intent keyword patterns, in priority order: the first intent with any match wins
+INTENT_PATTERNS = {
+    'Complaint': [r'not satisfied', r'complain', r'issue', r'problem', r'unsatisfactory'],
+    'Invoice': [r'invoice', r'payment due', r'bill', r'amount due'],
+    'Regulation': [r'compliance', r'regulation', r'policy', r'legal'],
+    'Fraud Risk': [r'fraud', r'scam', r'suspicious', r'unauthorized', r'risk'],
+    'RFQ': [r'request for quotation', r'rfq', r'quote', r'quotation'],
+}
+
+
+_REGEX_METACHARS = set('.^$*+?{}[]\\|()')
+
+
+class IntentEngine:
+    """
+    Intent patterns compiled once, in priority order.
+    Plain keywords are matched with substring search (a C-level fast search,
+    much cheaper than running `re` over the text); any real regex patterns of an
+    intent are folded into one compiled alternation. Intents are tried in order
+    and the first one with a hit wins, as before.
+    """
+
+    def __init__(self, patterns: Dict[str, List[str]] = INTENT_PATTERNS, examples=FEW_SHOT_EXAMPLES):
+        self.rules = []
+        for intent, pats in patterns.items():
+            literals = tuple(p for p in pats if not _REGEX_METACHARS.intersection(p))
+            regexes = [p for p in pats if _REGEX_METACHARS.intersection(p)]
+            self.rules.append((intent, literals, re.compile('|'.join(regexes)) if regexes else None))
+        self.examples = [(example.lower(), ex_intent) for example, ex_intent in examples]
+
+    def classify(self, email_text: str) -> Tuple[str, float]:
+        return self.classify_lower(email_text.lower())
+
+    def classify_lower(self, text: str) -> Tuple[str, float]:
+        """Classify text that is already lowercased."""
+        for intent, literals, regex in self.rules:
+            if any(lit in text for lit in literals) or (regex is not None and regex.search(text)):
+                return intent, 0.95
+
+        for example, ex_intent in self.examples:
+            if example in text:
+                return ex_intent, 0.90
+        return 'Unknown', 0.5
+
+    def classify_many(self, texts: Iterable[str]) -> List[Tuple[str, float]]:
+        return [self.classify(text) for text in texts]
+
+
+class IntentScan:
+    """
+    Classify a document fed one page at a time. The regex engine only keeps the highest-priority
+    hit so far, which gives the same answer as classifying the pages joined with newlines (the
+    keywords never span a line break). The ML model needs the whole text, so it is buffered.
+    """
+
+    def __init__(self, engine: IntentEngine):
+        self.engine = engine
+        self.model = _ml_model()
+        self.pages: List[str] = []
+        self.rule: Optional[int] = None
+        self.example: Optional[int] = None
+
+    def feed(self, page: str):
+        if self.model is not None:
+            self.pages.append(page)
+            return
+        if self.rule == 0:
+            return
+        text = page.lower()
+        for index, (_, literals, regex) in enumerate(self.engine.rules[:self.rule]):
+            if any(lit in text for lit in literals) or (regex is not None and regex.search(text)):
+                self.rule = index
+                return
+        if self.rule is None:
+            for index, (example, _) in enumerate(self.engine.examples[:self.example]):
+                if example in text:
+                    self.example = index
+                    break
+
+    def result(self) -> Tuple[str, float]:
+        if self.model is not None:
+            return classify_intent("\n".join(self.pages))
+        if self.rule is not None:
+            return self.engine.rules[self.rule][0], 0.95
+        if self.example is not None:
+            return self.engine.examples[self.example][1], 0.90
+        return 'Unknown', 0.5
+
+
+_ENGINE = IntentEngine()
+
+
+def _ml_model():
+    if INTENT_BACKEND != 'ml':
+        return None
+    from intent_model import get_model
+    return get_model()
+
+
 def classify_intent(email_text: str) -> Tuple[str, float]:
     """
-    Classifies the intent of the input using few-shot examples and keyword/schema matching.
+    Classifies the intent of the input using few-shot examples and keyword/schema matching,
+    or the trained ML model when INTENT_BACKEND is 'ml'.
     Returns (intent, confidence).
     """
-    patterns = {
-        'Complaint': [r'not satisfied', r'complain', r'issue', r'problem', r'unsatisfactory'],
-        'Invoice': [r'invoice', r'payment due', r'bill', r'amount due'],
-        'Regulation': [r'compliance', r'regulation', r'policy', r'legal'],
-        'Fraud Risk': [r'fraud', r'scam', r'suspicious', r'unauthorized', r'risk'],
-        'RFQ': [r'request for quotation', r'rfq', r'quote', r'quotation'],
-    }
-    text = email_text.lower()
-    
-    for intent, pats in patterns.items():
-        for pat in pats:
-            if re.search(pat, text):
-                return intent, 0.95
-    
-    for example, ex_intent in FEW_SHOT_EXAMPLES:
-        if example.lower() in text:
-            return ex_intent, 0.90
-    return 'Unknown', 0.5
+    return classify_many([email_text])[0]
+
+
+def classify_lowered(text: str) -> Tuple[str, float]:
+    """classify_intent for text the caller has already lowercased, without another copy on the regex path."""
+    if _ml_model() is None:
+        return _ENGINE.classify_lower(text)
+    return classify_many([text])[0]
+
+
+def intent_scan() -> IntentScan:
+    """A page-by-page classify_intent for long documents."""
+    return IntentScan(_ENGINE)
+
+
+def classify_many(texts: Iterable[str]) -> List[Tuple[str, float]]:
+    """Classify a batch of texts; returns one (intent, confidence) per text."""
+    texts = list(texts)
+    model = _ml_model()
+    if model is None:
+        return _ENGINE.classify_many(texts)
+    predictions = model.predict_many(texts)
+    return [pred if pred[1] >= ML_MIN_CONFIDENCE else _ENGINE.classify(text)
+            for text, pred in zip(texts, predictions)]
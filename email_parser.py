@@ -1,5 +1,13 @@
+import os
 import re
-from typing import Dict, Any
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesFeedParser, BytesHeaderParser
+from html.parser import HTMLParser
+from itertools import chain
+from typing import Dict, Any, Iterable, Iterator, List
+
+from classifier import classify_intent, classify_lowered
 
 def parse_email(email_text):
     return email_text.strip()
@@ -45,9 +53,239 @@ def detect_tone(email_text: str) -> str:
         return 'escalation'
     return 'neutral'
 
+def needs_escalation(email_fields: Dict[str, Any], tone: str) -> bool:
+    return email_fields['urgency'] == 'escalate' or tone in ['escalation', 'threatening']
+
 def trigger_action(email_fields: Dict[str, Any], tone: str) -> str:
    
-    if email_fields['urgency'] == 'escalate' or tone in ['escalation', 'threatening']:        
+    if needs_escalation(email_fields, tone):        
         return f"[ACTION] Escalated: Notified CRM for sender {email_fields['sender']} (issue: {email_fields['issue']})"
     else:        
         return f"[ACTION] Routine: Logged and closed for sender {email_fields['sender']} (issue: {email_fields['issue']})"
+
+
+# Keyword groups of extract_email_fields / detect_tone, matched as plain substrings
+URGENCY_TERMS = ('urgent', 'asap', 'immediately', 'priority', 'demand immediate action')
+ISSUE_TERMS = ('complain', 'issue', 'problem', 'dissatisfied', 'not acceptable')
+ESCALATION_TERMS = ('not acceptable', 'legal action', 'threat', 'lawsuit', 'escalate',
+                    'demand immediate action', 'extremely dissatisfied', 'angry')
+POLITE_TERMS = ('please', 'kindly', 'thank you', 'appreciate')
+URGENT_TONE_TERMS = ('urgent', 'immediately', 'asap', 'priority')
+
+SENDER_LINE_RE = re.compile(r'^From:\s*(.*)$', re.MULTILINE | re.IGNORECASE)
+ADDRESS_RE = re.compile(r'[\w\.-]+@[\w\.-]+')
+
+class EmailAnalyzer:
+    """
+    Produces sender, urgency, issue, tone and intent in one go, identical to calling
+    extract_email_fields, detect_tone and classify_intent(parse_email(...)) separately.
+    The message is lowercased and split into lines once; keyword groups are checked with
+    substring search on the lowercased copy instead of separate IGNORECASE regex scans.
+    Non-ASCII messages, where lowercasing and IGNORECASE can disagree, go through the
+    original functions.
+    """
+
+    def analyze(self, email_text: str) -> Dict[str, Any]:
+        if not email_text.isascii():
+            return self._analyze_reference(email_text)
+        lower = email_text.lower()
+
+        sender = None
+        sender_match = SENDER_LINE_RE.search(email_text) or ADDRESS_RE.search(email_text)
+        if sender_match:
+            sender = (sender_match.group(1) if sender_match.lastindex else sender_match.group(0)).strip()
+
+        urgency = 'escalate' if any(term in lower for term in URGENCY_TERMS) else 'routine'
+
+        lines = email_text.splitlines()
+        lower_lines = lower.splitlines()
+        issue = None
+        found_subject = False
+        for line, lower_line in zip(lines, lower_lines):
+            if found_subject and line.strip():
+                issue = line.strip()
+                break
+            if lower_line.startswith('subject:'):
+                found_subject = True
+        if not issue:
+            for line, lower_line in zip(lines, lower_lines):
+                if any(term in lower_line for term in ISSUE_TERMS):
+                    issue = line.strip()
+                    break
+
+        if any(term in lower for term in ESCALATION_TERMS):
+            tone = 'escalation'
+        elif any(term in lower for term in POLITE_TERMS):
+            tone = 'polite'
+        elif any(term in lower for term in URGENT_TONE_TERMS):
+            tone = 'escalation'
+        else:
+            tone = 'neutral'
+
+        intent, confidence = classify_lowered(lower)
+        return {'sender': sender, 'urgency': urgency, 'issue': issue, 'tone': tone,
+                'intent': intent, 'confidence': confidence}
+
+    @staticmethod
+    def _analyze_reference(email_text: str) -> Dict[str, Any]:
+        fields = extract_email_fields(email_text)
+        intent, confidence = classify_intent(parse_email(email_text))
+        return {**fields, 'tone': detect_tone(email_text), 'intent': intent, 'confidence': confidence}
+
+    def analyze_many(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        return [self.analyze(text) for text in texts]
+
+
+# Stop feeding a raw .eml message to the parser after this many bytes (0 = unlimited)
+EML_MAX_BYTES = int(os.environ.get("EML_MAX_BYTES", str(32 * 1024 * 1024)))
+EML_CHUNK_SIZE = 64 * 1024
+# Longest unterminated body line held back to check for a boundary (those are at most 76 bytes)
+EML_LINE_BYTES = 1024
+
+# Transport/MIME headers that start a raw RFC 5322 message but never a hand-written email
+RAW_MESSAGE_RE = re.compile(rb'^(?:received|delivered-to|return-path|mime-version|message-id|content-type|x-[\w-]+)[ \t]*:',
+                            re.IGNORECASE)
+
+MIME_VERSION_RE = re.compile(rb'^mime-version[ \t]*:', re.IGNORECASE | re.MULTILINE)
+
+def is_raw_message(head: bytes) -> bool:
+    """True when the first bytes look like a raw RFC 5322 message (an .eml export) rather than plain text."""
+    head = head.lstrip()
+    header_block = re.split(rb'\r?\n[ \t]*\r?\n', head, maxsplit=1)[0]
+    return RAW_MESSAGE_RE.match(head) is not None or MIME_VERSION_RE.search(header_block) is not None
+
+class _HTMLText(HTMLParser):
+    BLOCK_TAGS = {'br', 'p', 'div', 'tr', 'li', 'table', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+def html_to_text(html: str) -> str:
+    parser = _HTMLText()
+    parser.feed(html)
+    parser.close()
+    return ''.join(parser.parts)
+
+def _part_text(part: EmailMessage) -> str:
+    try:
+        text = part.get_content()
+    except (LookupError, UnicodeError):
+        payload = part.get_payload(decode=True) or b''
+        text = payload.decode('utf-8', errors='replace')
+    return html_to_text(text) if part.get_content_subtype() == 'html' else text
+
+def message_text(message: EmailMessage) -> str:
+    """
+    Render a parsed message as From/Subject lines plus the text/plain body (or the
+    stripped text/html body). Attachments and other parts are never decoded.
+    """
+    lines = [f"{header}: {message[header]}" for header in ('From', 'Subject') if message[header] is not None]
+    body = message.get_body(preferencelist=('plain', 'html'))
+    text = _part_text(body) if body is not None else ''
+    # Collapse the blank-line runs and trailing spaces left by quoted-printable and HTML layout
+    body_lines = [line.strip() for line in text.splitlines()]
+    body_text = '\n'.join(line for i, line in enumerate(body_lines) if line or (i and body_lines[i - 1]))
+    return '\n'.join(lines) + '\n\n' + body_text.strip()
+
+def _skips_body(headers) -> bool:
+    """True for a part message_text never reads: an attachment or a non-text leaf part."""
+    return (headers.get_content_disposition() == 'attachment'
+            or headers.get_content_maintype() not in ('text', 'multipart', 'message'))
+
+def _text_parts(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Pass a raw message through line by line, dropping the bodies of attachments and other
+    non-text parts so the parser never buffers them: those parts keep their headers and
+    boundaries but parse with an empty payload.
+    """
+    boundaries = set()
+    state = 'headers'  # 'headers' of the next part, then its 'body' (kept) or 'skip' (dropped)
+    header_lines: List[bytes] = []
+    pending = b''
+    midline = False  # the start of the current body line was already passed on or dropped
+    for chunk in chain(chunks, [None]):
+        if chunk is None:
+            lines, pending = ([pending] if pending else []), b''
+        else:
+            lines = (pending + chunk).splitlines(keepends=True)
+            # A trailing '\r' may be the first half of '\r\n'
+            pending = lines.pop() if lines and not lines[-1].endswith(b'\n') else b''
+        kept = []
+        for line in lines:
+            if midline:
+                midline = False
+                if state == 'body':
+                    kept.append(line)
+                continue
+            if state == 'headers':
+                kept.append(line)
+                if line.strip():
+                    header_lines.append(line)
+                    continue
+                headers = BytesHeaderParser().parsebytes(b''.join(header_lines))
+                header_lines = []
+                if _skips_body(headers):
+                    state = 'skip'
+                elif headers.get_content_type() == 'message/rfc822':
+                    pass  # the body starts with the headers of the enclosed message
+                else:
+                    if headers.get_content_maintype() == 'multipart' and headers.get_boundary():
+                        boundaries.add(b'--' + headers.get_boundary().encode('utf-8', 'surrogateescape'))
+                    state = 'body'
+                continue
+            if line.startswith(b'--'):
+                delimiter = line.rstrip()
+                if delimiter in boundaries:
+                    kept.append(line)
+                    state = 'headers'
+                    continue
+                if delimiter.endswith(b'--') and delimiter[:-2] in boundaries:
+                    kept.append(line)
+                    state = 'body'  # epilogue of the enclosing multipart
+                    continue
+            if state == 'body':
+                kept.append(line)
+        if state != 'headers' and len(pending) > EML_LINE_BYTES:
+            if state == 'body':
+                kept.append(pending)
+            pending, midline = b'', True
+        if kept:
+            yield b''.join(kept)
+
+def _capped(chunks: Iterable[bytes], max_bytes: int) -> Iterator[bytes]:
+    read = 0
+    for chunk in chunks:
+        if max_bytes and read + len(chunk) > max_bytes:
+            yield chunk[:max_bytes - read]
+            return
+        yield chunk
+        read += len(chunk)
+
+def parse_eml(chunks: Iterable[bytes], max_bytes: int = EML_MAX_BYTES) -> str:
+    """
+    Incrementally parse a raw message fed as byte chunks and return its message_text.
+    Attachment bodies are dropped before they reach the parser, and with `max_bytes`
+    the rest of the message is never read.
+    """
+    parser = BytesFeedParser(policy=policy.default)
+    for chunk in _text_parts(_capped(chunks, max_bytes)):
+        parser.feed(chunk)
+    return message_text(parser.close())
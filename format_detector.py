@@ -1,81 +1,566 @@
+import codecs
+import io
 import os
 import json
 import re
-from typing import Tuple, Dict, Any
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Tuple, Dict, Any, Optional, Union, BinaryIO, Iterable, Iterator, List, Callable
 from PyPDF2 import PdfReader
+from email_parser import EML_CHUNK_SIZE, is_raw_message, parse_eml
+from invoice_extractor import extract_invoice
+from metrics import current_profile
+from policy_scanner import get_policy_scanner
 
-def detect_format(input_path: str) -> str:
-  
-    ext = os.path.splitext(input_path)[1].lower()
-    if ext == '.json':
+# A document can be given as a path, raw bytes / memoryview, or a binary file-like object
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+SNIFF_BYTES = 2048
+
+# Fields whose value is the text to classify for a JSON event; otherwise the whole document is used
+JSON_BODY_KEYS = ['body', 'text', 'content', 'message']
+# Extensions of newline-delimited JSON event files
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+JSON_CHUNK_SIZE = 64 * 1024
+# Largest single event (in characters) buffered while streaming; longer NDJSON lines become malformed events
+JSON_MAX_EVENT_CHARS = int(os.environ.get("JSON_MAX_EVENT_CHARS", 16 * 1024 * 1024))
+# Characters of a malformed event kept as its raw text
+MALFORMED_EVENT_CHARS = 200
+
+# Per-document PDF budgets (0 = unlimited): stop extracting after this many pages / bytes of text
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "0"))
+PDF_MAX_BYTES = int(os.environ.get("PDF_MAX_BYTES", "0"))
+# Worker processes for page-parallel extraction (1 = extract lazily in-process)
+PDF_PAGE_WORKERS = int(os.environ.get("PDF_PAGE_WORKERS", "1"))
+# Documents with fewer pages than this are never fanned out, and pages go to workers in chunks of this size
+PDF_PAGES_PER_TASK = 8
+# Parsed documents each page worker keeps for the later chunks of the same document
+PDF_WORKER_READERS = 2
+
+# Leading bytes of binary containers the pipeline has no agent for (zip/OOXML, gzip, images, ...)
+BINARY_MAGIC = (b'PK\x03\x04', b'PK\x05\x06', b'\x1f\x8b', b'\x89PNG', b'\xff\xd8\xff', b'GIF8',
+                b'Rar!', b'7z\xbc\xaf', b'\xd0\xcf\x11\xe0')
+# Header lines of an RFC 822 message or of a simple hand-written email
+HEADER_LINE_RE = re.compile(rb'^[A-Za-z][A-Za-z0-9-]*:[ \t]')
+JSON_STRING_RE = re.compile(r'"(?:[^"\\\x00-\x1f]|\\.)*"')
+JSON_OPEN_STRING_RE = re.compile(r'"(?:[^"\\\x00-\x1f]|\\.)*\\?\Z')
+JSON_NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+JSON_NUMBER_PREFIX_RE = re.compile(r'-?(?:0|[1-9]\d*)?(?:\.\d*)?(?:[eE][+-]?\d*)?\Z')
+JSON_WHITESPACE_RE = re.compile(r'[ \t\r\n]*')
+JSON_LITERALS = ('true', 'false', 'null')
+# How much of a '{' / '[' head is tokenized; a valid prefix this long is JSON in practice
+JSON_SNIFF_BYTES = 256
+
+_page_pool = None
+# In page workers: (path, size, mtime) -> PdfReader, most recently used last
+_worker_readers: 'OrderedDict[tuple, PdfReader]' = OrderedDict()
+
+class UnsupportedFormatError(ValueError):
+    """The document is a binary container (zip, gzip, image, ...) that no agent can handle."""
+
+def _is_path(source: Source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+def _head(source: Source, size: int = SNIFF_BYTES) -> bytes:
+    """First `size` bytes of the document; file-like sources are rewound afterwards."""
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    pos = source.tell()
+    start = source.read(size)
+    source.seek(pos)
+    return start
+
+def _read_bytes(source: Source) -> bytes:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    data = source.read()
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+def detect_format(source: Source, name: Optional[str] = None) -> str:
+    """
+    Detect 'JSON', 'PDF' or 'Email' from the file extension (of the path, or of `name`
+    for in-memory sources), falling back to sniffing the first bytes.
+    """
+    ext = os.path.splitext(os.fspath(source) if _is_path(source) else (name or ''))[1].lower()
+    if ext == '.json' or ext in NDJSON_EXTENSIONS:
         return 'JSON'
     elif ext == '.pdf':
         return 'PDF'
     elif ext in ['.txt', '.eml']:
         return 'Email'
     else:
-        # Try to infer from content
-        with open(input_path, 'rb') as f:
-            start = f.read(2048)
-            if b'%PDF' in start:
-                return 'PDF'
-            try:
-                json.loads(start.decode(errors='ignore'))
-                return 'JSON'
-            except Exception:
-                return 'Email'
-
-def extract_text(input_path: str, fmt: str) -> str:
-   
+        # Infer from the first bytes without parsing the document
+        return sniff_format(_head(source))
+
+def sniff_format(head: bytes) -> str:
+    """
+    Classify a document from its first bytes: 'PDF' for a %PDF- header in the first 1 KB,
+    'Binary' for zip/gzip/image/OLE magic numbers or NUL bytes, 'Email' for RFC 822 header
+    lines, 'JSON' when the text starts with '{' or '[' and tokenizes as a valid JSON prefix
+    (so truncated heads of large documents still count; NDJSON lines count too), and 'Email'
+    for any other text.
+    """
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+    if b'%PDF-' in head[:1024]:
+        return 'PDF'
+    if head.startswith(BINARY_MAGIC) or b'\x00' in head:
+        return 'Binary'
+    text = head.lstrip()
+    if HEADER_LINE_RE.match(text):
+        return 'Email'
+    if text[:1] in (b'{', b'[') and json_prefix_ok(text[:JSON_SNIFF_BYTES].decode('utf-8', errors='replace')):
+        return 'JSON'
+    return 'Email'
+
+def json_prefix_ok(text: str) -> bool:
+    """
+    True when `text` is a valid JSON document (or NDJSON lines) or a truncation of one;
+    scans tokens, never builds values.
+    """
+    stack: List[str] = []
+    expect = 'value'
+    pos, n = 0, len(text)
+    while True:
+        start = pos
+        pos = JSON_WHITESPACE_RE.match(text, pos).end()
+        if pos == n:
+            return True
+        ch = text[pos]
+        if expect == 'after' and not stack:
+            # Another top-level value is only allowed on a new line (NDJSON)
+            if '\n' not in text[start:pos]:
+                return False
+            expect = 'value'
+        if expect == 'after':
+            if ch == ',':
+                expect = 'key' if stack[-1] == '}' else 'value'
+            elif ch == stack[-1]:
+                stack.pop()
+            else:
+                return False
+            pos += 1
+        elif expect == 'colon':
+            if ch != ':':
+                return False
+            expect = 'value'
+            pos += 1
+        elif ch == '"':
+            match = JSON_STRING_RE.match(text, pos)
+            if not match:
+                return JSON_OPEN_STRING_RE.match(text, pos) is not None
+            pos = match.end()
+            expect = 'colon' if expect in ('key', 'key_or_close') else 'after'
+        elif expect in ('key', 'key_or_close'):
+            if ch == '}' and expect == 'key_or_close':
+                stack.pop()
+                expect = 'after'
+                pos += 1
+            else:
+                return False
+        elif ch == ']' and expect == 'value_or_close':
+            stack.pop()
+            expect = 'after'
+            pos += 1
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            expect = 'key_or_close' if ch == '{' else 'value_or_close'
+            pos += 1
+        elif ch == '-' or ch.isdigit():
+            if JSON_NUMBER_PREFIX_RE.match(text, pos):
+                # A number cut off by the end of the head (e.g. '-0.' or '1e')
+                return True
+            match = JSON_NUMBER_RE.match(text, pos)
+            if not match:
+                return False
+            pos = match.end()
+            expect = 'after'
+        else:
+            literal = next((word for word in JSON_LITERALS if text.startswith(word, pos)), None)
+            if literal is None:
+                # A literal cut off by the end of the head is still a valid prefix
+                return any(word.startswith(text[pos:]) for word in JSON_LITERALS)
+            pos += len(literal)
+            expect = 'after'
+
+def extract_text(source: Source, fmt: str) -> str:
+    """Extract the text of a document given as a path, bytes/memoryview or binary file-like object."""
     if fmt == 'JSON':
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-       
-        for key in ['body', 'text', 'content', 'message']:
-            if key in data:
-                return str(data[key])
-        return json.dumps(data)
+        data, raw = load_json(source)
+        return json_text(data, raw)
     elif fmt == 'PDF':
-        reader = PdfReader(input_path)
-        text = "\n".join(page.extract_text() or '' for page in reader.pages)
-        return text
+        return "\n".join(iter_pdf_pages(source))
     else:  
-        with open(input_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        if is_raw_message(_head(source)):
+            # Raw .eml: parse headers and the text body only, streaming the message in chunks
+            if _is_path(source):
+                with open(source, 'rb') as f:
+                    return parse_eml(_iter_chunks(f))
+            return parse_eml(_iter_chunks(source))
+        if _is_path(source):
+            with open(source, 'r', encoding='utf-8') as f:
+                return f.read()
+        return _read_bytes(source).decode('utf-8')
 
-def validate_json_schema(data: Dict[str, Any], required_fields: Dict[str, type]) -> Tuple[bool, list]:
-  
-    anomalies = []
-    for field, ftype in required_fields.items():
-        if field not in data:
-            anomalies.append(f"Missing field: {field}")
-        elif not isinstance(data[field], ftype):
-            anomalies.append(f"Type error: {field} should be {ftype.__name__}, got {type(data[field]).__name__}")
-    return (len(anomalies) == 0, anomalies)
+def _iter_chunks(source: Source, size: int = EML_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield bytes/memoryview or binary file-like contents in chunks of `size`."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), size):
+            yield bytes(view[start:start + size])
+        return
+    while True:
+        chunk = source.read(size)
+        if not chunk:
+            return
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+def _extract_page_range(path: str, version: tuple, start: int, stop: int) -> List[str]:
+    """Page-pool task: a worker parses each document once and reuses the reader for its later chunks."""
+    key = (path, version)
+    reader = _worker_readers.get(key)
+    if reader is None:
+        reader = _worker_readers[key] = PdfReader(path)
+        while len(_worker_readers) > PDF_WORKER_READERS:
+            _worker_readers.popitem(last=False)
+    else:
+        _worker_readers.move_to_end(key)
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    global _page_pool
+    if _page_pool is None:
+        _page_pool = ProcessPoolExecutor(max_workers=workers)
+    return _page_pool
+
+def _parallel_pages(path: str, page_count: int, workers: int) -> Iterator[str]:
+    """
+    Extract page chunks in worker processes, keeping a bounded window in flight and yielding in order.
+    Tasks carry the file's path, not its bytes, so each worker reads the document once.
+    """
+    pool = _get_page_pool(workers)
+    stat = os.stat(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    ranges = iter([(start, min(start + PDF_PAGES_PER_TASK, page_count))
+                   for start in range(0, page_count, PDF_PAGES_PER_TASK)])
+    window = deque()
+    try:
+        for start, stop in ranges:
+            window.append(pool.submit(_extract_page_range, path, version, start, stop))
+            if len(window) >= workers * 2:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+    finally:
+        # The consumer stopped early: drop chunks nobody will read
+        for future in window:
+            future.cancel()
+
+def iter_pdf_pages(source: Source, max_pages: Optional[int] = None, max_bytes: Optional[int] = None,
+                   workers: Optional[int] = None) -> Iterator[str]:
+    """
+    Lazily yield the text of each PDF page, in order.
+    Stops after `max_pages` pages or once `max_bytes` of text were yielded (defaults:
+    PDF_MAX_PAGES / PDF_MAX_BYTES). With `workers` > 1, larger documents are extracted
+    in a process pool (in-memory documents are spooled to a temporary file for the workers).
+    Closing the generator early skips the remaining pages. The number of pages read is
+    recorded in the active document profile.
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    max_bytes = PDF_MAX_BYTES if max_bytes is None else max_bytes
+    workers = PDF_PAGE_WORKERS if workers is None else workers
+
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    reader = PdfReader(stream)
+    page_count = len(reader.pages)
+    if max_pages:
+        page_count = min(page_count, max_pages)
+
+    spooled = None
+    if workers > 1 and page_count >= PDF_PAGES_PER_TASK:
+        path = os.fspath(source) if _is_path(source) else None
+        if path is None:
+            if not isinstance(source, (bytes, bytearray, memoryview)):
+                source.seek(0)
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(source if isinstance(source, (bytes, bytearray, memoryview)) else _read_bytes(source))
+            path = spooled = f.name
+        pages = _parallel_pages(path, page_count, workers)
+    else:
+        pages = (reader.pages[i].extract_text() or '' for i in range(page_count))
+
+    extracted = 0
+    count = 0
+    try:
+        for text in pages:
+            count += 1
+            yield text
+            extracted += len(text.encode('utf-8'))
+            if max_bytes and extracted >= max_bytes:
+                break
+    finally:
+        pages.close()
+        if spooled:
+            os.remove(spooled)
+        profile = current_profile()
+        if profile is not None:
+            profile.pages = count
+
+def load_json(source: Source) -> Tuple[Any, str]:
+    """Parse a JSON document once; returns (data, raw text) so callers never re-serialize it."""
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            raw = f.read().decode('utf-8')
+    else:
+        raw = _read_bytes(source).decode('utf-8')
+    return json.loads(raw), raw
+
+def json_text(data: Any, raw: Optional[str] = None) -> str:
+    """Text to classify for a parsed JSON event: its body/text/content/message field, else the raw document."""
+    if isinstance(data, dict):
+        for key in JSON_BODY_KEYS:
+            if key in data:
+                return str(data[key])
+    return raw if raw is not None else json.dumps(data)
+
+def is_json_stream(source: Source, name: Optional[str] = None) -> bool:
+    """
+    True for NDJSON files (by extension) and JSON documents whose top level is an array of events.
+    Only documents detected as JSON qualify, so e.g. a .txt email starting with '[' stays an email.
+    """
+    if detect_format(source, name) != 'JSON':
+        return False
+    ext = os.path.splitext(os.fspath(source) if _is_path(source) else (name or ''))[1].lower()
+    if ext in NDJSON_EXTENSIONS:
+        return True
+    head = _head(source).lstrip()
+    return head.startswith(b'[') or (head.startswith(b'{') and _is_ndjson(head.decode('utf-8', errors='replace')))
+
+def _is_ndjson(text: str) -> bool:
+    """True when the first line is a complete JSON value and another one follows on the next line."""
+    first, _, rest = text.partition('\n')
+    try:
+        json.loads(first)
+    except ValueError:
+        return False
+    return rest.lstrip()[:1] in ('{', '[')
+
+def _iter_text_chunks(source: Source, size: int = JSON_CHUNK_SIZE) -> Iterator[str]:
+    """Decode a path, bytes or binary file-like source as UTF-8, `size` bytes at a time."""
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            yield from _iter_text_chunks(f, size)
+        return
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in _iter_chunks(source, size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+class MalformedEvent:
+    """Stands in for an NDJSON line that does not decode (or exceeds JSON_MAX_EVENT_CHARS)."""
+    def __init__(self, error: str):
+        self.error = error
+
+    def __repr__(self):
+        return f"MalformedEvent({self.error!r})"
+
+def _decode_line(line: str) -> Tuple[Any, str]:
+    try:
+        return json.loads(line), line.strip()
+    except ValueError as e:
+        return MalformedEvent(str(e)), line.strip()[:MALFORMED_EVENT_CHARS]
+
+def _iter_json_lines(chunks: Iterable[str]) -> Iterator[Tuple[Any, str]]:
+    """NDJSON events line by line; a line that does not decode yields a MalformedEvent and the stream goes on."""
+    pending: List[str] = []
+    size, head = 0, None  # `head` is set once the current line is too long and is being skipped
+    for chunk in chain(chunks, ['\n']):  # the final newline ends an unterminated last line
+        start = 0
+        while True:
+            newline = chunk.find('\n', start)
+            piece = chunk[start:] if newline < 0 else chunk[start:newline]
+            if head is None:
+                pending.append(piece)
+                size += len(piece)
+                if size > JSON_MAX_EVENT_CHARS:
+                    head = ''.join(pending)[:MALFORMED_EVENT_CHARS]
+                    pending = []
+            if newline < 0:
+                break
+            if head is not None:
+                yield MalformedEvent(f"Event exceeds {JSON_MAX_EVENT_CHARS} characters"), head
+            else:
+                line = ''.join(pending)
+                if line.strip():
+                    yield _decode_line(line)
+            pending, size, head = [], 0, None
+            start = newline + 1
+
+def iter_json_events(source: Source, name: Optional[str] = None) -> Iterator[Tuple[Any, str]]:
+    """
+    Yield (event, raw event text) for each element of a top-level JSON array, or for each line
+    of an NDJSON file (by extension, or when the text does not start with '['), reading the
+    source in chunks so the whole file is never held in memory. NDJSON lines are decoded one by
+    one: a malformed line yields a MalformedEvent and the following lines are still read. A
+    malformed array raises ValueError, as does an element longer than JSON_MAX_EVENT_CHARS.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    chunks = _iter_text_chunks(source)
+    ext = os.path.splitext(os.fspath(source) if _is_path(source) else (name or ''))[1].lower()
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if ext in NDJSON_EXTENSIONS or buffer[pos:pos + 1] != '[':
+        yield from _iter_json_lines(chain([buffer[pos:]], chunks))
+        return
+    pos += 1
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buffer) or buffer[pos] == ']':
+            return
+        try:
+            event, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            if len(buffer) - pos > JSON_MAX_EVENT_CHARS:
+                raise ValueError(f"JSON array element exceeds {JSON_MAX_EVENT_CHARS} characters")
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A value ending exactly at the chunk boundary may continue in the next chunk (e.g. a number)
+            fill()
+            continue
+        yield event, buffer[pos:end]
+        pos = end
+
+class optional:
+    """Marks a schema field as optional: validated when present, no anomaly when missing."""
+    def __init__(self, spec: Any):
+        self.spec = spec
+
+def _type_names(ftype) -> str:
+    return ' or '.join(t.__name__ for t in ftype) if isinstance(ftype, tuple) else ftype.__name__
+
+def _compile_spec(spec: Any) -> Callable[[Any, str, list], None]:
+    """Turn a field spec (a type, tuple of types, nested schema dict or [item spec]) into a checker."""
+    if isinstance(spec, dict):
+        fields = [(name, isinstance(field_spec, optional),
+                   _compile_spec(field_spec.spec if isinstance(field_spec, optional) else field_spec))
+                  for name, field_spec in spec.items()]
+
+        def check_object(value, path, anomalies):
+            if not isinstance(value, dict):
+                anomalies.append(f"Type error: {path or 'document'} should be dict, got {type(value).__name__}")
+                return
+            for name, is_optional, check in fields:
+                field_path = f"{path}.{name}" if path else name
+                if name in value:
+                    check(value[name], field_path, anomalies)
+                elif not is_optional:
+                    anomalies.append(f"Missing field: {field_path}")
+        return check_object
+    if isinstance(spec, list):
+        check_item = _compile_spec(spec[0])
+
+        def check_list(value, path, anomalies):
+            if not isinstance(value, list):
+                anomalies.append(f"Type error: {path} should be list, got {type(value).__name__}")
+                return
+            for i, item in enumerate(value):
+                check_item(item, f"{path}[{i}]", anomalies)
+        return check_list
+    names = _type_names(spec)
+
+    def check_type(value, path, anomalies):
+        if not isinstance(value, spec):
+            anomalies.append(f"Type error: {path} should be {names}, got {type(value).__name__}")
+    return check_type
+
+def compile_json_schema(schema: Dict[str, Any]) -> Callable[[Any], Tuple[bool, list]]:
+    """
+    Compile a schema once into a reusable validator returning (is_valid, anomalies).
+    Values are types (or tuples of types), nested schema dicts, [item spec] lists, or optional(spec).
+    """
+    check = _compile_spec(schema)
+
+    def validate(data: Any) -> Tuple[bool, list]:
+        anomalies: list = []
+        check(data, '', anomalies)
+        return (len(anomalies) == 0, anomalies)
+    return validate
+
+# Compiled validators of the most recently used schema objects; callers validating against
+# many different schemas should keep the result of compile_json_schema instead
+JSON_SCHEMA_CACHE_SIZE = 32
+_compiled_schemas: 'OrderedDict[int, Tuple[Dict[str, Any], Callable]]' = OrderedDict()
+_compiled_schemas_lock = threading.Lock()
+
+def validate_json_schema(data: Dict[str, Any], required_fields: Dict[str, Any]) -> Tuple[bool, list]:
+    """Validate `data` against a schema; the compiled validator is cached per schema object (LRU)."""
+    key = id(required_fields)
+    with _compiled_schemas_lock:
+        cached = _compiled_schemas.get(key)
+        if cached is None or cached[0] is not required_fields:
+            cached = (required_fields, compile_json_schema(required_fields))
+            _compiled_schemas[key] = cached
+            if len(_compiled_schemas) > JSON_SCHEMA_CACHE_SIZE:
+                _compiled_schemas.popitem(last=False)
+        _compiled_schemas.move_to_end(key)
+    return cached[1](data)
 
 def log_json_alert(anomalies: list, data: Dict[str, Any]):
    
     print(f"[ALERT] JSON Anomalies Detected: {anomalies}\nData: {json.dumps(data)[:200]}")
 
-def extract_pdf_invoice_fields(text: str) -> Dict[str, Any]:
-   
-    # Simple regex for total (customize for real invoices)
-    total_match = re.search(r'Total\s*[:\-]?\s*\$?([\d,]+\.?\d*)', text, re.IGNORECASE)
-    total = float(total_match.group(1).replace(',', '')) if total_match else None
-    # Extract line items (very basic: lines with qty, desc, price)
-    line_items = re.findall(r'^(\d+)\s+([\w\s]+)\s+\$?([\d,]+\.?\d*)$', text, re.MULTILINE)
-    items = [{'qty': int(q), 'desc': d.strip(), 'price': float(p.replace(',', ''))} for q, d, p in line_items]
-    return {'total': total, 'line_items': items}
-
-def extract_pdf_policy_mentions(text: str) -> list:
-   
-    keywords = ['GDPR', 'FDA', 'HIPAA', 'SOX', 'PCI']
-    mentions = [kw for kw in keywords if re.search(rf'\b{kw}\b', text, re.IGNORECASE)]
-    return mentions
+def extract_pdf_invoice_fields(text: Union[str, Iterable[str]], include_line_items: bool = True) -> Dict[str, Any]:
+    """
+    Extract the invoice total and line items from the full text or from an iterable of pages.
+    Pages are consumed one at a time; without line items, reading stops once the grand total is found.
+    """
+    return extract_invoice(text, include_line_items)
+
+def extract_pdf_policy_mentions(text: Union[str, Iterable[str]]) -> list:
+    """
+    Policy keywords mentioned in the full text or an iterable of pages, in keyword config order.
+    Reading stops as soon as every keyword has been seen.
+    """
+    return get_policy_scanner().scan(text, stop_when_complete=True)['mentions']
+
+def scan_pdf_policy_mentions(text: Union[str, Iterable[str]]) -> Dict[str, Any]:
+    """All policy mentions in one pass: {'mentions': [...], 'counts': {term: n}, 'offsets': {term: [(page, offset)]}}."""
+    return get_policy_scanner().scan(text)
+
+# Invoice totals above this are flagged by the PDF agent and routed to /risk_alert
+INVOICE_TOTAL_LIMIT = 10000
 
 def flag_pdf_alerts(pdf_fields: Dict[str, Any], policy_mentions: list):
   
-    if pdf_fields.get('total') and pdf_fields['total'] > 10000:
+    if pdf_fields.get('total') and pdf_fields['total'] > INVOICE_TOTAL_LIMIT:
         print(f"[ALERT] Invoice total exceeds 10,000: {pdf_fields['total']}")
     if policy_mentions:
         print(f"[ALERT] Policy mentions detected: {policy_mentions}")
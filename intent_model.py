@@ -0,0 +1,146 @@
+"""
+Optional scikit-learn intent model: a HashingVectorizer feeding a linear classifier.
+Trained from FEW_SHOT_EXAMPLES plus labeled history in shared memory, persisted
+with joblib and loaded lazily (memory-mapped) the first time it is needed.
+
+    python intent_model.py --train
+"""
+import os
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from classifier import FEW_SHOT_EXAMPLES
+
+MODEL_FILE = os.environ.get("INTENT_MODEL_FILE", "intent_model.joblib")
+
+# Extracted fields that carry labels or scores rather than document text
+_NON_TEXT_FIELDS = {'intent', 'confidence', 'urgency', 'tone', 'sender'}
+
+_model = None
+_model_loaded = False
+_model_version = 'none'
+_model_lock = threading.Lock()
+
+
+def history_examples(results: Optional[Iterable[dict]] = None) -> List[Tuple[str, str]]:
+    """
+    Build (text, intent) pairs from logged results that carry an intent label.
+    Only the extracted text fields are stored in memory, so those stand in for the document.
+    """
+    from shared_memory import entry_intent, iter_results
+    if results is None:
+        results = (entry for _, entry in iter_results())
+    examples = []
+    for entry in results:
+        intent = entry_intent(entry)
+        if not intent or intent == 'Unknown':
+            continue
+        extracted = entry.get('extracted')
+        if isinstance(extracted, str):  # a scalar JSON document
+            text = extracted
+        elif isinstance(extracted, dict):
+            text = ' '.join(str(v) for k, v in extracted.items() if k not in _NON_TEXT_FIELDS and isinstance(v, str))
+        else:  # a JSON array or number: no text fields to learn from
+            continue
+        if text.strip():
+            examples.append((text, intent))
+    return examples
+
+
+class IntentModel:
+    """HashingVectorizer + logistic regression; the vectorizer is stateless so only the weights are stored."""
+
+    def __init__(self, vectorizer, estimator):
+        self.vectorizer = vectorizer
+        self.estimator = estimator
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]]) -> 'IntentModel':
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        texts, labels = zip(*examples)
+        vectorizer = HashingVectorizer(n_features=2 ** 18, ngram_range=(1, 2), alternate_sign=False, lowercase=True)
+        estimator = LogisticRegression(max_iter=1000, C=10.0)
+        estimator.fit(vectorizer.transform(texts), labels)
+        return cls(vectorizer, estimator)
+
+    def predict_many(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Vectorize and score the whole batch with a single predict_proba call."""
+        if not texts:
+            return []
+        probabilities = self.estimator.predict_proba(self.vectorizer.transform(texts))
+        best = probabilities.argmax(axis=1)
+        classes = self.estimator.classes_
+        return [(str(classes[i]), float(probabilities[row, i])) for row, i in enumerate(best)]
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        return self.predict_many([text])[0]
+
+
+def train_model(extra_examples: Optional[List[Tuple[str, str]]] = None, include_history: bool = True) -> IntentModel:
+    examples = list(FEW_SHOT_EXAMPLES)
+    if include_history:
+        examples.extend(history_examples())
+    if extra_examples:
+        examples.extend(extra_examples)
+    return IntentModel.train(examples)
+
+
+def save_model(model: IntentModel, path: str = MODEL_FILE):
+    import joblib
+    joblib.dump(model, path)
+
+
+def load_model(path: str = MODEL_FILE) -> Optional[IntentModel]:
+    """Load a persisted model; returns None when scikit-learn or the model file is missing."""
+    if not os.path.exists(path):
+        return None
+    try:
+        import joblib
+    except ImportError:
+        return None
+    return joblib.load(path, mmap_mode='r')
+
+
+def get_model() -> Optional[IntentModel]:
+    """Process-wide model, loaded on first use."""
+    global _model, _model_loaded, _model_version
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                # Stat before loading: a file replaced mid-load gets the older version and is missed, never mislabelled
+                version = file_version(MODEL_FILE)
+                _model = load_model()
+                _model_version = version if _model is not None else 'none'
+                _model_loaded = True
+    return _model
+
+
+def file_version(path: str) -> str:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 'none'
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def model_version() -> str:
+    """Identifies the model get_model() serves (its file's size and mtime when loaded), or 'none'."""
+    get_model()
+    return _model_version
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the optional ML intent classifier")
+    parser.add_argument('--train', action='store_true', help='Train from few-shot examples and shared memory history')
+    parser.add_argument('--no_history', action='store_true', help='Ignore labeled history in shared memory')
+    parser.add_argument('--output', type=str, default=MODEL_FILE, help='Where to write the model')
+    args = parser.parse_args()
+    if args.train:
+        # Go through the module so the pickled class is intent_model.IntentModel, not __main__.IntentModel
+        import intent_model
+        model = intent_model.train_model(include_history=not args.no_history)
+        intent_model.save_model(model, args.output)
+        print(f"Intent model with classes {list(model.estimator.classes_)} saved to {args.output}")
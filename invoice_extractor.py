@@ -0,0 +1,186 @@
+"""
+Line-oriented invoice extraction: each line of extracted PDF text is tokenized once by a
+regex without nested or overlapping quantifiers, so the cost is linear in the text however
+long or whitespace-heavy its lines are. Line items are `qty description ... amount` rows;
+summary rows (subtotal, tax, total, amount due) are told apart by their label words and the
+invoice total is resolved across all pages of a multi-page table.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Numbers (with any mix of thousands/decimal separators), words, percent signs and currency symbols;
+# every alternative is a single character-class run, so matching never backtracks
+TOKEN_RE = re.compile(r"(?P<num>\d[\d,.'/]*)|(?P<word>[^\W\d_]+)|(?P<pct>%)|(?P<cur>[$\u00a3\u00a5\u20ac\u20b9])")
+# Lines that can hold a summary amount; anything else that does not start with a quantity is skipped
+SUMMARY_HINT_RE = re.compile(r'total|tax|vat|gst|hst|due|payable', re.IGNORECASE)
+
+CURRENCY_CODES = frozenset({'usd', 'eur', 'gbp', 'jpy', 'inr', 'cad', 'aud', 'chf'})
+TAX_WORDS = frozenset({'tax', 'vat', 'gst', 'hst', 'pst'})
+# Labels naming a reference number or date rather than an amount ("Tax ID", "Due date", ...)
+REFERENCE_WORDS = frozenset({'id', 'no', 'number', 'reg', 'registration', 'date', 'code'})
+# Per-page running totals of a multi-page table
+PAGE_WORDS = frozenset({'page', 'carried', 'brought', 'forward'})
+SUBTOTAL_QUALIFIERS = frozenset({'net', 'excl', 'excluding', 'before'})
+INCLUSIVE_WORDS = frozenset({'incl', 'including', 'inc'})
+GRAND_TOTAL_WORDS = frozenset({'grand', 'due', 'payable', 'balance'})
+# Prose comparing an amount with a threshold ("Invoice total > 10,000", "totals over 50,000") is not a summary row
+COMPARISON_WORDS = frozenset({'exceeds', 'exceed', 'exceeding', 'over', 'above', 'under', 'below', 'than',
+                              'least', 'most', 'limit', 'threshold', 'maximum', 'minimum', 'max', 'min'})
+COMPARISON_CHARS = frozenset('<>\u2264\u2265')
+
+# Longer digit runs are reference numbers, not amounts
+MAX_AMOUNT_CHARS = 20
+MAX_QTY_DIGITS = 6
+
+
+def parse_amount(token: str) -> Optional[float]:
+    """
+    Parse a number token such as '1,234.50', '1.234,50', "1'234.50" or '12,50'. With both
+    separators present the last one is the decimal point; a lone ',' is decimal only when
+    followed by one or two digits. Dates ('01/05/2024') and over-long runs are not amounts.
+    """
+    token = token.rstrip(",.'")
+    if '/' in token or len(token) > MAX_AMOUNT_CHARS:
+        return None
+    last_sep = max(token.rfind(','), token.rfind('.'))
+    if last_sep < 0:
+        return float(token.replace("'", ''))
+    digits = len(token) - last_sep - 1
+    if (',' in token and '.' in token) or \
+            (token[last_sep] == '.' and token.count('.') == 1) or \
+            (token[last_sep] == ',' and token.count(',') == 1 and digits in (1, 2)):
+        whole, fraction = token[:last_sep], token[last_sep + 1:]
+    else:
+        whole, fraction = token, ''
+    whole = whole.replace(',', '').replace('.', '').replace("'", '')
+    try:
+        return float(f"{whole}.{fraction}" if fraction else whole)
+    except ValueError:
+        return None
+
+
+def _summary_kind(words: List[str]) -> Optional[Tuple[str, int]]:
+    """Classify a summary label as ('subtotal' | 'tax' | 'total', rank), or None for other lines."""
+    labels = set(words)
+    if labels & REFERENCE_WORDS or labels & PAGE_WORDS or labels & COMPARISON_WORDS:
+        return None
+    has_total = 'total' in labels or 'totals' in labels
+    if 'subtotal' in labels or (has_total and ('sub' in labels or labels & SUBTOTAL_QUALIFIERS)):
+        return 'subtotal', 0
+    if labels & TAX_WORDS and not labels & INCLUSIVE_WORDS:
+        return 'tax', 0
+    if has_total or ('due' in labels and labels & {'amount', 'balance', 'now'}) or \
+            ('payable' in labels and 'amount' in labels):
+        return 'total', 2 if labels & GRAND_TOTAL_WORDS else 1
+    return None
+
+
+def _tokens(line: str) -> List[Tuple[str, str, int, int]]:
+    return [(match.lastgroup, match.group(), match.start(), match.end()) for match in TOKEN_RE.finditer(line)]
+
+
+def _line_item(line: str, tokens: List[Tuple[str, str, int, int]]) -> Optional[Dict[str, Any]]:
+    """`qty description [unit price] amount`: a leading integer, some words and a trailing amount."""
+    kind, qty, _, qty_end = tokens[0]
+    if kind != 'num' or not qty.isdigit() or len(qty) > MAX_QTY_DIGITS or len(tokens) < 3:
+        return None
+    # The trailing amount column: amounts and currency markers at the end of the line
+    trail = len(tokens)
+    while trail > 1 and (tokens[trail - 1][0] in ('num', 'cur') or
+                         (tokens[trail - 1][0] == 'word' and tokens[trail - 1][1].lower() in CURRENCY_CODES)):
+        trail -= 1
+    amounts = [token for token in tokens[trail:] if token[0] == 'num']
+    if trail == len(tokens) or not amounts or not any(token[0] == 'word' for token in tokens[1:trail]):
+        return None
+    price = parse_amount(amounts[-1][1])
+    desc = line[qty_end:tokens[trail][2]].strip(' \t-:|')
+    if price is None or not desc:
+        return None
+    return {'qty': int(qty), 'desc': desc, 'price': price}
+
+
+def _summary(line: str, tokens: List[Tuple[str, str, int, int]]) -> Optional[Tuple[str, int, float]]:
+    """
+    The first labelled amount on a line: (kind, rank, amount); percentages are skipped, and so are
+    amounts compared with their label (a comparison operator or word in between).
+    """
+    words: List[str] = []
+    label_end = 0
+    for i, (kind, text, start, end) in enumerate(tokens):
+        if kind == 'word':
+            words.append(text.lower())
+            label_end = end
+        elif kind == 'num':
+            if i + 1 < len(tokens) and tokens[i + 1][0] == 'pct':
+                continue
+            if COMPARISON_CHARS.intersection(line[label_end:start]):
+                return None
+            summary = _summary_kind(words)
+            amount = parse_amount(text)
+            if summary and amount is not None:
+                return summary[0], summary[1], amount
+            words = []
+    return None
+
+
+class InvoiceExtraction:
+    """Accumulates line items and summary amounts over the pages of one invoice."""
+
+    def __init__(self, include_line_items: bool = True):
+        self.include_line_items = include_line_items
+        self.line_items: List[Dict[str, Any]] = []
+        self.subtotal: Optional[float] = None
+        self.taxes: List[float] = []
+        # Best total so far as (rank, amount); a later total of the same rank wins
+        self.best_total: Optional[Tuple[int, float]] = None
+
+    def feed(self, page: str):
+        for line in page.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            leading_qty = line[0].isdigit()
+            if not leading_qty and not SUMMARY_HINT_RE.search(line):
+                continue
+            tokens = _tokens(line)
+            if leading_qty:
+                item = _line_item(line, tokens)
+                if item is not None:
+                    if self.include_line_items:
+                        self.line_items.append(item)
+                    continue
+            summary = _summary(line, tokens)
+            if summary is None:
+                continue
+            kind, rank, amount = summary
+            if kind == 'subtotal':
+                self.subtotal = amount
+            elif kind == 'tax':
+                self.taxes.append(amount)
+            elif self.best_total is None or rank >= self.best_total[0]:
+                self.best_total = (rank, amount)
+
+    @property
+    def total(self) -> Optional[float]:
+        """The highest-ranked (grand total / amount due over plain total) last total, else subtotal plus tax."""
+        if self.best_total is not None:
+            return self.best_total[1]
+        if self.subtotal is not None:
+            return round(self.subtotal + sum(self.taxes), 2)
+        return None
+
+    def result(self) -> Dict[str, Any]:
+        return {'total': self.total, 'line_items': self.line_items}
+
+
+def extract_invoice(text: Union[str, Iterable[str]], include_line_items: bool = True) -> Dict[str, Any]:
+    """
+    Invoice total and line items from the full text or an iterable of pages. Without line items,
+    reading stops after the page holding a grand total or amount due.
+    """
+    extraction = InvoiceExtraction(include_line_items)
+    for page in ([text] if isinstance(text, str) else text):
+        extraction.feed(page)
+        if not include_line_items and extraction.best_total and extraction.best_total[0] == 2:
+            break
+    return extraction.result()
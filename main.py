@@ -1,164 +1,230 @@
 import argparse
+import glob
 import os
-import shutil
-from format_detector import detect_format, extract_text
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from action_dispatcher import DISPATCH_TIMEOUT, get_dispatcher
+from action_router import route_action
+from format_detector import is_json_stream, log_json_alert
+from metrics import registry
+from pipeline import process_document, process_json_stream, record_metrics, record_rollups, store_upload
+from shared_memory import get_latest, log_agent_results
+
+# Number of results buffered before they are written to shared memory in batch mode
+BATCH_WRITE_SIZE = 500
 
 def upload_and_run(source_file_path):
-    
-    uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-    dest_file = os.path.join(uploads_dir, os.path.basename(source_file_path))
-    shutil.copy2(source_file_path, dest_file)
+    """Store a copy of the file in uploads/ under its content hash, then run the pipeline on it."""
+    with open(source_file_path, 'rb') as f:
+        data = f.read()
+    dest_file = store_upload(data, os.path.basename(source_file_path), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
     print(f"File uploaded to: {dest_file}")
 
+    main_pipeline(['--input_file', dest_file])
 
-    import sys
-    sys.argv = [sys.argv[0], '--input_file', dest_file]
+def process_path(path):
+    """Batch worker entry point: classify one file without logging or routing it."""
+    result = process_document(path, log=False, route=False, record=False)
+    result.details = {}
+    return result
+
+def _safe_process_path(path):
+    try:
+        return path, process_path(path), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+def report_dispatch():
+    """Wait (bounded) for queued actions to be delivered and print the dispatcher metrics."""
+    dispatcher = get_dispatcher()
+    if dispatcher is None:
+        return
+    if not dispatcher.flush(timeout=DISPATCH_TIMEOUT):
+        print(f"Action dispatch: still delivering after {DISPATCH_TIMEOUT}s")
+    print(f"Action dispatch: {dispatcher.metrics()}")
+
+def log_results(results):
+    """Write routed Results to shared memory and the rollups in one batch."""
+    log_agent_results([result.memory_entry() for result in results])
+    record_rollups(results)
+
+def collect_batch_inputs(input_dir, pattern='*'):
+    """Files under input_dir matching pattern ('**' recurses), in a stable order."""
+    paths = glob.glob(os.path.join(input_dir, pattern), recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p))
+
+def run_batch(input_dir, pattern='*', workers=None, chunksize=16):
+    """
+    Batch mode: fan the matching files out to a process pool, route their actions
+    and write the results to shared memory in bulk. NDJSON files and JSON arrays are
+    streamed event by event in this process meanwhile. Returns throughput stats.
+    """
+    paths = collect_batch_inputs(input_dir, pattern)
+    print(f"Batch: {len(paths)} files from {input_dir} matching '{pattern}'")
+    streams = [path for path in paths if is_json_stream(path)]
+    stream_set = set(streams)
+    documents = [path for path in paths if path not in stream_set]
+    formats = Counter()
+    cache_hits = 0
+    failures = []
+    pending = []
+    routed = 0
+    events = 0
+    streamed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        outcomes = executor.map(_safe_process_path, documents, chunksize=chunksize)
+        for path in streams:
+            # process_json_stream routes and logs its events itself
+            try:
+                for result in process_json_stream(path):
+                    events += 1
+                    routed += len(result.triggered)
+            except Exception as e:
+                failures.append((path, f"{type(e).__name__}: {e}"))
+                continue
+            formats['JSON'] += 1
+            streamed += 1
+        for path, result, error in outcomes:
+            if error:
+                failures.append((path, error))
+                continue
+            formats[result.format] += 1
+            cache_hits += result.cache_hit is not None
+            # Worker processes have their own metrics; record each document's profile here
+            record_metrics(result)
+            result.triggered = route_action(result.routing_metadata, result.actions, verbose=False, event_id=result.event_id())
+            routed += len(result.triggered)
+            pending.append(result)
+            if len(pending) >= BATCH_WRITE_SIZE:
+                log_results(pending)
+                pending = []
+    log_results(pending)
+    elapsed = time.perf_counter() - start
 
-    main_pipeline()
+    processed = sum(formats.values())
+    stats = {
+        'files': len(paths),
+        'processed': processed,
+        'failed': len(failures),
+        'by_format': dict(formats),
+        'stream_events': events,
+        'routed_actions': routed,
+        'cache_hits': cache_hits,
+        'seconds': round(elapsed, 3),
+        'docs_per_sec': round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    print("\n=== BATCH SUMMARY ===")
+    for path, error in failures:
+        print(f"FAILED {path}: {error}")
+    print(f"Processed: {processed}/{len(paths)} files ({len(failures)} failed) in {elapsed:.2f}s")
+    print(f"Throughput: {stats['docs_per_sec']} docs/sec")
+    print(f"By format: {stats['by_format']}")
+    if streams:
+        print(f"Streamed JSON events: {events} from {len(streams)} files")
+    print(f"Routed actions: {routed}")
+    print(f"Result cache hits: {cache_hits}/{processed - streamed}")
+    report_dispatch()
+    print("=== END OF BATCH SUMMARY ===\n")
+    return stats
 
-def main_pipeline():
+def run_json_stream(path):
+    """Stream mode for NDJSON files and JSON arrays: validate, classify and route event by event."""
+    print(f"Streaming JSON events from {path}")
+    intents = Counter()
+    invalid = 0
+    routed = 0
+    start = time.perf_counter()
+    for result in process_json_stream(path):
+        intents[result.intent] += 1
+        invalid += not result.details['schema_valid']
+        routed += len(result.triggered)
+    elapsed = time.perf_counter() - start
+    events = sum(intents.values())
+    print("\n=== STREAM SUMMARY ===")
+    print(f"Events: {events} ({invalid} with anomalies) in {elapsed:.2f}s")
+    print(f"Throughput: {round(events / elapsed, 1) if elapsed > 0 else 0.0} events/sec")
+    print(f"By intent: {dict(intents)}")
+    print(f"Routed actions: {routed}")
+    report_dispatch()
+    print("=== END OF STREAM SUMMARY ===\n")
+    return {'events': events, 'invalid': invalid, 'by_intent': dict(intents), 'routed_actions': routed}
+
+def print_profile():
+    """--profile: time per pipeline stage, document sizes, page counts and cache outcomes."""
+    print("\n=== PROFILE ===")
+    stages = registry.summary()
+    print(f"{'Stage':<16} {'Count':>7} {'Total s':>9} {'Mean ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'Max ms':>8}")
+    for name, s in stages.items():
+        print(f"{name:<16} {s['count']:>7} {s['total']:>9.3f} {s['mean'] * 1000:>9.3f} {s['p50'] * 1000:>8.3f} "
+              f"{s['p99'] * 1000:>8.3f} {s['max'] * 1000:>8.3f}")
+    for fmt, s in registry.summary('classifier_document_seconds', 'format').items():
+        print(f"{fmt} documents: {s['count']}, mean {s['mean'] * 1000:.2f} ms, p99 {s['p99'] * 1000:.2f} ms")
+    for fmt, s in registry.summary('classifier_document_bytes', 'format').items():
+        print(f"{fmt} size: mean {s['mean'] / 1024:.1f} KiB, max {s['max'] / 1024:.1f} KiB")
+    for _, s in registry.summary('classifier_pdf_pages', 'format').items():
+        print(f"PDF pages: mean {s['mean']:.1f}, max {s['max']:.0f}")
+    cache = {dict(labels)['result']: int(count) for labels, count in registry.counters('classifier_cache_lookups_total').items()}
+    if cache:
+        print(f"Result cache lookups: {cache}")
+    print("=== END OF PROFILE ===\n")
+
+def main_pipeline(argv=None):
     parser = argparse.ArgumentParser(description="Multi-Format Classifier Agent")
     parser.add_argument('--input_file', type=str, required=False, help='Path to input file (Email, JSON, or PDF)')
     parser.add_argument('--email_text', type=str, required=False, help='Raw email text input (overrides input_file if provided)')
-    args = parser.parse_args()
+    parser.add_argument('--input_dir', type=str, required=False, help='Directory of inputs to classify in batch mode')
+    parser.add_argument('--glob', type=str, default='*', help="Pattern of files to pick up in --input_dir (use '**/*' to recurse)")
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for batch mode (default: CPU count)')
+    parser.add_argument('--profile', action='store_true', help='Print where the time went, per pipeline stage')
+    args = parser.parse_args(argv)
+
+    if args.input_dir and not args.email_text:
+        run_batch(args.input_dir, args.glob, args.workers)
+        if args.profile:
+            print_profile()
+        return
+
+    if not args.email_text and args.input_file and is_json_stream(args.input_file):
+        run_json_stream(args.input_file)
+        if args.profile:
+            print_profile()
+        return
 
     if args.email_text:
-        fmt = 'Email'
-        input_text = args.email_text
+        result = process_document(args.email_text.encode('utf-8'), fmt='Email')
     else:
-        fmt = detect_format(args.input_file)
-        print(f"Detected Format: {fmt}")
-        input_text = extract_text(args.input_file, fmt)
-
-    if fmt == 'Email':
-        from email_parser import parse_email, extract_email_fields, detect_tone, trigger_action
-        from shared_memory import log_agent_result
-        from classifier import classify_intent
-        parsed_text = parse_email(input_text)
-        email_fields = extract_email_fields(input_text)
-        tone = detect_tone(input_text)
-
-        # Use classifier to get intent and confidence
-        intent, confidence = classify_intent(parsed_text)
-        action_result = trigger_action(email_fields, tone)
-        print(f"Email Fields: {email_fields}")
-        print(f"Detected Tone: {tone}")
-        print(f"Detected Intent: {intent} (Confidence: {confidence:.2f})")
-        print(action_result)
-
-        # Log to shared memory
-        log_agent_result(
-            agent='EmailAgent',
-            input_meta={'source': args.input_file, 'timestamp': None, 'format': fmt},
-            extracted={**email_fields, 'tone': tone, 'intent': intent, 'confidence': confidence},
-            actions=[action_result],
-            trace=f"Fields: {email_fields}, Tone: {tone}, Intent: {intent}, Confidence: {confidence}, Action: {action_result}"
-        )
-
-        from action_router import route_action
-        from retry_utils import retry_action
-        routing_metadata = {
-            'format': fmt,
-            'intent': intent,
-            'confidence': confidence,
-            'file': os.path.basename(args.input_file) if args.input_file else 'user_input_email'
-        }
-        actions = [action_result]
-        # Retry logic for action router
-        triggered = retry_action(route_action, 3, 2, routing_metadata, actions)
-        if triggered:
-            print(f"Action Router triggered: {triggered}")
+        result = process_document(args.input_file)
+        print(f"Detected Format: {result.format}")
+
+    details = result.details
+    if result.format == 'Email':
+        print(f"Email Fields: {details['email_fields']}")
+        print(f"Detected Tone: {details['tone']}")
+        print(f"Detected Intent: {result.intent} (Confidence: {result.confidence:.2f})")
+        print(result.actions[0])
     else:
-        parsed_text = input_text
-        # JSON Agent logic
-        if fmt == 'JSON':
-            import json
-            from format_detector import validate_json_schema, log_json_alert
-            from shared_memory import log_agent_result
-            data = json.loads(input_text)
-
-            # Example required schema (customize as needed)
-            required_fields = {
-                'event': str,
-                'timestamp': str,
-                'payload': dict
-            }
-            is_valid, anomalies = validate_json_schema(data, required_fields)
-            actions = []
-            if not is_valid:
-                log_json_alert(anomalies, data)
-                actions.append(f"Alert: {anomalies}")
-            else:
+        # Alerts come from the agent's typed action records rather than re-checking thresholds here
+        for action in result.actions:
+            if action.kind == 'json_alert':
+                log_json_alert(action.data['anomalies'], details['data'])
+            elif action.kind == 'schema_valid':
                 print("JSON schema valid. No anomalies detected.")
-                actions.append("Schema valid")
-
-            # Log to shared memory
-            log_agent_result(
-                agent='JSONAgent',
-                input_meta={'source': args.input_file, 'timestamp': data.get('timestamp'), 'format': fmt},
-                extracted=data,
-                actions=actions,
-                trace=f"Anomalies: {anomalies}" if anomalies else "Schema valid"
-            )
-
-        # PDF Agent logic
-        elif fmt == 'PDF':
-            from format_detector import extract_pdf_invoice_fields, extract_pdf_policy_mentions, flag_pdf_alerts
-            from shared_memory import log_agent_result
-            pdf_fields = extract_pdf_invoice_fields(input_text)
-            policy_mentions = extract_pdf_policy_mentions(input_text)
-            flag_pdf_alerts(pdf_fields, policy_mentions)
-            actions = []
-            if pdf_fields.get('total') and pdf_fields['total'] > 10000:
-                actions.append(f"Invoice total exceeds 10,000: {pdf_fields['total']}")
-            if policy_mentions:
-                actions.append(f"Policy mentions: {policy_mentions}")
-
-            # Log to shared memory
-            log_agent_result(
-                agent='PDFAgent',
-                input_meta={'source': args.input_file, 'timestamp': None, 'format': fmt},
-                extracted={**pdf_fields, 'policy_mentions': policy_mentions},
-                actions=actions,
-                trace=f"Fields: {pdf_fields}, Policy: {policy_mentions}"
-            )
-
-    # Only run classifier for non-E2E Email path
-    if not (fmt == 'Email'):
-        from classifier import classify_intent
-        intent, confidence = classify_intent(parsed_text)
-        print(f"Detected Intent: {intent} (Confidence: {confidence:.2f})")
-        routing_metadata = {
-            'format': fmt,
-            'intent': intent,
-            'confidence': confidence,
-            'file': os.path.basename(args.input_file) if args.input_file else 'user_input_email'
-        }
-        print(f"Routing Metadata: {routing_metadata}")
-        from action_router import route_action
-        actions = []
-        if fmt == 'JSON':
-            actions = actions 
-        elif fmt == 'PDF':
-            actions = actions  
-        triggered = route_action(routing_metadata, actions)
-        if triggered:
-            print(f"Action Router triggered: {triggered}")
+            elif action.kind in ('risk_alert', 'compliance_flag'):
+                print(f"[ALERT] {action.message}")
+        print(f"Detected Intent: {result.intent} (Confidence: {result.confidence:.2f})")
+        print(f"Routing Metadata: {result.routing_metadata}")
+    if result.triggered:
+        print(f"Action Router triggered: {result.triggered}")
+    print(f"Result cache: {f'hit ({result.cache_hit})' if result.cache_hit else 'miss'}")
+    if args.profile:
+        print(f"Timings (ms): {result.profile['timings_ms']}")
+    report_dispatch()
 
     # --- Print summary from shared memory ---
-    from shared_memory import load_memory
-    memory = load_memory()
-
     # Find the latest entry for this input
-    input_id = args.input_file if args.input_file else 'user_input_email'
-    latest_entry = None
-    for entry in reversed(memory.get('results', [])):
-        entry_id = entry['input_meta'].get('source') or 'user_input_email'
-        if entry_id == input_id:
-            latest_entry = entry
-            break
+    latest_entry = get_latest(args.input_file)
     print("\n=== AGENT SUMMARY FOR THIS INPUT ===")
     if latest_entry:
         print(f"Timestamp: {latest_entry['timestamp']}")
@@ -168,7 +234,9 @@ def main_pipeline():
         if latest_entry['input_meta'].get('timestamp'):
             print(f"Input Timestamp: {latest_entry['input_meta'].get('timestamp')}")
         print("\n--- Extracted Fields ---")
-        for k, v in latest_entry['extracted'].items():
+        extracted = latest_entry['extracted']
+        # JSON documents log the document itself, which need not be an object
+        for k, v in (extracted.items() if isinstance(extracted, dict) else [('value', extracted)]):
 
             # Add extra explanation for key business intents
             if k.lower() == 'intent' and v in ['RFQ', 'Complaint', 'Invoice', 'Regulation', 'Fraud Risk']:
@@ -187,10 +255,14 @@ def main_pipeline():
             print(f"- {action}")
         print("\n--- Agent Trace ---")
         print(latest_entry['trace'])
+        if args.profile and latest_entry.get('profile'):
+            print(f"Timings (ms): {latest_entry['profile']['timings_ms']}")
         print("\n--- End of Entry ---")
     else:
         print("No summary found for this input.")
     print("\n=== END OF SUMMARY ===\n")
+    if args.profile:
+        print_profile()
 
 # Entry point logic
 if __name__ == "__main__":
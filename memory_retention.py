@@ -0,0 +1,212 @@
+"""
+Retention and compaction of the shared memory history. One run:
+  1. picks the results older than MEMORY_RETENTION_DAYS and the result cache records written
+     by an older pipeline, classifier or model; then, while the live results and cache records
+     exceed MEMORY_MAX_BYTES, the oldest cache records and after them the oldest results;
+  2. appends them to gzip-compressed monthly archive segments (memory_archive/results-YYYY-MM.jsonl.gz)
+     before anything is removed, so an interrupted run can only duplicate, never lose, results;
+  3. compacts the live store: archived results are dropped, trace texts shared by several
+     results are stored once, superseded result cache records are discarded and so are all
+     but the RESULT_CACHE_STORE_SIZE most recently written ones;
+  4. deletes archive segments older than MEMORY_ARCHIVE_MAX_AGE_DAYS.
+The rollups behind /stats are maintained as results are logged and are not touched, so
+they keep counting archived and deleted history.
+
+    python memory_retention.py --dry-run
+    python memory_retention.py --compact [--retention-days 7] [--max-bytes 50000000]
+    python memory_retention.py --rebuild-rollups
+"""
+import glob
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from pipeline import is_current_cache_key
+from rollups import Rollups, entry_row, get_rollups
+from shared_memory import get_backend
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+RETENTION_DAYS = int(os.environ.get("MEMORY_RETENTION_DAYS", 30))
+MAX_BYTES = int(os.environ.get("MEMORY_MAX_BYTES", 256 * 1024 * 1024))
+ARCHIVE_DIR = os.environ.get("MEMORY_ARCHIVE_DIR", "memory_archive")
+# Archive segments older than this are deleted; 0 keeps them forever
+ARCHIVE_MAX_AGE_DAYS = int(os.environ.get("MEMORY_ARCHIVE_MAX_AGE_DAYS", 365))
+
+
+def _segment(archive_dir: str, timestamp: Optional[str]) -> str:
+    month = timestamp[:7] if timestamp else 'undated'
+    return os.path.join(archive_dir, f"results-{month}.jsonl.gz")
+
+
+def plan_retention(backend, retention_days: int = RETENTION_DAYS, max_bytes: int = MAX_BYTES,
+                   now: Optional[datetime] = None) -> Tuple[Set[int], Set[str]]:
+    """
+    Positions of the results to archive and keys of the cache records to drop (see the module
+    docstring). Cache records go first when over the size limit: they can be recomputed.
+    """
+    cutoff = ((now or datetime.now()) - timedelta(days=retention_days)).isoformat() if retention_days > 0 else None
+    archive: Set[int] = set()
+    kept = []
+    live_bytes = 0
+    for pos, entry in backend.iter_results():
+        if cutoff and (entry.get('timestamp') or '') < cutoff:
+            archive.add(pos)
+            continue
+        size = len(json.dumps({'kind': 'results', 'entry': entry}, default=str)) + 1  # its jsonl record
+        kept.append((pos, size))
+        live_bytes += size
+    drop_cache: Set[str] = set()
+    cached = []
+    for key, size in backend.cache_sizes():
+        if not is_current_cache_key(key):
+            drop_cache.add(key)
+            continue
+        cached.append((key, size))
+        live_bytes += size
+    if max_bytes > 0:
+        for key, size in cached:
+            if live_bytes <= max_bytes:
+                break
+            drop_cache.add(key)
+            live_bytes -= size
+        for pos, size in kept:
+            if live_bytes <= max_bytes:
+                break
+            archive.add(pos)
+            live_bytes -= size
+    return archive, drop_cache
+
+
+def archive_results(backend, positions: Set[int], archive_dir: str = ARCHIVE_DIR) -> Dict[str, int]:
+    """Append the results at `positions` to their monthly segments; returns results written per segment."""
+    if not positions:
+        return {}
+    os.makedirs(archive_dir, exist_ok=True)
+    segments: Dict[str, Any] = {}
+    written: Dict[str, int] = {}
+    try:
+        for pos, entry in backend.iter_results():
+            if pos not in positions:
+                continue
+            path = _segment(archive_dir, entry.get('timestamp'))
+            if path not in segments:
+                # Appending to a .gz adds a new gzip member; readers see one continuous stream
+                segments[path] = gzip.open(path, 'at', encoding='utf-8')
+            segments[path].write(json.dumps(entry, default=str) + '\n')
+            written[path] = written.get(path, 0) + 1
+    finally:
+        for f in segments.values():
+            f.close()
+    return written
+
+
+def prune_archives(archive_dir: str = ARCHIVE_DIR, max_age_days: int = ARCHIVE_MAX_AGE_DAYS,
+                   now: Optional[datetime] = None) -> List[str]:
+    """Delete the segments whose whole month is older than `max_age_days`; returns their paths."""
+    if max_age_days <= 0:
+        return []
+    cutoff_month = ((now or datetime.now()) - timedelta(days=max_age_days)).strftime('%Y-%m')
+    pruned = []
+    for path in archive_segments(archive_dir):
+        month = os.path.basename(path)[len('results-'):-len('.jsonl.gz')]
+        if month != 'undated' and month < cutoff_month:
+            os.remove(path)
+            pruned.append(path)
+    return pruned
+
+
+def archive_segments(archive_dir: str = ARCHIVE_DIR) -> List[str]:
+    return sorted(glob.glob(os.path.join(archive_dir, 'results-*.jsonl.gz')))
+
+
+def iter_archived(archive_dir: str = ARCHIVE_DIR) -> Iterator[Dict[str, Any]]:
+    """Archived results, segment by segment (oldest month first)."""
+    for path in archive_segments(archive_dir):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+class _RetentionLock:
+    """Only one compaction may run at a time: result positions shift when the live log is rewritten."""
+
+    def __init__(self, archive_dir: str):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.path = os.path.join(archive_dir, '.lock')
+
+    def __enter__(self):
+        self.f = open(self.path, 'w')
+        if fcntl:
+            try:
+                fcntl.flock(self.f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.f.close()
+                raise RuntimeError(f"Another compaction holds {self.path}")
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+
+def compact_memory(backend=None, retention_days: int = RETENTION_DAYS, max_bytes: int = MAX_BYTES,
+                   archive_dir: str = ARCHIVE_DIR, archive_max_age_days: int = ARCHIVE_MAX_AGE_DAYS,
+                   now: Optional[datetime] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """Run one retention pass (see the module docstring) and return what it did."""
+    backend = backend or get_backend()
+    if not hasattr(backend, 'compact'):
+        raise ValueError("The legacy json backend cannot be compacted; "
+                         "migrate to jsonl or sqlite first (python shared_memory.py --migrate)")
+    with _RetentionLock(archive_dir):
+        drop, drop_cache = plan_retention(backend, retention_days, max_bytes, now)
+        if dry_run:
+            return {'results_to_archive': len(drop), 'cache_records_to_drop': len(drop_cache), 'bytes': backend.size()}
+        segments = archive_results(backend, drop, archive_dir)
+        stats: Dict[str, Any] = backend.compact(drop, drop_cache)
+        stats['archived'] = sum(segments.values())
+        stats['segments'] = sorted(segments)
+        stats['segments_pruned'] = prune_archives(archive_dir, archive_max_age_days, now)
+    return stats
+
+
+def rebuild_rollups(rollups: Rollups, backend=None, archive_dir: str = ARCHIVE_DIR) -> int:
+    """
+    Recount the rollups from the archived and live history (e.g. for history logged before
+    rollups existed). Returns the number of results counted; see entry_row for what is lost.
+    """
+    backend = backend or get_backend()
+    rollups.clear()
+    return rollups.add(entry_row(entry) for entry in chain(iter_archived(archive_dir), backend.iter_entries('results')))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Shared memory retention, compaction and rollups")
+    parser.add_argument('--compact', action='store_true', help='Archive old results and compact the live store')
+    parser.add_argument('--dry-run', action='store_true', help='Only report how many results would be archived')
+    parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS, help='Archive results older than this (0: no age limit)')
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES, help='Archive the oldest results beyond this much live history (0: no limit)')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--rebuild-rollups', action='store_true', help='Recount the rollups from the archived and live history')
+    args = parser.parse_args()
+    if args.compact or args.dry_run:
+        stats = compact_memory(retention_days=args.retention_days, max_bytes=args.max_bytes,
+                               archive_dir=args.archive_dir, dry_run=args.dry_run)
+        print(f"Compaction: {stats}")
+    if args.rebuild_rollups:
+        rollups = get_rollups()
+        if rollups is None:
+            print("Rollups are disabled (MEMORY_ROLLUPS=0)")
+        else:
+            print(f"Rebuilt rollups from {rebuild_rollups(rollups, archive_dir=args.archive_dir)} results")
+    if not (args.compact or args.dry_run or args.rebuild_rollups):
+        segments = archive_segments(args.archive_dir)
+        print(f"Live history: {get_backend().size()} bytes; {len(segments)} archive segments in {args.archive_dir}")
+        for path in segments:
+            print(f"  {path} ({os.path.getsize(path)} bytes)")
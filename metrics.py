@@ -0,0 +1,217 @@
+"""
+Lightweight pipeline instrumentation: `stage(name)` timers (context manager, or the `timed`
+decorator) record per-stage latency. While a document is being processed under
+`profile_document()`, its stages go into that document's DocumentProfile (the per-document
+timing breakdown carried on the Result and its trace); the caller then records the profile
+in the process-wide registry with `record_document`. Stages timed outside a document
+(streamed events, batch writes) are recorded directly. The registry renders the
+Prometheus text format for /metrics and summarizes stages for `main.py --profile`.
+"""
+import bisect
+import os
+import threading
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS", "1") == "1"
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Recent observations kept per histogram for the percentiles of the --profile summary
+PROFILE_SAMPLES = 1000
+
+METRIC_HELP = {
+    'classifier_stage_seconds': ('histogram', 'Time spent in each pipeline stage.', LATENCY_BUCKETS),
+    'classifier_document_seconds': ('histogram', 'End-to-end processing time per document.', LATENCY_BUCKETS),
+    'classifier_document_bytes': ('histogram', 'Size of processed documents.', SIZE_BUCKETS),
+    'classifier_pdf_pages': ('histogram', 'Pages extracted per PDF document.', PAGE_BUCKETS),
+    'classifier_documents_total': ('counter', 'Documents processed.', None),
+    'classifier_cache_lookups_total': ('counter', 'Result cache lookups by outcome.', None),
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of non-empty `values` (pct in 0-100)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.samples: deque = deque(maxlen=PROFILE_SAMPLES)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRIC_HELP[name][2])
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in METRIC_HELP.items():
+                if kind == 'histogram':
+                    series = sorted((key[1], h) for key, h in self._histograms.items() if key[0] == name)
+                else:
+                    series = sorted((key[1], v) for key, v in self._counters.items() if key[0] == name)
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series:
+                    if kind == 'counter':
+                        lines.append(f"{name}{_labels(labels)} {value:g}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {round(value.sum, 6)}")
+                    lines.append(f"{name}_count{_labels(labels)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, name: str = 'classifier_stage_seconds', label: str = 'stage') -> Dict[str, Dict[str, float]]:
+        """Per-label count, total, mean, p50/p99 (of recent observations) and max of one histogram."""
+        with self._lock:
+            series = [(dict(key[1]).get(label), h.count, h.sum, h.max, list(h.samples))
+                      for key, h in self._histograms.items() if key[0] == name]
+        return {
+            value: {'count': count, 'total': total, 'mean': total / count,
+                    'p50': percentile(samples, 50), 'p99': percentile(samples, 99), 'max': maximum}
+            for value, count, total, maximum, samples in sorted(series, key=lambda s: -s[2]) if count
+        }
+
+    def counters(self, name: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+        with self._lock:
+            return {key[1]: value for key, value in self._counters.items() if key[0] == name}
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+registry = MetricsRegistry()
+
+
+class DocumentProfile:
+    """Timing breakdown (seconds per stage), size, page count and result cache outcome of one document."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.bytes: Optional[int] = None
+        self.pages: Optional[int] = None
+        # 'memory', 'store' or 'miss'; None when the result cache was not consulted
+        self.cache: Optional[str] = None
+        self.start = perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        timings = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        timings['total'] = round((perf_counter() - self.start) * 1000, 3)
+        return {'timings_ms': timings, 'bytes': self.bytes, 'pages': self.pages, 'cache': self.cache}
+
+
+_current_profile: ContextVar[Optional[DocumentProfile]] = ContextVar('current_profile', default=None)
+
+
+class profile_document:
+    """Collect the stages timed inside the block into a new DocumentProfile."""
+
+    def __enter__(self) -> DocumentProfile:
+        self.profile = DocumentProfile()
+        self._token = _current_profile.set(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc):
+        _current_profile.reset(self._token)
+
+
+def current_profile() -> Optional[DocumentProfile]:
+    return _current_profile.get()
+
+
+class stage:
+    """Time the block as pipeline stage `name`."""
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.stages[self.name] = profile.stages.get(self.name, 0.0) + elapsed
+        elif METRICS_ENABLED:
+            registry.observe('classifier_stage_seconds', elapsed, stage=self.name)
+
+
+def timed(name: str):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_document(fmt: str, profile: Dict[str, Any]):
+    """Record one document's profile (DocumentProfile.to_dict()) in this process's registry."""
+    if not METRICS_ENABLED or not profile:
+        return
+    timings = dict(profile['timings_ms'])
+    total = timings.pop('total', None)
+    for name, ms in timings.items():
+        registry.observe('classifier_stage_seconds', ms / 1000, stage=name)
+    if total is not None:
+        registry.observe('classifier_document_seconds', total / 1000, format=fmt)
+    if profile.get('bytes') is not None:
+        registry.observe('classifier_document_bytes', profile['bytes'], format=fmt)
+    if profile.get('pages') is not None:
+        registry.observe('classifier_pdf_pages', profile['pages'])
+    registry.inc('classifier_documents_total', format=fmt)
+    if profile.get('cache') is not None:
+        registry.inc('classifier_cache_lookups_total', result=profile['cache'])
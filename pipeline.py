@@ -0,0 +1,423 @@
+"""
+In-process document pipeline shared by the CLI (main.py), the API (api.py) and the UI (ui.py).
+All agent dependencies are imported once at module load; process_document has no stdout side effects.
+"""
+import copy
+import hashlib
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from action_router import Action, route_action
+from classifier import classify_intent, intent_scan, CLASSIFIER_VERSION, INTENT_BACKEND
+from email_parser import EmailAnalyzer, needs_escalation, trigger_action
+from format_detector import (Source, INVOICE_TOTAL_LIMIT, UnsupportedFormatError, detect_format, extract_text, validate_json_schema,
+                             load_json, json_text, iter_json_events, iter_pdf_pages, MalformedEvent)
+from invoice_extractor import InvoiceExtraction
+from metrics import profile_document, record_document, stage
+from policy_scanner import PolicyScan, get_policy_scanner
+from result_cache import content_key, get_cache
+from rollups import get_rollups, rollup_row
+from shared_memory import make_result, log_agent_results
+
+# Example required schema for JSON events (customize as needed)
+REQUIRED_JSON_FIELDS = {
+    'event': str,
+    'timestamp': str,
+    'payload': dict
+}
+
+# Bump when agent output for the same document can change, so cached results are recomputed
+PIPELINE_VERSION = "5"
+
+# Uploads are classified from memory; set PERSIST_UPLOADS=1 to also keep a copy on disk
+PERSIST_UPLOADS = os.environ.get("PERSIST_UPLOADS", "0") == "1"
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+
+# Streamed JSON events are written to shared memory in batches of this size
+STREAM_LOG_BATCH = 500
+
+
+@dataclass
+class Result:
+    format: str
+    agent: str
+    source: Optional[str]
+    intent: str
+    confidence: float
+    extracted: Dict[str, Any]
+    actions: List[Action]
+    trace: str
+    routing_metadata: Dict[str, Any]
+    input_meta: Dict[str, Any]
+    triggered: List[str] = field(default_factory=list)
+    # Agent-specific intermediate values (email fields, anomalies, invoice fields, ...)
+    details: Dict[str, Any] = field(default_factory=dict)
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    # 'memory' or 'store' when the agent output came from the result cache
+    cache_hit: Optional[str] = None
+    # Per-document timing breakdown, size and page count (metrics.DocumentProfile.to_dict())
+    profile: Dict[str, Any] = field(default_factory=dict)
+
+    def memory_entry(self) -> Dict[str, Any]:
+        """The entry written to shared memory for this result."""
+        entry = make_result(self.agent, self.input_meta, self.extracted, [str(action) for action in self.actions], self.trace,
+                            intent=self.intent)
+        entry['timestamp'] = self.timestamp
+        if self.profile:
+            entry['profile'] = self.profile
+        return entry
+
+    def event_id(self) -> str:
+        """Identifies this processing of the document, for idempotent action routing."""
+        return f"{self.source}|{self.timestamp}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _routing_metadata(fmt, intent, confidence, source, **facts):
+    """Routing metadata: format/intent/confidence/file plus the agent's structured facts the routing rules key on."""
+    return {
+        'format': fmt,
+        'intent': intent,
+        'confidence': confidence,
+        'file': os.path.basename(source) if source else 'user_input_email',
+        **facts,
+    }
+
+
+_EMAIL_ANALYZER = EmailAnalyzer()
+
+
+def email_agent(input_text: str, source: Optional[str]) -> Result:
+    """Email Agent: extract sender/urgency/issue, tone and intent, and decide the follow-up action."""
+    with stage('email_analysis'):
+        analysis = _EMAIL_ANALYZER.analyze(input_text)
+    email_fields = {key: analysis[key] for key in ('sender', 'urgency', 'issue')}
+    tone, intent, confidence = analysis['tone'], analysis['intent'], analysis['confidence']
+    action_result = Action('escalate' if needs_escalation(email_fields, tone) else 'routine',
+                           trigger_action(email_fields, tone), {'sender': email_fields['sender'], 'issue': email_fields['issue']})
+    return Result(
+        format='Email',
+        agent='EmailAgent',
+        source=source,
+        intent=intent,
+        confidence=confidence,
+        extracted={**email_fields, 'tone': tone, 'intent': intent, 'confidence': confidence},
+        actions=[action_result],
+        trace=f"Fields: {email_fields}, Tone: {tone}, Intent: {intent}, Confidence: {confidence}, Action: {action_result}",
+        routing_metadata=_routing_metadata('Email', intent, confidence, source, tone=tone, **email_fields),
+        input_meta={'source': source, 'timestamp': None, 'format': 'Email'},
+        details={'email_fields': email_fields, 'tone': tone},
+    )
+
+
+def json_agent(event: Any, source: Optional[str], text: Optional[str] = None) -> Result:
+    """
+    JSON Agent: validate the event against REQUIRED_JSON_FIELDS and flag anomalies.
+    `event` is the parsed event (any JSON value), or a MalformedEvent standing in for a stream
+    line that did not decode; `text` is what gets classified (see json_text).
+    """
+    if isinstance(event, MalformedEvent):
+        # Logged as the raw text it was, with the decode error as its anomaly
+        data = text or ''
+        is_valid, anomalies = False, [f"Malformed JSON: {event.error}"]
+    else:
+        data = event
+        if text is None:
+            text = json_text(data)
+        with stage('validate_schema'):
+            is_valid, anomalies = validate_json_schema(data, REQUIRED_JSON_FIELDS)
+    actions = [Action('json_alert', f"Alert: {anomalies}", {'anomalies': anomalies})] if not is_valid else [Action('schema_valid', "Schema valid")]
+    with stage('classify_intent'):
+        intent, confidence = classify_intent(text)
+    return Result(
+        format='JSON',
+        agent='JSONAgent',
+        source=source,
+        intent=intent,
+        confidence=confidence,
+        extracted=data,
+        actions=actions,
+        trace=f"Anomalies: {anomalies}" if anomalies else "Schema valid",
+        routing_metadata=_routing_metadata('JSON', intent, confidence, source, anomalies=anomalies),
+        input_meta={'source': source, 'timestamp': data.get('timestamp') if isinstance(data, dict) else None, 'format': 'JSON'},
+        details={'data': data, 'anomalies': anomalies, 'schema_valid': is_valid},
+    )
+
+
+def _timed_pages(pages: Iterable[str]) -> Iterator[str]:
+    """Attribute the time spent producing each page (PDF extraction) to the extract_text stage."""
+    pages = iter(pages)
+    while True:
+        with stage('extract_text'):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield page
+
+
+def pdf_agent(pages: Union[str, Iterable[str]], source: Optional[str]) -> Result:
+    """
+    PDF Agent: extract invoice fields and policy mentions and flag high totals or compliance terms.
+    `pages` is the full text or an iterable of page texts; pages are read one at a time, so only
+    the current page is held (policy offsets are then (page, offset) pairs).
+    """
+    invoice = InvoiceExtraction()
+    policy = PolicyScan(get_policy_scanner())
+    intent_pages = intent_scan()
+    for page in _timed_pages([pages] if isinstance(pages, str) else pages):
+        with stage('invoice_fields'):
+            invoice.feed(page)
+        with stage('policy_scan'):
+            policy.feed(page)
+        with stage('classify_intent'):
+            intent_pages.feed(page)
+    pdf_fields = invoice.result()
+    policy_scan = policy.result()
+    policy_mentions = policy_scan['mentions']
+    actions = []
+    if pdf_fields.get('total') and pdf_fields['total'] > INVOICE_TOTAL_LIMIT:
+        actions.append(Action('risk_alert', f"Invoice total exceeds {INVOICE_TOTAL_LIMIT:,}: {pdf_fields['total']}", {'total': pdf_fields['total']}))
+    if policy_mentions:
+        actions.append(Action('compliance_flag', f"Policy mentions: {policy_mentions}", {'policy_mentions': policy_mentions}))
+    with stage('classify_intent'):
+        intent, confidence = intent_pages.result()
+    return Result(
+        format='PDF',
+        agent='PDFAgent',
+        source=source,
+        intent=intent,
+        confidence=confidence,
+        extracted={**pdf_fields, 'policy_mentions': policy_mentions},
+        actions=actions,
+        trace=f"Fields: {pdf_fields}, Policy: {policy_mentions}",
+        routing_metadata=_routing_metadata('PDF', intent, confidence, source,
+                                           total=pdf_fields['total'], policy_mentions=policy_mentions),
+        input_meta={'source': source, 'timestamp': None, 'format': 'PDF'},
+        details={'pdf_fields': pdf_fields, 'policy_mentions': policy_mentions,
+                 'policy_counts': policy_scan['counts'], 'policy_offsets': policy_scan['offsets']},
+    )
+
+
+AGENTS = {
+    'Email': email_agent,
+    'JSON': json_agent,
+    'PDF': pdf_agent,
+}
+
+
+def store_upload(data: bytes, filename: str, upload_dir: str = UPLOAD_DIR) -> str:
+    """
+    Persist an upload under a content-addressed name (<sha256><ext>) and return its path.
+    Identical uploads share one file and concurrent uploads with the same filename never clobber each other.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(upload_dir, digest + os.path.splitext(filename)[1].lower())
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
+
+
+# Result fields that belong to one call rather than to the document content
+_PER_CALL_FIELDS = ('source', 'triggered', 'timestamp', 'cache_hit', 'profile')
+# Marks a cached detail that is (part of) the result's extracted fields, stored once
+EXTRACTED_REF = '$extracted'
+
+
+def _document_bytes(source: Source) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    return source.read()
+
+
+def _document_size(source: Source) -> Optional[int]:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    return None
+
+
+def _cache_value(result: Result) -> Dict[str, Any]:
+    """
+    The cached form of a Result. Details that repeat the extracted fields (a JSON document,
+    an email's or invoice's fields) are stored as {EXTRACTED_REF: None | [field names]} instead.
+    """
+    value = result.to_dict()
+    for key in _PER_CALL_FIELDS:
+        value.pop(key)
+    extracted = result.extracted
+    for name, detail in result.details.items():
+        if detail is extracted:
+            value['details'][name] = {EXTRACTED_REF: None}
+        elif (isinstance(detail, dict) and detail and isinstance(extracted, dict)
+              and all(field in extracted and extracted[field] is v for field, v in detail.items())):
+            value['details'][name] = {EXTRACTED_REF: list(detail)}
+    return value
+
+
+def _from_cache(value: Dict[str, Any], source: Optional[str], tier: str) -> Result:
+    value = copy.deepcopy(value)
+    extracted = value['extracted']
+    for name, detail in value['details'].items():
+        if isinstance(detail, dict) and len(detail) == 1 and EXTRACTED_REF in detail:
+            fields = detail[EXTRACTED_REF]
+            value['details'][name] = extracted if fields is None else {field: extracted[field] for field in fields}
+    value['actions'] = [Action(**action) for action in value['actions']]
+    result = Result(**{**value, 'source': source, 'cache_hit': tier})
+    result.input_meta = {**result.input_meta, 'source': source}
+    result.routing_metadata = {**result.routing_metadata, 'file': os.path.basename(source) if source else 'user_input_email'}
+    return result
+
+
+def _run_agent(fmt: str, document: Source, source: Optional[str]) -> Result:
+    if fmt not in AGENTS:
+        raise UnsupportedFormatError(f"No agent for {fmt} documents ({source or 'upload'})")
+    if fmt == 'JSON':
+        # Parse once and hand the object to the agent instead of a re-serialized string
+        with stage('extract_text'):
+            data, raw = load_json(document)
+            text = json_text(data, raw)
+        return json_agent(data, source, text)
+    if fmt == 'PDF':
+        # Pages stream straight into the agent, never joined into one string
+        return pdf_agent(iter_pdf_pages(document), source)
+    with stage('extract_text'):
+        text = extract_text(document, fmt)
+    return AGENTS[fmt](text, source)
+
+
+def cache_version(fmt: str) -> str:
+    if INTENT_BACKEND == 'ml':
+        # Retraining the model must not serve results classified by the previous one
+        from intent_model import model_version
+        return f"{PIPELINE_VERSION}:{CLASSIFIER_VERSION}:ml-{model_version()}:{fmt}"
+    return f"{PIPELINE_VERSION}:{CLASSIFIER_VERSION}:{INTENT_BACKEND}:{fmt}"
+
+
+def is_current_cache_key(key: str) -> bool:
+    """False for result cache keys written by an older pipeline, classifier or ML model file (see cache_version)."""
+    parts = key.split(':')
+    if len(parts) != 5 or parts[1:3] != [PIPELINE_VERSION, CLASSIFIER_VERSION]:
+        return False
+    backend = parts[3]
+    if backend.startswith('ml-'):
+        from intent_model import MODEL_FILE, file_version
+        return backend == f"ml-{file_version(MODEL_FILE)}"
+    return True
+
+
+def process_document(path_or_bytes: Source, fmt: Optional[str] = None,
+                     name: Optional[str] = None, log: bool = True, route: bool = True,
+                     use_cache: bool = True, record: bool = True) -> Result:
+    """
+    Detect, extract and classify one document and return a structured Result.
+    `path_or_bytes` is a file path, raw bytes / memoryview or a binary file-like object;
+    `fmt` skips format detection. `name` is recorded as the source (defaults to the path)
+    and its extension guides detection of in-memory documents. With `log`, the result is
+    appended to shared memory; with `route`, its actions are sent through the action router.
+    With `use_cache`, documents whose bytes were seen before reuse the cached agent output.
+    The per-stage timings are kept in `result.profile` (and in the logged entry); with `record`
+    they are also recorded in this process's metrics, and a logged result in the rollups.
+    Callers running this in a worker process pass record=False and call record_metrics (and
+    record_rollups once the Result is routed) on the returned Result.
+    """
+    if isinstance(path_or_bytes, (str, os.PathLike)):
+        source = name or os.fspath(path_or_bytes)
+    else:
+        source = name
+    cache = get_cache() if use_cache else None
+    with profile_document() as profile:
+        if cache is None:
+            profile.bytes = _document_size(path_or_bytes)
+            with stage('detect_format'):
+                fmt = fmt or detect_format(path_or_bytes, name)
+            result = _run_agent(fmt, path_or_bytes, source)
+        else:
+            with stage('read_document'):
+                data = _document_bytes(path_or_bytes)
+            profile.bytes = len(data)
+            with stage('detect_format'):
+                fmt = fmt or detect_format(data, name or source)
+            with stage('cache_lookup'):
+                key = content_key(data, cache_version(fmt))
+                value, tier = cache.get(key)
+            profile.cache = tier or 'miss'
+            if value is not None:
+                result = _from_cache(value, source, tier)
+            else:
+                result = _run_agent(fmt, data, source)
+                with stage('cache_store'):
+                    cache.put(key, _cache_value(result))
+        if log:
+            # The logged trace carries the stages timed so far
+            result.profile = profile.to_dict()
+            log_agent_results([result.memory_entry()])
+        if route:
+            # Delivery is retried by the action queue; routing itself only evaluates rules
+            result.triggered = route_action(result.routing_metadata, result.actions, verbose=False,
+                                            event_id=result.event_id())
+        result.profile = profile.to_dict()
+    if record:
+        record_metrics(result)
+        if log:
+            record_rollups([result])
+    return result
+
+
+def record_metrics(result: Result):
+    """Record a Result's profile in this process's metrics registry."""
+    record_document(result.format, result.profile)
+
+
+def record_rollups(results: List[Result]):
+    """Count logged, routed Results in the hourly/daily rollups behind /stats."""
+    rollups = get_rollups()
+    if rollups is None or not results:
+        return
+    with stage('rollup_write'):
+        rollups.add(rollup_row(r.timestamp, r.agent, r.format, r.intent, r.routing_metadata.get('tone'), r.triggered)
+                    for r in results)
+
+
+def process_json_stream(path_or_bytes: Source, name: Optional[str] = None,
+                        log: bool = True, route: bool = True) -> Iterator[Result]:
+    """
+    Validate and classify every event of an NDJSON file or top-level JSON array without
+    loading the whole document, yielding one Result per event (source '<name>#<index>').
+    Results are written to shared memory (and counted in the rollups) in batches of STREAM_LOG_BATCH.
+    """
+    if isinstance(path_or_bytes, (str, os.PathLike)):
+        name = name or os.fspath(path_or_bytes)
+    pending: List[Result] = []
+    try:
+        for index, (event, raw) in enumerate(iter_json_events(path_or_bytes, name)):
+            text = raw if isinstance(event, MalformedEvent) else json_text(event, raw)
+            result = json_agent(event, f"{name}#{index}", text)
+            if route:
+                result.triggered = route_action(result.routing_metadata, result.actions, verbose=False,
+                                                event_id=result.event_id())
+            if log:
+                pending.append(result)
+                if len(pending) >= STREAM_LOG_BATCH:
+                    _log_stream_batch(pending)
+                    pending = []
+            yield result
+    finally:
+        if pending:
+            _log_stream_batch(pending)
+
+
+def _log_stream_batch(results: List[Result]):
+    log_agent_results([result.memory_entry() for result in results])
+    record_rollups(results)
@@ -0,0 +1,115 @@
+"""
+Compliance keyword engine: keyword lists (possibly thousands of terms) are compiled once
+into a single word-boundary-aware regex built from a character trie, so every mention,
+with counts and page offsets, is found in one pass over each page.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+DEFAULT_POLICY_KEYWORDS = ['GDPR', 'FDA', 'HIPAA', 'SOX', 'PCI']
+
+# Optional keyword config: a JSON list of terms, a JSON object {term: [aliases]}, or one term per line
+POLICY_KEYWORDS_FILE = os.environ.get("POLICY_KEYWORDS_FILE")
+
+_scanner = None
+
+
+def load_keywords(path: str) -> Dict[str, List[str]]:
+    """Read a keyword config into {canonical term: [aliases]}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            config = json.load(f)
+        else:
+            config = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    if isinstance(config, dict):
+        return {term: list(aliases) for term, aliases in config.items()}
+    return {term: [] for term in config}
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """Regex alternation sharing common prefixes; a space in a term matches any run of whitespace."""
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        alternatives = [(r'\s+' if ch == ' ' else re.escape(ch)) + emit(child)
+                        for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ''
+        optional = '' in node
+        if len(alternatives) == 1 and not optional:
+            return alternatives[0]
+        group = '(?:' + '|'.join(alternatives) + ')'
+        # Greedy '?' tries the longer term first, falling back to the shorter one
+        return group + '?' if optional else group
+
+    return emit(trie)
+
+
+class PolicyScanner:
+    def __init__(self, keywords: Union[List[str], Dict[str, List[str]]] = DEFAULT_POLICY_KEYWORDS):
+        if not isinstance(keywords, dict):
+            keywords = {term: [] for term in keywords}
+        self.terms = list(keywords)
+        self.canonical = {_normalize(alias): term for term, aliases in keywords.items() for alias in [term, *aliases]}
+        self.regex = re.compile(rf'\b(?:{_trie_pattern(self.canonical)})\b', re.IGNORECASE)
+
+    def scan(self, text: Union[str, Iterable[str]], stop_when_complete: bool = False) -> Dict[str, Any]:
+        """
+        Find all mentions in the full text or an iterable of pages.
+        Returns the mentioned terms (in config order), a count per term and (page, offset)
+        positions per term. With `stop_when_complete`, reading stops once every term was seen.
+        """
+        scan = PolicyScan(self)
+        for page in ([text] if isinstance(text, str) else text):
+            scan.feed(page)
+            if stop_when_complete and scan.complete:
+                break
+        return scan.result()
+
+
+class PolicyScan:
+    """Mentions accumulated over the pages of one document, fed one page at a time."""
+
+    def __init__(self, scanner: PolicyScanner):
+        self.scanner = scanner
+        self.counts: Dict[str, int] = {}
+        self.offsets: Dict[str, List[tuple]] = {}
+        self.page_no = 0
+
+    @property
+    def complete(self) -> bool:
+        return len(self.counts) == len(self.scanner.terms)
+
+    def feed(self, page: str):
+        for match in self.scanner.regex.finditer(page):
+            term = self.scanner.canonical[_normalize(match.group(0))]
+            self.counts[term] = self.counts.get(term, 0) + 1
+            self.offsets.setdefault(term, []).append((self.page_no, match.start()))
+        self.page_no += 1
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'mentions': [term for term in self.scanner.terms if term in self.counts],
+            'counts': self.counts,
+            'offsets': self.offsets,
+        }
+
+
+def get_policy_scanner() -> PolicyScanner:
+    """Process-wide scanner for POLICY_KEYWORDS_FILE (or the default keywords), compiled on first use."""
+    global _scanner
+    if _scanner is None:
+        keywords: Optional[Dict[str, List[str]]] = load_keywords(POLICY_KEYWORDS_FILE) if POLICY_KEYWORDS_FILE else None
+        _scanner = PolicyScanner(keywords or DEFAULT_POLICY_KEYWORDS)
+    return _scanner
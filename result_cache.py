@@ -0,0 +1,68 @@
+"""
+Content-addressed result cache: SHA-256 of the raw document bytes plus the
+pipeline/classifier version maps to the agent output for that document.
+An in-process LRU sits in front of a persistent tier in the shared memory store, which
+keeps the RESULT_CACHE_STORE_SIZE most recently written records (see shared_memory).
+Hit rates are counted by the callers (the pipeline's metrics, the API's /cache/stats).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import shared_memory
+
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "1024"))
+
+
+def content_key(data: bytes, version: str) -> str:
+    return f"{hashlib.sha256(data).hexdigest()}:{version}"
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE, persistent: bool = True):
+        self.maxsize = maxsize
+        self.persistent = persistent
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Return (value, tier) where tier is 'memory', 'store' or None on a miss."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value, 'memory'
+        value = shared_memory.cache_get(key) if self.persistent else None
+        if value is None:
+            return None, None
+        with self._lock:
+            self._remember(key, value)
+        return value, 'store'
+
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._remember(key, value)
+        if self.persistent:
+            shared_memory.cache_put(key, value)
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_cache() -> Optional[ResultCache]:
+    """Process-wide cache, or None when RESULT_CACHE=0."""
+    global _cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
@@ -1,5 +1,10 @@
+import random
 import time
 
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter: a random delay in [0, min(cap, base * 2 ** (attempt - 1))]."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
 def retry_action(action_func, max_retries=3, delay=2, *args, **kwargs):
    
     for attempt in range(1, max_retries + 1):
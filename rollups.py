@@ -0,0 +1,145 @@
+"""
+Precomputed counts of processed documents by agent, format, intent, tone and routed action,
+per hour, per day and over all time. They are incremented as results are logged, so /stats and
+the UI read a few rows instead of re-aggregating the shared memory history (which compaction
+may have moved to archive segments anyway). Counts live in a small SQLite file; increments are
+upserts, so any number of writer processes can share it.
+"""
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from shared_memory import entry_intent
+
+ROLLUPS_ENABLED = os.environ.get("MEMORY_ROLLUPS", "1") == "1"
+ROLLUP_FILE = os.environ.get("MEMORY_ROLLUP_FILE", "shared_memory_rollups.db")
+
+DIMENSIONS = ('agent', 'format', 'intent', 'tone', 'action')
+# Period -> length of the ISO timestamp prefix naming its bucket ('all' has a single bucket)
+PERIODS = {'hour': 13, 'day': 10, 'all': 0}
+
+# One rollup row: (ISO timestamp, {dimension: [values]})
+Row = Tuple[str, Dict[str, List[str]]]
+
+
+def rollup_row(timestamp: str, agent: Optional[str], fmt: Optional[str], intent: Optional[str] = None,
+               tone: Optional[str] = None, routed: Iterable[str] = ()) -> Row:
+    """The dimensions one processed document counts towards; `routed` are 'METHOD /endpoint' strings."""
+    values = {'agent': [agent], 'format': [fmt], 'intent': [intent], 'tone': [tone],
+              'action': [endpoint.split(' ', 1)[-1] for endpoint in routed]}
+    return timestamp, {dimension: [v for v in vals if v] for dimension, vals in values.items()}
+
+
+class Rollups:
+    def __init__(self, path: str = ROLLUP_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rollups (
+                    period TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (period, bucket, dimension, value)
+                ) WITHOUT ROWID
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    def add(self, rows: Iterable[Row]) -> int:
+        """Count the given documents in one transaction; returns how many were counted."""
+        counts = Counter()
+        documents = 0
+        for timestamp, dimensions in rows:
+            documents += 1
+            for period, width in PERIODS.items():
+                bucket = timestamp[:width]
+                counts[(period, bucket, 'documents', 'total')] += 1
+                for dimension, values in dimensions.items():
+                    for value in values:
+                        counts[(period, bucket, dimension, str(value))] += 1
+        if not counts:
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                'INSERT INTO rollups (period, bucket, dimension, value, count) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (period, bucket, dimension, value) DO UPDATE SET count = count + excluded.count',
+                [(*key, count) for key, count in counts.items()]
+            )
+        return documents
+
+    def totals(self) -> Dict[str, Dict[str, int]]:
+        """All-time counts: {dimension: {value: count}}, plus {'documents': {'total': n}}."""
+        totals: Dict[str, Dict[str, int]] = {}
+        for dimension, value, count in self._conn().execute(
+                "SELECT dimension, value, count FROM rollups WHERE period = 'all' ORDER BY dimension, count DESC"):
+            totals.setdefault(dimension, {})[value] = count
+        return totals
+
+    def series(self, period: str = 'day', dimension: str = 'documents', since: Optional[str] = None,
+               until: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Counts of one dimension per hour or day bucket: {bucket: {value: count}}, oldest first.
+        `since`/`until` are ISO timestamps (or prefixes), compared against the bucket names.
+        """
+        if period not in PERIODS or period == 'all':
+            raise ValueError(f"Unknown rollup period: {period}")
+        clauses, params = ['period = ?', 'dimension = ?'], [period, dimension]
+        if since:
+            clauses.append('bucket >= ?')
+            params.append(since[:PERIODS[period]])
+        if until:
+            clauses.append('bucket <= ?')
+            params.append(until[:PERIODS[period]])
+        series: Dict[str, Dict[str, int]] = {}
+        sql = f"SELECT bucket, value, count FROM rollups WHERE {' AND '.join(clauses)} ORDER BY bucket, count DESC"
+        for bucket, value, count in self._conn().execute(sql, params):
+            series.setdefault(bucket, {})[value] = count
+        return series
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM rollups')
+
+
+_rollups = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups() -> Optional[Rollups]:
+    """The process-wide rollup store, or None when MEMORY_ROLLUPS=0."""
+    global _rollups
+    if not ROLLUPS_ENABLED:
+        return None
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                _rollups = Rollups()
+    return _rollups
+
+
+def entry_row(entry: Dict[str, Any]) -> Row:
+    """
+    Rollup row of a logged shared memory entry, for rebuilding rollups from history. Entries
+    carry the tone only for emails (as does older history the intent) and no routed actions,
+    so a rebuild undercounts those.
+    """
+    extracted = entry.get('extracted')
+    if not isinstance(extracted, dict):  # JSON documents log the event itself, which may be a list
+        extracted = {}
+    return rollup_row(entry.get('timestamp') or '', entry.get('agent'), (entry.get('input_meta') or {}).get('format'),
+                      entry_intent(entry), extracted.get('tone'))
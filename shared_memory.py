@@ -1,37 +1,1023 @@
+import bisect
+import hashlib
 import json
 import os
+import sqlite3
+import threading
+from collections import Counter
 from datetime import datetime
-from typing import Any, Dict
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends fall back to a process-local lock
+    fcntl = None
 
 MEMORY_FILE = "shared_memory.json"
+JSONL_FILE = "shared_memory.jsonl"
+SQLITE_FILE = "shared_memory.db"
+
+# Which storage backend to use: 'jsonl' (append-only log), 'sqlite' or 'json' (legacy full rewrite)
+MEMORY_BACKEND = os.environ.get("SHARED_MEMORY_BACKEND", "jsonl")
+
+# The jsonl backend persists its offset index next to the log (<log>.idx), so a new process
+# (each CLI run) only indexes the records appended since, instead of parsing the whole history
+INDEX_SIDECAR = os.environ.get("SHARED_MEMORY_INDEX_SIDECAR", "1") == "1"
+# Newly indexed log bytes before another delta is appended to the sidecar
+INDEX_SAVE_BYTES = int(os.environ.get("SHARED_MEMORY_INDEX_SAVE_BYTES", 1024 * 1024))
+INDEX_FORMAT = 2
+# The log bytes just before the indexed end, hashed to tell a reused inode from the indexed file
+INDEX_TAIL_BYTES = 4096
+# Each sidecar delta line ends with '\t<from offset> <to offset> <sha256 of the log tail>\n'
+INDEX_TRAILER_BYTES = 1 + 20 + 1 + 20 + 1 + 64 + 1
+
+KINDS = ('results', 'traces')
+
+# Persistent result cache records kept (the most recently written); older ones are evicted as
+# records are written (sqlite) or when the log is compacted (jsonl)
+CACHE_MAX_RECORDS = int(os.environ.get("RESULT_CACHE_STORE_SIZE", 100000))
+# SQLite evicts once per this many cache writes
+CACHE_EVICT_EVERY = 1000
+
+# Entries fetched per round trip when streaming results out of a backend
+SCAN_BATCH_SIZE = 500
+
+# Compaction stores a trace text shared by several results once; those results then hold
+# {TRACE_REF: key} as their trace, which readers resolve transparently
+TRACE_REF = '$trace'
+# Shorter traces are cheaper inline than as a reference
+MIN_SHARED_TRACE_CHARS = 64
+
+
+def _trace_text(entry: Dict[str, Any], texts: Dict[str, str]):
+    trace = entry.get('trace')
+    if isinstance(trace, dict) and TRACE_REF in trace:
+        return texts.get(trace[TRACE_REF])
+    return trace
+
+
+def _trace_key(text) -> Optional[str]:
+    if not isinstance(text, str) or len(text) < MIN_SHARED_TRACE_CHARS:
+        return None
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def _trace_ref(entry: Dict[str, Any]) -> Optional[str]:
+    trace = entry.get('trace')
+    return trace.get(TRACE_REF) if isinstance(trace, dict) else None
+
+
+def _stat_version(*paths: str) -> tuple:
+    """Changes whenever one of the files is written, replaced or removed."""
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def _same_file(f, path: str) -> bool:
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+class JSONFileBackend:
+    """
+    Legacy backend: the whole memory lives in one JSON document that is
+    re-parsed and rewritten on every append. Kept for migration and small demos.
+    """
+
+    def __init__(self, path: str = MEMORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Dict[str, Any]:
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def replace(self, memory: Dict[str, Any]):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(memory, f, indent=2, default=str)
+
+    def append(self, kind: str, entry: Dict[str, Any]):
+        self.append_many(kind, [entry])
+
+    def append_many(self, kind: str, entries: List[Dict[str, Any]]):
+        with self._lock:
+            memory = self.load()
+            memory.setdefault(kind, []).extend(entries)
+            self.replace(memory)
+
+    def iter_entries(self, kind: str) -> Iterator[Dict[str, Any]]:
+        yield from self.load().get(kind, [])
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def version(self) -> tuple:
+        return _stat_version(self.path)
+
+    def cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.load().get('cache', {}).get(key)
+
+    def cache_put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            memory = self.load()
+            cache = memory.setdefault('cache', {})
+            cache.pop(key, None)
+            cache[key] = value
+            for stale in list(islice(cache, max(0, len(cache) - CACHE_MAX_RECORDS))):
+                del cache[stale]
+            self.replace(memory)
+
+    def get_latest(self, source: Optional[str]) -> Optional[Dict[str, Any]]:
+        for entry in reversed(self.load().get('results', [])):
+            if (entry.get('input_meta') or {}).get('source') == source:
+                return entry
+        return None
+
+    def iter_results(self, after=None, agent=None, format=None, source=None, since=None, until=None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        start = after + 1 if after is not None else 0
+        for pos, entry in enumerate(self.load().get('results', [])[start:], start):
+            if _matches(_meta(entry), agent, format, source, since, until):
+                yield pos, entry
+
+
+class ResultIndex:
+    """
+    In-process index over the results of an append-only log.
+    Maps source -> latest record offset and agent/format -> record offsets,
+    so lookups never rescan the history. (timestamp, position) pairs are sorted (lazily,
+    before the next time range lookup) for bisecting `since`/`until` ranges: batch and API
+    workers log results roughly, not strictly, in timestamp order.
+    """
+
+    def __init__(self):
+        self.offsets: List[int] = []
+        self.metas: List[tuple] = []
+        self.by_time: List[Tuple[str, int]] = []
+        self.time_sorted = True
+        self.latest_by_source: Dict[Any, int] = {}
+        self.by_agent: Dict[Any, List[int]] = {}
+        self.by_format: Dict[Any, List[int]] = {}
+        # Result cache records: content key -> record offset (last write wins)
+        self.cache_offsets: Dict[str, int] = {}
+        # Shared trace texts written by compaction: key -> record offset
+        self.trace_offsets: Dict[str, int] = {}
+
+    def add(self, offset: int, entry: Dict[str, Any]):
+        self.add_meta(offset, _meta(entry))
+
+    def add_meta(self, offset: int, meta: tuple):
+        pos = len(self.offsets)
+        self.offsets.append(offset)
+        self.metas.append(meta)
+        key = (meta[0] or '', pos)
+        if self.by_time and key < self.by_time[-1]:
+            self.time_sorted = False
+        self.by_time.append(key)
+        self.latest_by_source[meta[3]] = pos
+        self.by_agent.setdefault(meta[1], []).append(pos)
+        self.by_format.setdefault(meta[2], []).append(pos)
+
+    def positions(self, agent=None, format=None, source=None, since=None, until=None) -> List[int]:
+        candidates = None
+        if since or until:
+            if not self.time_sorted:
+                self.by_time.sort()  # nearly sorted already: a linear merge of the late arrivals
+                self.time_sorted = True
+            start = bisect.bisect_left(self.by_time, (since,)) if since else 0
+            end = bisect.bisect_right(self.by_time, (until, len(self.offsets))) if until else len(self.by_time)
+            candidates = sorted(pos for _, pos in self.by_time[start:end])
+        for key, bucket in ((agent, self.by_agent), (format, self.by_format)):
+            if key is not None and (candidates is None or len(bucket.get(key, [])) < len(candidates)):
+                candidates = bucket.get(key, [])
+        if candidates is None:
+            candidates = range(len(self.offsets))
+        return [p for p in candidates if _matches(self.metas[p], agent, format, source, since, until)]
+
+
+def _index_delta(index: ResultIndex, start: int) -> Dict[str, list]:
+    """The index entries of the records at log offsets >= `start`, as plain JSON-able data."""
+    first = bisect.bisect_left(index.offsets, start)
+    return {
+        'results': [[index.offsets[pos], *index.metas[pos]] for pos in range(first, len(index.offsets))],
+        'cache': [[key, offset] for key, offset in index.cache_offsets.items() if offset >= start],
+        'traces': [[key, offset] for key, offset in index.trace_offsets.items() if offset >= start],
+    }
+
+
+def _apply_index_delta(index: ResultIndex, delta: Dict[str, list]):
+    for offset, *meta in delta['results']:
+        index.add_meta(int(offset), tuple(meta))
+    index.cache_offsets.update((str(key), int(offset)) for key, offset in delta['cache'])
+    index.trace_offsets.update((str(key), int(offset)) for key, offset in delta['traces'])
+
+
+def _meta(entry: Dict[str, Any]) -> tuple:
+    input_meta = entry.get('input_meta') or {}
+    return (entry.get('timestamp'), entry.get('agent'), input_meta.get('format'), input_meta.get('source'))
+
+
+def _matches(meta: tuple, agent, format, source, since, until) -> bool:
+    timestamp, m_agent, m_format, m_source = meta
+    if agent is not None and m_agent != agent:
+        return False
+    if format is not None and m_format != format:
+        return False
+    if source is not None and m_source != source:
+        return False
+    if since and (timestamp or '') < since:
+        return False
+    if until and (timestamp or '') > until:
+        return False
+    return True
+
+
+class JSONLBackend:
+    """
+    Append-only log: one JSON record per line, tagged with its kind.
+    Each append is a single locked write at the end of the file, so its cost
+    does not depend on the size of the history and concurrent writers
+    never overwrite each other.
+    """
+
+    def __init__(self, path: str = JSONL_FILE):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self._lock = threading.Lock()
+        self._index = ResultIndex()
+        self._indexed_to = 0
+        self._indexed_ino = None
+        self._saved_to = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _write(self, lines, truncate: bool = False):
+        payload = b''.join(lines)
+        with self._lock:
+            while True:
+                # Never opened with 'wb': truncating before the lock is held would wipe concurrent appends
+                with open(self.path, 'ab') as f:
+                    if fcntl:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    try:
+                        # A compaction replaced the file while we waited for the lock: write to the new one
+                        if fcntl and not _same_file(f, self.path):
+                            continue
+                        if truncate:
+                            f.truncate(0)
+                        f.write(payload)
+                        f.flush()
+                        return
+                    finally:
+                        if fcntl:
+                            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _encode(kind: str, entry: Dict[str, Any]) -> bytes:
+        return (json.dumps({'kind': kind, 'entry': entry}, default=str) + '\n').encode('utf-8')
+
+    def append(self, kind: str, entry: Dict[str, Any]):
+        self._write([self._encode(kind, entry)])
+
+    def append_many(self, kind: str, entries: List[Dict[str, Any]]):
+        self._write([self._encode(kind, entry) for entry in entries])
+
+    def replace(self, memory: Dict[str, Any]):
+        lines = [self._encode(kind, entry) for kind in KINDS for entry in memory.get(kind, [])]
+        self._write(lines, truncate=True)
+        self._reset_index()
+
+    def seed(self, memory: Dict[str, Any]) -> bool:
+        """Create the log holding `memory`; returns False, leaving it untouched, when it already exists."""
+        tmp_path = f"{self.path}.{os.getpid()}.seed"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(self._encode(kind, entry) for kind in KINDS for entry in memory.get(kind, []))
+        try:
+            # link() publishes the complete file atomically and fails rather than replace an existing log
+            os.link(tmp_path, self.path)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+        return True
+
+    def _reset_index(self):
+        self._index = ResultIndex()
+        self._indexed_to = 0
+        self._indexed_ino = None
+        self._saved_to = 0
+
+    @staticmethod
+    def _tail_digest(f, offset: int) -> str:
+        f.seek(max(0, offset - INDEX_TAIL_BYTES))
+        return hashlib.sha256(f.read(offset - f.tell())).hexdigest()
+
+    def _sidecar_header(self, stat: os.stat_result) -> bytes:
+        return (json.dumps({'format': INDEX_FORMAT, 'file': [stat.st_dev, stat.st_ino]}) + '\n').encode('utf-8')
+
+    def _load_sidecar(self, f):
+        """Start from the persisted index when it describes a prefix of this very log file."""
+        stat = os.fstat(f.fileno())
+        index, indexed_to, tail = ResultIndex(), 0, None
+        try:
+            with open(self.index_path, 'rb') as sidecar:
+                if sidecar.readline() != self._sidecar_header(stat):
+                    return
+                for line in sidecar:
+                    if not line.endswith(b'\n'):
+                        break  # a save interrupted mid-write
+                    start, end, digest = line[-INDEX_TRAILER_BYTES:].split()
+                    if int(start) != indexed_to or int(end) > stat.st_size:
+                        break
+                    _apply_index_delta(index, json.loads(line[:-INDEX_TRAILER_BYTES]))
+                    indexed_to, tail = int(end), digest.decode('ascii')
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return  # missing or unreadable: index the log from the start
+        if not indexed_to or tail != self._tail_digest(f, indexed_to):
+            return  # e.g. a new log that reused the inode
+        self._index = index
+        self._indexed_to = self._saved_to = indexed_to
+        self._indexed_ino = stat.st_ino
+
+    def _save_sidecar(self, f):
+        """
+        Append the index entries of the records indexed since the sidecar's last delta. Deltas
+        hold plain JSON (offsets and result metadata), so the cost of a save follows the records
+        added since the previous one, and loading the file can never run code.
+        """
+        stat = os.fstat(f.fileno())
+        header = self._sidecar_header(stat)
+        try:
+            with open(self.index_path, 'a+b') as sidecar:
+                if fcntl:
+                    fcntl.flock(sidecar.fileno(), fcntl.LOCK_EX)
+                start = self._sidecar_end(sidecar, header, f)
+                if start is None:  # another log (or none yet): start over
+                    sidecar.truncate(0)
+                    sidecar.write(header)
+                    start = 0
+                if start < self._indexed_to:
+                    delta = json.dumps(_index_delta(self._index, start), default=str).encode('utf-8')
+                    trailer = b'\t%020d %020d %s\n' % (start, self._indexed_to, self._tail_digest(f, self._indexed_to).encode('ascii'))
+                    sidecar.write(delta + trailer)
+        except OSError:
+            return  # a read-only directory only costs the next process a full rebuild
+        self._saved_to = self._indexed_to
+
+    def _sidecar_end(self, sidecar: BinaryIO, header: bytes, f: BinaryIO) -> Optional[int]:
+        """Log offset the (locked) sidecar indexes up to, or None when it describes another log."""
+        size = sidecar.seek(0, os.SEEK_END)
+        sidecar.seek(0)
+        if sidecar.readline() != header:
+            return None
+        # Drop a delta left half-written by an interrupted save: keep up to the last newline
+        end = size
+        while end > len(header):
+            block = max(len(header), end - 64 * 1024)
+            sidecar.seek(block)
+            newline = sidecar.read(end - block).rfind(b'\n')
+            if newline >= 0:
+                end = block + newline + 1
+                break
+            end = block
+        if end != size:
+            sidecar.truncate(end)
+        if end == len(header):
+            return 0
+        sidecar.seek(end - INDEX_TRAILER_BYTES)
+        try:
+            _, indexed_to, digest = sidecar.read(INDEX_TRAILER_BYTES).split()
+            indexed_to = int(indexed_to)
+        except ValueError:
+            return None
+        # Another process may have indexed further than this one: fine, as long as it is this log
+        if indexed_to > os.fstat(f.fileno()).st_size or digest.decode('ascii') != self._tail_digest(f, indexed_to):
+            return None
+        return indexed_to
+
+    def _open_indexed(self) -> Tuple[Optional[BinaryIO], ResultIndex]:
+        """
+        Open the log and bring the index up to date with that very file, so offsets are always
+        read from the file they were indexed in, even if a compaction replaces the log meanwhile.
+        Returns (None, empty index) when there is no log yet.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None, ResultIndex()
+        try:
+            return f, self._refresh_index(f)
+        except BaseException:
+            f.close()
+            raise
+
+    def _refresh_index(self, f: BinaryIO) -> ResultIndex:
+        """Index the records appended to the open log `f` since the last lookup, by this or any other writer."""
+        with self._lock:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < self._indexed_to or stat.st_ino != self._indexed_ino:
+                self._reset_index()  # file was rewritten (replace, compaction) underneath us
+            if INDEX_SIDECAR and self._indexed_ino is None:
+                self._load_sidecar(f)
+            f.seek(self._indexed_to)
+            offset = self._indexed_to
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                record = json.loads(line)
+                if record.get('kind') == 'results':
+                    self._index.add(offset, record['entry'])
+                elif record.get('kind') == 'cache':
+                    self._index.cache_offsets[record['key']] = offset
+                elif record.get('kind') == 'trace_text':
+                    self._index.trace_offsets[record['key']] = offset
+                offset += len(line)
+            self._indexed_to = offset
+            self._indexed_ino = stat.st_ino
+            if INDEX_SIDECAR and self._indexed_to - self._saved_to >= INDEX_SAVE_BYTES:
+                self._save_sidecar(f)
+            return self._index
+
+    @staticmethod
+    def _read_at(f: BinaryIO, index: ResultIndex, offset: int) -> Dict[str, Any]:
+        f.seek(offset)
+        entry = json.loads(f.readline())['entry']
+        ref = _trace_ref(entry)
+        if ref is not None:
+            f.seek(index.trace_offsets[ref])
+            entry['trace'] = json.loads(f.readline())['text']
+        return entry
+
+    def get_latest(self, source: Optional[str]) -> Optional[Dict[str, Any]]:
+        f, index = self._open_indexed()
+        pos = index.latest_by_source.get(source)
+        if f is None:
+            return None
+        with f:
+            return self._read_at(f, index, index.offsets[pos]) if pos is not None else None
+
+    def iter_results(self, after=None, agent=None, format=None, source=None, since=None, until=None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        f, index = self._open_indexed()
+        if f is None:
+            return
+        with f:
+            positions = index.positions(agent, format, source, since, until)
+            if after is not None:
+                positions = positions[bisect.bisect_right(positions, after):]
+            for pos in positions:
+                yield pos, self._read_at(f, index, index.offsets[pos])
+
+    def cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        f, index = self._open_indexed()
+        if f is None:
+            return None
+        with f:
+            offset = index.cache_offsets.get(key)
+            return self._read_at(f, index, offset) if offset is not None else None
+
+    def cache_put(self, key: str, value: Dict[str, Any]):
+        record = {'kind': 'cache', 'key': key, 'entry': value}
+        self._write([(json.dumps(record, default=str) + '\n').encode('utf-8')])
+
+    def _iter_records(self) -> Iterator[Dict[str, Any]]:
+        """All complete records in file order, with shared trace references resolved."""
+        if not os.path.exists(self.path):
+            return
+        texts: Dict[str, str] = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # partially written record from a concurrent writer
+                record = json.loads(line)
+                if record.get('kind') == 'trace_text':
+                    texts[record['key']] = record['text']
+                elif record.get('kind') in KINDS and _trace_ref(record['entry']) is not None:
+                    record['entry']['trace'] = _trace_text(record['entry'], texts)
+                yield record
+
+    def iter_entries(self, kind: str) -> Iterator[Dict[str, Any]]:
+        for record in self._iter_records():
+            if record.get('kind') == kind:
+                yield record['entry']
+
+    def load(self) -> Dict[str, Any]:
+        memory: Dict[str, Any] = {}
+        for record in self._iter_records():
+            if record['kind'] in KINDS:
+                memory.setdefault(record['kind'], []).append(record['entry'])
+        return memory
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def version(self) -> tuple:
+        return _stat_version(self.path)
+
+    def cache_sizes(self) -> Iterator[Tuple[str, int]]:
+        """(key, bytes) of the live result cache records, oldest first."""
+        f, index = self._open_indexed()
+        if f is None:
+            return
+        with f:
+            for key, offset in sorted(index.cache_offsets.items(), key=lambda item: item[1]):
+                f.seek(offset)
+                yield key, len(f.readline())
+
+    def compact(self, drop: Set[int], drop_cache: Set[str] = frozenset()) -> Dict[str, int]:
+        """
+        Rewrite the log without the results at positions `drop` (archived by the caller) and the
+        cache records of the keys in `drop_cache`, keeping only the latest record of the
+        CACHE_MAX_RECORDS most recently written cache keys and storing each trace text shared by
+        several results once. Appends wait on the file lock meanwhile and then go to the new file. Result positions
+        (the /memory cursors) are renumbered.
+        """
+        stats = Counter(bytes_before=self.size())
+        if not os.path.exists(self.path):
+            return dict(stats)
+        tmp_path = f"{self.path}.{os.getpid()}.compact"
+        with self._lock, open(self.path, 'rb') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                # Pass 1: how many kept results share each trace, and the live record of each cache key
+                texts: Dict[str, str] = {}
+                shared = Counter()
+                cache_offsets: Dict[str, int] = {}
+                pos, offset = -1, 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    record = json.loads(line)
+                    kind = record.get('kind')
+                    if kind == 'trace_text':
+                        texts[record['key']] = record['text']
+                    elif kind == 'results':
+                        pos += 1
+                        if pos not in drop:
+                            shared[_trace_key(_trace_text(record['entry'], texts))] += 1
+                    elif kind == 'cache':
+                        cache_offsets[record['key']] = offset
+                    offset += len(line)
+                end = offset
+                # The latest record of the CACHE_MAX_RECORDS most recently written keys
+                live_cache = sorted(offset for key, offset in cache_offsets.items() if key not in drop_cache)
+                live_cache = set(live_cache[-CACHE_MAX_RECORDS:] if CACHE_MAX_RECORDS > 0 else ())
+                # Pass 2: write the compacted log; a shared trace text precedes its first reference
+                f.seek(0)
+                written: Set[str] = set()
+                pos, offset = -1, 0
+                with open(tmp_path, 'wb') as out:
+                    for line in f:
+                        if offset >= end:
+                            break
+                        record = json.loads(line)
+                        kind = record.get('kind')
+                        if kind == 'results':
+                            pos += 1
+                            if pos in drop:
+                                stats['results_dropped'] += 1
+                            else:
+                                entry = record['entry']
+                                text = _trace_text(entry, texts)
+                                key = _trace_key(text)
+                                if key is not None and shared[key] > 1:
+                                    if key not in written:
+                                        out.write((json.dumps({'kind': 'trace_text', 'key': key, 'text': text}) + '\n').encode('utf-8'))
+                                        written.add(key)
+                                    entry['trace'] = {TRACE_REF: key}
+                                    stats['traces_shared'] += 1
+                                else:
+                                    entry['trace'] = text
+                                out.write(self._encode('results', entry))
+                                stats['results_kept'] += 1
+                        elif kind == 'cache' and offset not in live_cache:
+                            stats['cache_records_dropped'] += 1
+                        elif kind != 'trace_text':
+                            out.write(line)
+                        offset += len(line)
+                    # Appends that raced in after pass 1 are carried over verbatim
+                    f.seek(end)
+                    out.write(f.read())
+                os.replace(tmp_path, self.path)
+                self._reset_index()
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        stats['trace_texts'] = len(written)
+        stats['bytes_after'] = self.size()
+        return dict(stats)
+
+
+class SQLiteBackend:
+    """
+    SQLite store in WAL mode with indexes on source, agent, format and timestamp.
+    Connections are per thread; SQLite serialises concurrent writers itself.
+    """
+
+    def __init__(self, path: str = SQLITE_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    agent TEXT,
+                    source TEXT,
+                    format TEXT,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_results_source ON results(source, id);
+                CREATE INDEX IF NOT EXISTS idx_results_agent ON results(agent, id);
+                CREATE INDEX IF NOT EXISTS idx_results_format ON results(format, id);
+                CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results(timestamp);
+                CREATE TABLE IF NOT EXISTS traces (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS trace_texts (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL
+                );
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(kind: str, entry: Dict[str, Any]):
+        data = json.dumps(entry, default=str)
+        if kind == 'results':
+            meta = entry.get('input_meta') or {}
+            return (entry.get('timestamp'), entry.get('agent'), meta.get('source'), meta.get('format'), data)
+        return (data,)
+
+    def _insert(self, conn: sqlite3.Connection, kind: str, rows):
+        if kind == 'results':
+            conn.executemany(
+                'INSERT INTO results (timestamp, agent, source, format, data) VALUES (?, ?, ?, ?, ?)', rows
+            )
+        elif kind == 'traces':
+            conn.executemany('INSERT INTO traces (data) VALUES (?)', rows)
+        else:
+            raise ValueError(f"Unknown memory kind: {kind}")
+
+    def append(self, kind: str, entry: Dict[str, Any]):
+        self.append_many(kind, [entry])
+
+    def append_many(self, kind: str, entries: List[Dict[str, Any]]):
+        conn = self._conn()
+        with conn:
+            self._insert(conn, kind, [self._row(kind, entry) for entry in entries])
+
+    def replace(self, memory: Dict[str, Any]):
+        conn = self._conn()
+        with conn:
+            for kind in KINDS:
+                conn.execute(f'DELETE FROM {kind}')
+                self._insert(conn, kind, [self._row(kind, e) for e in memory.get(kind, [])])
+
+    def seed(self, memory: Dict[str, Any]) -> bool:
+        """Fill an empty store with `memory`; returns False, leaving it untouched, when it holds entries."""
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # no writer can slip in between the check and the inserts
+            if any(conn.execute(f'SELECT 1 FROM {kind} LIMIT 1').fetchone() for kind in KINDS):
+                return False
+            for kind in KINDS:
+                self._insert(conn, kind, [self._row(kind, e) for e in memory.get(kind, [])])
+        return True
+
+    def _resolve(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        ref = _trace_ref(entry)
+        if ref is not None:
+            row = self._conn().execute('SELECT text FROM trace_texts WHERE key = ?', (ref,)).fetchone()
+            entry['trace'] = row[0] if row else None
+        return entry
+
+    def iter_entries(self, kind: str) -> Iterator[Dict[str, Any]]:
+        if kind not in KINDS:
+            return
+        for (data,) in self._conn().execute(f'SELECT data FROM {kind} ORDER BY id'):
+            yield self._resolve(json.loads(data))
+
+    def load(self) -> Dict[str, Any]:
+        memory: Dict[str, Any] = {}
+        for kind in KINDS:
+            entries = list(self.iter_entries(kind))
+            if entries:
+                memory[kind] = entries
+        return memory
+
+    def cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute('SELECT data FROM cache WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def cache_put(self, key: str, value: Dict[str, Any]):
+        conn = self._conn()
+        with conn:
+            # REPLACE deletes and reinserts, so rowids follow write order
+            rowid = conn.execute('INSERT OR REPLACE INTO cache (key, data) VALUES (?, ?)',
+                                 (key, json.dumps(value, default=str))).lastrowid
+            if rowid % CACHE_EVICT_EVERY == 0:
+                self._evict_cache(conn)
+
+    @staticmethod
+    def _evict_cache(conn: sqlite3.Connection) -> int:
+        """Delete all but the CACHE_MAX_RECORDS most recently written cache records."""
+        return conn.execute(
+            'DELETE FROM cache WHERE rowid <= (SELECT rowid FROM cache ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+            (CACHE_MAX_RECORDS,)).rowcount
+
+    def get_latest(self, source: Optional[str]) -> Optional[Dict[str, Any]]:
+        if source is None:
+            sql, params = 'SELECT data FROM results WHERE source IS NULL ORDER BY id DESC LIMIT 1', ()
+        else:
+            sql, params = 'SELECT data FROM results WHERE source = ? ORDER BY id DESC LIMIT 1', (source,)
+        row = self._conn().execute(sql, params).fetchone()
+        return self._resolve(json.loads(row[0])) if row else None
+
+    def iter_results(self, after=None, agent=None, format=None, source=None, since=None, until=None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        clauses, params = ['id > ?'], []
+        for column, value in (('agent', agent), ('format', format), ('source', source)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            clauses.append('timestamp <= ?')
+            params.append(until)
+        sql = f"SELECT id, data FROM results WHERE {' AND '.join(clauses)} ORDER BY id LIMIT {SCAN_BATCH_SIZE}"
+        last_id = after if after is not None else 0
+        # Fetch in batches so a slow consumer (e.g. a streaming response iterated
+        # from a thread pool) never holds a cursor across threads
+        while True:
+            rows = self._conn().execute(sql, [last_id, *params]).fetchall()
+            for row_id, data in rows:
+                yield row_id, self._resolve(json.loads(data))
+            if len(rows) < SCAN_BATCH_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def size(self) -> int:
+        return sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path))
+
+    def version(self) -> tuple:
+        return _stat_version(self.path, self.path + '-wal')
+
+    def cache_sizes(self) -> Iterator[Tuple[str, int]]:
+        """(key, bytes) of the result cache records, oldest first."""
+        yield from self._conn().execute('SELECT key, length(key) + length(data) FROM cache ORDER BY rowid').fetchall()
+
+    def compact(self, drop: Set[int], drop_cache: Set[str] = frozenset()) -> Dict[str, int]:
+        """
+        Delete the results with ids in `drop` (archived by the caller) and the cache records of
+        the keys in `drop_cache`, store each trace text shared by several results once, then
+        VACUUM so the file actually shrinks.
+        """
+        stats = Counter(bytes_before=self.size())
+        conn = self._conn()
+        with conn:
+            ids = sorted(drop)
+            for i in range(0, len(ids), SCAN_BATCH_SIZE):
+                chunk = ids[i:i + SCAN_BATCH_SIZE]
+                deleted = conn.execute(f"DELETE FROM results WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                stats['results_dropped'] += deleted.rowcount
+            keys = sorted(drop_cache)
+            for i in range(0, len(keys), SCAN_BATCH_SIZE):
+                chunk = keys[i:i + SCAN_BATCH_SIZE]
+                deleted = conn.execute(f"DELETE FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                stats['cache_records_dropped'] += deleted.rowcount
+            texts = dict(conn.execute('SELECT key, text FROM trace_texts'))
+            shared = Counter()
+            for (data,) in conn.execute('SELECT data FROM results'):
+                shared[_trace_key(_trace_text(json.loads(data), texts))] += 1
+            updates, new_texts = [], {}
+            for row_id, data in conn.execute('SELECT id, data FROM results').fetchall():
+                entry = json.loads(data)
+                stats['results_kept'] += 1
+                text = _trace_text(entry, texts)
+                key = _trace_key(text)
+                if key is not None and shared[key] > 1:
+                    stats['traces_shared'] += 1
+                    if _trace_ref(entry) == key:
+                        continue
+                    new_texts[key] = text
+                    entry['trace'] = {TRACE_REF: key}
+                elif _trace_ref(entry) is not None:
+                    entry['trace'] = text  # no longer shared: store it inline again
+                else:
+                    continue
+                updates.append((json.dumps(entry, default=str), row_id))
+            conn.executemany('INSERT OR IGNORE INTO trace_texts (key, text) VALUES (?, ?)', new_texts.items())
+            conn.executemany('UPDATE results SET data = ? WHERE id = ?', updates)
+            stale = [(key,) for key in texts if shared[key] < 2]
+            conn.executemany('DELETE FROM trace_texts WHERE key = ?', stale)
+            stats['trace_texts'] = len(texts) + len(new_texts) - len(stale)
+            stats['cache_records_dropped'] += self._evict_cache(conn)
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        stats['bytes_after'] = self.size()
+        return dict(stats)
+
+
+BACKENDS = {
+    'json': JSONFileBackend,
+    'jsonl': JSONLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def migrate_json_memory(backend, json_path: str = MEMORY_FILE) -> int:
+    """
+    Copy the entries of a legacy shared_memory.json into `backend`.
+    Returns the number of entries migrated.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    memory = JSONFileBackend(json_path).load()
+    backend.replace(memory)
+    return sum(len(memory.get(kind, [])) for kind in KINDS)
+
+
+def seed_from_json_memory(backend, json_path: str = MEMORY_FILE) -> int:
+    """
+    First-use migration: seed a store that does not exist yet from the legacy JSON file.
+    Processes starting together serialise on a lock file and a store that exists (possibly
+    already holding their appends) is never replaced. Returns the number of entries migrated.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    # exists() is only checked under the lock: a SQLite store exists as soon as seeding opens it
+    with open(f"{backend.path}.migrate.lock", 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        if backend.exists():
+            return 0
+        memory = JSONFileBackend(json_path).load()
+        if not backend.seed(memory):
+            return 0
+    return sum(len(memory.get(kind, [])) for kind in KINDS)
+
+
+def get_backend():
+    """
+    Return the process-wide storage backend selected by MEMORY_BACKEND.
+    A new append-only/SQLite store is seeded from the legacy JSON file on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if MEMORY_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown shared memory backend: {MEMORY_BACKEND}")
+                backend = BACKENDS[MEMORY_BACKEND]()
+                if MEMORY_BACKEND != 'json':
+                    seed_from_json_memory(backend)
+                _backend = backend
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
 
 def load_memory() -> Dict[str, Any]:
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return get_backend().load()
+
 
 def save_memory(memory: Dict[str, Any]):
-    with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(memory, f, indent=2, default=str)
+    get_backend().replace(memory)
+
+
+def cache_get(key: str) -> Optional[Dict[str, Any]]:
+    """Persistent tier of the result cache: the value stored under `key`, or None."""
+    return get_backend().cache_get(key)
+
+
+def cache_put(key: str, value: Dict[str, Any]):
+    get_backend().cache_put(key, value)
+
 
 def log_agent_trace(entry: Dict[str, Any]):
-    memory = load_memory()
-    traces = memory.get('traces', [])
-    traces.append(entry)
-    memory['traces'] = traces
-    save_memory(memory)
+    get_backend().append('traces', entry)
 
-def log_agent_result(agent: str, input_meta: Dict[str, Any], extracted: Dict[str, Any], actions: list, trace: str):
-    memory = load_memory()
-    results = memory.get('results', [])
-    results.append({
+
+def memory_version() -> tuple:
+    """A cheap token that changes whenever the history is written to, by any process (for caching reads)."""
+    return get_backend().version()
+
+
+def get_latest(source: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Return the most recent result logged for `source`, or None."""
+    return get_backend().get_latest(source)
+
+
+def iter_results(agent: Optional[str] = None, format: Optional[str] = None, intent: Optional[str] = None,
+                 source: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                 after: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lazily yield (cursor, result) pairs matching all given filters, oldest first.
+    `since`/`until` are ISO timestamps; `after` resumes from a previously returned cursor.
+    """
+    results = get_backend().iter_results(after=after, agent=agent, format=format, source=source, since=since, until=until)
+    for cursor, entry in results:
+        if intent is None or entry_intent(entry) == intent:
+            yield cursor, entry
+
+
+def entry_intent(entry: Dict[str, Any]) -> Optional[str]:
+    """The intent a result was classified with; entries logged before it was stored for every agent only carry an email's."""
+    if 'intent' in entry:
+        return entry['intent']
+    extracted = entry.get('extracted')
+    return extracted.get('intent') if isinstance(extracted, dict) else None
+
+
+def query(agent: Optional[str] = None, format: Optional[str] = None, intent: Optional[str] = None,
+          source: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return results matching all given filters, oldest first."""
+    results = iter_results(agent=agent, format=format, intent=intent, source=source, since=since, until=until)
+    return [entry for _, entry in islice(results, limit)]
+
+
+def get_page(limit: int = 100, cursor: Optional[int] = None, **filters) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Return up to `limit` results after `cursor` and the cursor of the next page
+    (None when there are no more results). Accepts the same filters as iter_results.
+    """
+    page = list(islice(iter_results(after=cursor, **filters), limit + 1))
+    next_cursor = page[limit - 1][0] if len(page) > limit else None
+    return [entry for _, entry in page[:limit]], next_cursor
+
+
+def make_result(agent: str, input_meta: Dict[str, Any], extracted: Dict[str, Any], actions: list, trace: str,
+                intent: Optional[str] = None) -> Dict[str, Any]:
+    return {
         'timestamp': datetime.now().isoformat(),
         'agent': agent,
         'input_meta': input_meta,
+        'intent': intent,
         'extracted': extracted,
         'actions': actions,
         'trace': trace
-    })
-    memory['results'] = results
-    save_memory(memory)
+    }
+
+
+def log_agent_result(agent: str, input_meta: Dict[str, Any], extracted: Dict[str, Any], actions: list, trace: str):
+    get_backend().append('results', make_result(agent, input_meta, extracted, actions, trace))
+
+
+@timed('memory_write')
+def log_agent_results(results: List[Dict[str, Any]]):
+    """Append many results (built with make_result) in one write."""
+    if results:
+        get_backend().append_many('results', results)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Shared memory maintenance")
+    parser.add_argument('--migrate', action='store_true', help=f'Import {MEMORY_FILE} into the configured backend')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=MEMORY_BACKEND)
+    args = parser.parse_args()
+    if args.migrate:
+        count = migrate_json_memory(BACKENDS[args.backend]())
+        print(f"Migrated {count} entries from {MEMORY_FILE} into the {args.backend} backend")
@@ -1,9 +1,40 @@
 # Simple Streamlit UI for Multi-Agent System
+# Streamlit reruns this whole script on every widget interaction, so documents are processed
+# once per upload (keyed on a content hash in session state), heavy resources are loaded once
+# per server process and memory log pages are cached until the history is written to.
+import hashlib
 import streamlit as st
-import os
-from main import main_pipeline
-from shared_memory import load_memory
-import sys
+from classifier import INTENT_BACKEND
+from pipeline import process_document, store_upload, PERSIST_UPLOADS
+from policy_scanner import get_policy_scanner
+from result_cache import get_cache
+from rollups import get_rollups
+from shared_memory import get_backend, get_page, memory_version
+
+MEMORY_PAGE_SIZE = 50
+# Memory log pages kept by st.cache_data (older versions of the history age out)
+MEMORY_CACHED_PAGES = 100
+
+
+@st.cache_resource
+def load_resources():
+    """Load the intent model, compile the policy scanner and open the stores once per server process."""
+    if INTENT_BACKEND == 'ml':
+        from intent_model import get_model
+        get_model()
+    get_policy_scanner()
+    get_backend()
+    get_cache()
+    return get_rollups()
+
+
+@st.cache_data(max_entries=MEMORY_CACHED_PAGES, show_spinner=False)
+def memory_page(cursor, version):
+    """One page of the memory log; `version` (memory_version()) moves on with every write."""
+    return get_page(limit=MEMORY_PAGE_SIZE, cursor=cursor)
+
+
+rollups = load_resources()
 
 st.title("Multi-Agent AI System Demo")
 
@@ -11,39 +42,59 @@ st.header("Upload Input (Email, JSON, PDF)")
 uploaded_file = st.file_uploader("Choose a file", type=["txt", "json", "pdf", "eml"])
 
 if uploaded_file:
-    uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-    file_path = os.path.join(uploads_dir, uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    st.success(f"File uploaded to: {file_path}")
-
-    # Simulate CLI run with the uploaded file
-    sys.argv = [sys.argv[0], '--input_file', file_path]
-    with st.spinner("Processing..."):
-        main_pipeline()
-        
+    data = uploaded_file.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    if st.session_state.get('upload_digest') != digest:
+        if PERSIST_UPLOADS:
+            st.session_state['upload_path'] = store_upload(data, uploaded_file.name)
+        with st.spinner("Processing..."):
+            st.session_state['upload_result'] = process_document(data, name=uploaded_file.name)
+        st.session_state['upload_digest'] = digest
+    result = st.session_state['upload_result']
+    if PERSIST_UPLOADS:
+        st.success(f"File uploaded to: {st.session_state['upload_path']}")
+
     # Show summary for this input
-    memory = load_memory()
-    latest_entry = None
-    for entry in reversed(memory.get('results', [])):
-        entry_id = entry['input_meta'].get('source') or 'user_input_email'
-        if entry_id == file_path:
-            latest_entry = entry
-            break
     st.header("Agent Summary for This Input")
-    if latest_entry:
-        st.write(f"Timestamp: {latest_entry['timestamp']}")
-        st.write(f"Agent: {latest_entry['agent']}")
-        st.write(f"Input: {latest_entry['input_meta']}")
-        st.write(f"Extracted: {latest_entry['extracted']}")
-        st.write(f"Actions: {latest_entry['actions']}")
-        st.write(f"Trace: {latest_entry['trace']}")
-    else:
-        st.warning("No summary found for this input.")
+    st.write(f"Timestamp: {result.timestamp}")
+    st.write(f"Agent: {result.agent}")
+    st.write(f"Input: {result.input_meta}")
+    st.write(f"Extracted: {result.extracted}")
+    st.write(f"Actions: {[str(action) for action in result.actions]}")
+    if result.triggered:
+        st.write(f"Action Router triggered: {result.triggered}")
+    st.write(f"Trace: {result.trace}")
 
 st.header("View Routing & Memory Log")
 if st.button("Show Memory Log"):
-    memory = load_memory()
-    st.json(memory)
+    st.session_state['show_memory'] = True
+    st.session_state['memory_cursors'] = [None]
+
+if st.session_state.get('show_memory'):
+    cursors = st.session_state['memory_cursors']
+    results, next_cursor = memory_page(cursors[-1], memory_version())
+    st.caption(f"Page {len(cursors)} ({len(results)} results)")
+    st.json(results)
+    prev_col, next_col = st.columns(2)
+    if len(cursors) > 1 and prev_col.button("Previous page"):
+        cursors.pop()
+        st.rerun()
+    if next_cursor is not None and next_col.button("Next page"):
+        cursors.append(next_cursor)
+        st.rerun()
+
+st.header("Statistics")
+if rollups is None:
+    st.caption("Rollups are disabled (MEMORY_ROLLUPS=0)")
+else:
+    # Precomputed counts: cheap to read however long the history is
+    totals = rollups.totals()
+    st.metric("Documents processed", totals.get('documents', {}).get('total', 0))
+    daily = rollups.series('day')
+    if daily:
+        st.subheader("Documents per day")
+        st.bar_chart({'documents': {day: counts.get('total', 0) for day, counts in daily.items()}})
+    for dimension in ('format', 'intent', 'tone', 'action'):
+        if totals.get(dimension):
+            st.subheader(f"By {dimension}")
+            st.bar_chart({'documents': totals[dimension]})